@@ -1,17 +1,59 @@
+import asyncio
+import hashlib
 import os
-from typing import Dict, List
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, NamedTuple, Optional
+
+from cve_client import ResponseCache
 
 USE_OPENAI = bool(os.environ.get('OPENAI_API_KEY'))
-if USE_OPENAI:
-    try:
-        import openai
-        openai.api_key = os.environ.get('OPENAI_API_KEY')
-    except Exception:
-        USE_OPENAI = False
+API_BASE = os.environ.get('OPENAI_API_BASE', 'https://api.openai.com/v1')
+CACHE_FILE = os.environ.get(
+    'INVISISCAN_AI_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai_cache.db'))
+
+if TYPE_CHECKING:
+    import aiohttp
+
+_SET_HEADER = re.compile(r'^#{2,3}\s*Set\s+(\d+)\s*$', re.M)
+
+
+class AIClient(NamedTuple):
+    """Completion session and explanation cache shared by several ``explain_cves_async`` calls."""
+    session: "aiohttp.ClientSession"
+    cache: Optional[ResponseCache]
+
 
 class AIHelper:
-    def __init__(self, model: str = 'gpt-3.5-turbo'):
+    """Explains CVE sets, summarizing each distinct set once.
+
+    Explanations are keyed by a hash of the sorted CVE ids and kept in
+    memory and in an on-disk cache, so a CVE set seen on fifty hosts costs
+    one completion. Cache misses are packed ``batch_size`` sets per prompt.
+    Batches run concurrently, within the request rate and token budget.
+    Anything over budget or past the deadline gets ``_local_summary``.
+    """
+
+    def __init__(self, model: str = 'gpt-3.5-turbo', cache: Optional[str] = CACHE_FILE,
+                 cache_ttl: float = 30 * 86400.0, concurrency: int = 4, batch_size: int = 4,
+                 rate: float = 1.0, token_budget: int = 20000, deadline: float = 60.0,
+                 max_tokens: int = 500, api_base: str = API_BASE):
         self.model = model
+        self.cache_path = cache
+        self.cache_ttl = cache_ttl
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        # Requests per second; 0 disables pacing.
+        self.rate = rate
+        self.token_budget = token_budget
+        self.deadline = deadline
+        self.max_tokens = max_tokens
+        self.api_base = api_base.rstrip('/')
+        self.tokens_used = 0
+        self.completions = 0
+        self._memory: Dict[str, str] = {}
+        self._next_slot = 0.0
 
     def _local_summary(self, items: List[dict]) -> str:
         if not items:
@@ -23,31 +65,176 @@ class AIHelper:
             out.append(f"- {cid}: {summary[:250].strip()}")
         return '\n'.join(out)
 
-    def explain_cves(self, cve_results: Dict[int, List[dict]]) -> Dict[int, str]:
+    @staticmethod
+    def _key(items: List[dict]) -> str:
+        ids = sorted({str(it.get('id') or it.get('cve') or it.get('summary', '')) for it in items})
+        return hashlib.sha256('\n'.join(ids).encode()).hexdigest()
+
+    def _prompt(self, batch: List[List[dict]]) -> str:
+        prompt = """You are a helpful cybersecurity assistant.
+Summarize the following CVE entries (id + summary) in 3 short bullet points each.
+Each set below starts with a "### Set N" line; answer every set under the same heading.\n\n"""
+        for n, items in enumerate(batch, 1):
+            prompt += f"### Set {n}\n"
+            for it in items:
+                cid = it.get('id') or it.get('cve') or 'UNKNOWN'
+                summary = it.get('summary') or it.get('vuln') or ''
+                prompt += f"{cid}: {summary}\n\n"
+        return prompt
+
+    @staticmethod
+    def _split(text: str, count: int) -> List[Optional[str]]:
+        """Per-set answers from a batched completion; None where a set is missing."""
+        if count == 1 and not _SET_HEADER.search(text):
+            return [text.strip()]
+        parts: List[Optional[str]] = [None] * count
+        heads = list(_SET_HEADER.finditer(text))
+        for i, m in enumerate(heads):
+            n = int(m.group(1))
+            end = heads[i + 1].start() if i + 1 < len(heads) else len(text)
+            body = text[m.end():end].strip()
+            if 1 <= n <= count and body:
+                parts[n - 1] = body
+        return parts
+
+    async def _pace(self):
+        if not self.rate or self.rate <= 0:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _estimate(self, prompt: str, sets: int) -> int:
+        # Roughly four characters per token, plus the reply allowance per set.
+        return len(prompt) // 4 + self.max_tokens * sets
+
+    def _reserve(self, prompt: str, sets: int) -> bool:
+        cost = self._estimate(prompt, sets)
+        if self.tokens_used + cost > self.token_budget:
+            return False
+        self.tokens_used += cost
+        return True
+
+    def _refund(self, prompt: str, sets: int):
+        # A batch that got no completion was never billed.
+        self.tokens_used -= self._estimate(prompt, sets)
+
+    async def _complete(self, session: "aiohttp.ClientSession", prompt: str, sets: int) -> str:
+        await self._pace()
+        payload = {"model": self.model, "messages": [{"role": "user", "content": prompt}],
+                   "max_tokens": self.max_tokens * sets, "temperature": 0.2}
+        headers = {"Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY', '')}"}
+        async with session.post(f"{self.api_base}/chat/completions", json=payload, headers=headers) as r:
+            if r.status != 200:
+                raise RuntimeError(f"completion API returned HTTP {r.status}")
+            data = await r.json(content_type=None)
+        text = data['choices'][0]['message']['content'].strip()
+        self.completions += 1
+        usage = data.get('usage', {}).get('total_tokens')
+        if usage:
+            # Replace the estimate with what was actually billed.
+            self.tokens_used += usage - self._estimate(prompt, sets)
+        return text
+
+    def _session(self) -> "aiohttp.ClientSession":
+        import aiohttp
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.concurrency),
+                                     timeout=aiohttp.ClientTimeout(total=self.deadline))
+
+    @asynccontextmanager
+    async def client(self) -> AsyncIterator[AIClient]:
+        """An AIClient to pass to a run of ``explain_cves_async`` calls; closed on exit."""
+        cache = ResponseCache(self.cache_path, ttl=self.cache_ttl) if self.cache_path else None
+        try:
+            async with self._session() as session:
+                yield AIClient(session, cache)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    async def explain_cves_async(self, cve_results: Dict[int, List[dict]],
+                                 client: Optional[AIClient] = None) -> Dict[int, str]:
+        if client is not None:
+            return await self._explain(cve_results, client.cache, client.session)
+        cache = ResponseCache(self.cache_path, ttl=self.cache_ttl) if self.cache_path and USE_OPENAI else None
+        try:
+            return await self._explain(cve_results, cache, None)
+        finally:
+            if cache is not None:
+                cache.close()
+
+    async def _explain(self, cve_results: Dict[int, List[dict]], cache: Optional[ResponseCache],
+                       session: Optional["aiohttp.ClientSession"]) -> Dict[int, str]:
         explanations = {}
+        pending: Dict[str, List[dict]] = {}
+        owners: Dict[str, List] = {}
+        failed: Dict[str, str] = {}
         for port, items in cve_results.items():
             if not items:
                 explanations[port] = 'No quick CVE hits found by heuristic.'
                 continue
-            if USE_OPENAI:
+            if not USE_OPENAI:
+                explanations[port] = self._local_summary(items)
+                continue
+            key = self._key(items)
+            text = self._memory.get(key)
+            if text is None and cache is not None:
+                text = cache.get(key)
+                if text is not None:
+                    self._memory[key] = text
+            if text is not None:
+                explanations[port] = text
+                continue
+            pending.setdefault(key, items)
+            owners.setdefault(key, []).append(port)
+
+        if pending:
+            if session is None:
+                async with self._session() as session:
+                    await self._run_batches(session, pending, cache, failed)
+            else:
+                await self._run_batches(session, pending, cache, failed)
+        for key, ports in owners.items():
+            text = self._memory.get(key) or failed.get(key) or self._local_summary(pending[key])
+            for port in ports:
+                explanations[port] = text
+        return explanations
+
+    async def _run_batches(self, session: "aiohttp.ClientSession", pending: Dict[str, List[dict]],
+                           cache: Optional[ResponseCache], failed: Dict[str, str]):
+        keys = list(pending)
+        batches = [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch):
+            async with sem:
+                prompt = self._prompt([pending[k] for k in batch])
+                if not self._reserve(prompt, len(batch)):
+                    return
                 try:
-                    prompt = """You are a helpful cybersecurity assistant.
-Summarize the following CVE entries (id + summary) in 3 short bullet points each: \n\n"""
-                    for it in items:
-                        cid = it.get('id') or it.get('cve') or 'UNKNOWN'
-                        summary = it.get('summary') or it.get('vuln') or ''
-                        prompt += f"{cid}: {summary}\n\n"
-                    resp = openai.ChatCompletion.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=500,
-                        temperature=0.2,
-                    )
-                    text = resp['choices'][0]['message']['content'].strip()
-                    explanations[port] = text
-                    continue
+                    text = await self._complete(session, prompt, len(batch))
+                except asyncio.CancelledError:
+                    self._refund(prompt, len(batch))
+                    raise
                 except Exception as e:
-                    explanations[port] = f"(AI lookup failed) {str(e)}\n\n" + self._local_summary(items)
-                    continue
-            explanations[port] = self._local_summary(items)
-        return explanations
+                    self._refund(prompt, len(batch))
+                    for k in batch:
+                        failed[k] = f"(AI lookup failed) {str(e)}\n\n" + self._local_summary(pending[k])
+                    return
+                for k, part in zip(batch, self._split(text, len(batch))):
+                    if part:
+                        self._memory[k] = part
+                        if cache is not None:
+                            cache.put(k, part)
+
+        tasks = [asyncio.ensure_future(run(b)) for b in batches]
+        # Whatever has not finished by the deadline falls back to local summaries.
+        _, late = await asyncio.wait(tasks, timeout=self.deadline)
+        for t in late:
+            t.cancel()
+        await asyncio.gather(*late, return_exceptions=True)
+
+    def explain_cves(self, cve_results: Dict[int, List[dict]]) -> Dict[int, str]:
+        return asyncio.run(self.explain_cves_async(cve_results))
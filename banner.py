@@ -1,45 +1,104 @@
 import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from fingerprint import Fingerprint, ProbeDB, default_db
+from resolver import Resolver
 
 class BannerGrabber:
-    def __init__(self, target: str, timeout: float = 1.0):
+    def __init__(self, target: str, timeout: float = 1.0, concurrency: int = 100, greeting: float = 0.3,
+                 probes: Optional[ProbeDB] = None, resolver: Optional[Resolver] = None, metrics=None):
         self.target = target
         self.timeout = timeout
+        # Port hints in the probe database decide whether to wait for a
+        # greeting or send a request straight away, and which request.
+        self.probes = probes or default_db()
+        self.fingerprints: Dict[Tuple[str, int], Fingerprint] = {}
+        # Unknown ports wait this long for a greeting before being probed.
+        self.greeting = min(greeting, timeout)
+        self.concurrency = max(1, concurrency)
+        self._sem = asyncio.Semaphore(self.concurrency)
+        # Share the scanner's resolver to reuse its lookups.
+        self.resolver = resolver or Resolver()
+        self.active = 0
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.gauge("banners_inflight", lambda: self.active)
 
-    async def _grab_async(self, port: int) -> str:
-        try:
-            reader, writer = await asyncio.open_connection(self.target, port)
+    def _identify(self, host: str, port: int, data: bytes, probe: str):
+        fp = self.probes.match(data, probe)
+        if fp is not None:
+            self.fingerprints[(host, port)] = fp
+
+    async def _collect(self, reader, writer, port: int, host: str) -> str:
+        if not self.probes.client_first(port):
+            # Greeting services get the full timeout to speak; unknown ports
+            # only a short window before we fall back to an active probe.
+            wait = self.timeout if self.probes.greets(port) else self.greeting
             try:
-                data = await asyncio.wait_for(reader.read(4096), timeout=self.timeout)
-                writer.close()
-                try:
-                    await writer.wait_closed()
-                except Exception:
-                    pass
+                data = await asyncio.wait_for(reader.read(4096), timeout=wait)
+                self._identify(host, port, data, "NULL")
                 return data.decode(errors='ignore').strip()
-            except Exception:
-                try:
-                    writer.write(b"GET / HTTP/1.0\r\nHost: %b\r\n\r\n" % self.target.encode())
-                    await writer.drain()
-                    data = await asyncio.wait_for(reader.read(4096), timeout=self.timeout)
-                    writer.close()
-                    try:
-                        await writer.wait_closed()
-                    except Exception:
-                        pass
-                    return data.decode(errors='ignore').split('\r\n')[0]
-                except Exception:
-                    return ''
+            except asyncio.TimeoutError:
+                pass
+        probe = self.probes.active_probe(port)
+        payload = probe.payload
+        if payload.startswith(b"GET ") and payload.endswith(b"\r\n\r\n") and b"\r\nHost:" not in payload:
+            payload = payload[:-2] + b"Host: %b\r\n\r\n" % host.encode()
+        writer.write(payload)
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(4096), timeout=self.timeout)
+        self._identify(host, port, data, probe.name)
+        return data.decode(errors='ignore').split('\r\n')[0]
+
+    async def _finish(self, reader, writer, port: int, host: str, start: Optional[float] = None) -> str:
+        start = start if start is not None else time.perf_counter()
+        banner = ''
+        self.active += 1
+        try:
+            banner = await self._collect(reader, writer, port, host)
+            return banner
         except Exception:
             return ''
+        finally:
+            self.active -= 1
+            if self.metrics is not None:
+                self.metrics.observe("banner_seconds", time.perf_counter() - start)
+                self.metrics.inc("banners_total", result="banner" if banner else "empty")
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
 
-    async def grab_many(self, ports):
-        results = {}
-        tasks = []
-        for p in ports:
-            tasks.append((p, asyncio.create_task(self._grab_async(p))))
-        for p, t in tasks:
+    async def grab_stream(self, reader, writer, port: int, host: Optional[str] = None) -> str:
+        """Collect a banner from an already-open connection, then close it."""
+        async with self._sem:
+            return await self._finish(reader, writer, port, host or self.target)
+
+    async def _grab_async(self, port: int, host: Optional[str] = None) -> str:
+        host = host or self.target
+        async with self._sem:
+            start = time.perf_counter()
             try:
-                results[p] = await t
+                _, address = await self.resolver.address(host)
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(address, port), timeout=self.timeout)
             except Exception:
-                results[p] = ''
+                if self.metrics is not None:
+                    self.metrics.inc("banners_total", result="connect_failed")
+                return ''
+            return await self._finish(reader, writer, port, host, start)
+
+    async def grab_many(self, ports, host: Optional[str] = None):
+        results = {p: '' for p in ports}
+        queue = iter(list(results))
+
+        async def worker():
+            for p in queue:
+                try:
+                    results[p] = await self._grab_async(p, host)
+                except Exception:
+                    results[p] = ''
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(results)))))
         return results
@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+# benchmark.py
+"""Loopback benchmarks for the scan, banner, discovery, CVE and report paths.
+
+A fixture process serves, on 127.0.0.0/8 aliases:
+
+* thousands of listening ports on 127.0.0.2 that send a banner at once,
+* a few slow-banner ports after them that wait before speaking,
+* "filtered" ports on 127.0.0.3: listen(0) sockets whose accept queue is
+  kept full, so further SYNs are dropped and connects time out,
+* UDP responders and silent bound UDP sockets on 127.0.0.2,
+* a stand-in for the online CVE search API with a fixed response delay.
+
+Each phase then runs in its own fresh process (so peak RSS and CPU time
+belong to that phase alone) against those fixtures:
+
+    scan            AsyncPortScanner over the open/closed port range
+    scan_filtered   AsyncPortScanner over the filtered ports
+    banner          BannerGrabber.grab_many over the open and slow ports
+    udp             UDPScanner over answering, silent and closed UDP ports
+    discovery       discover_network(method="tcp") over 127.0.1.0/24
+    ping_sweep      ping_sweep over 127.0.2.0/26 (when ``ping`` exists)
+    cve             CVELookup.check_services_async against the stub API
+    report          Reporter.save of synthetic findings as json, md and html
+    startup         fresh interpreters running ``main.py --help`` and importing
+                    the scan core; fails if either loads rich or aiohttp
+
+Results (ops/sec, latency percentiles, CPU seconds, peak RSS) are written
+as JSON. ``--compare baseline.json`` reports every metric against a saved
+run and exits non-zero when one is worse by more than ``--threshold``.
+
+Needs a Linux-style loopback where all of 127.0.0.0/8 is local; peak RSS
+and CPU are unavailable where the ``resource`` module is missing.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+console = Console()
+
+OPEN_HOST = "127.0.0.2"
+FILTERED_HOST = "127.0.0.3"
+DISCOVERY_NET = "127.0.1.0/24"
+PING_NET = "127.0.2.0/26"
+
+PHASES = ("scan", "scan_filtered", "banner", "udp", "discovery", "ping_sweep", "cve", "report", "startup")
+
+# metric -> True when bigger is better
+METRICS = {"ops_per_s": True, "p50_ms": False, "p95_ms": False, "p99_ms": False,
+           "cpu_s": False, "peak_rss_mb": False}
+
+_BANNER = b"SSH-2.0-OpenSSH_8.2p1 Ubuntu-4ubuntu0.5\r\n"
+_SLOW_BANNER = b"220 ProFTPD 1.3.5 Server (bench)\r\n"
+# Banners the CVE phase looks up; each maps to a distinct vendor/product query.
+_SERVICE_BANNERS = (
+    "SSH-2.0-OpenSSH_8.2p1 Ubuntu-4ubuntu0.5", "220 ProFTPD 1.3.5 Server (Debian)", "+OK Dovecot ready.",
+    "HTTP/1.1 200 OK\r\nServer: nginx/1.18.0\r\n\r\n", "220 mail ESMTP Postfix",
+    "HTTP/1.1 200 OK\r\nServer: Apache/2.4.41 (Ubuntu)\r\n\r\n", "220 (vsFTPd 3.0.3)",
+)
+
+
+# -- fixtures ----------------------------------------------------------------
+
+def _fixture_main(config: dict, conn):
+    asyncio.run(_serve_fixtures(config, conn))
+
+
+async def _serve_fixtures(config: dict, conn):
+    from aiohttp import web
+
+    async def speak(reader, writer):
+        try:
+            writer.write(_BANNER)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def speak_slowly(reader, writer):
+        try:
+            await asyncio.sleep(config["slow_delay"])
+            writer.write(_SLOW_BANNER)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    servers, held = [], []
+    base = config["base_port"]
+    open_ports, slow_ports, filtered_ports = [], [], []
+    for i in range(config["open"] + config["slow"]):
+        port = base + i
+        slow = i >= config["open"]
+        try:
+            servers.append(await asyncio.start_server(speak_slowly if slow else speak, OPEN_HOST, port,
+                                                      backlog=128))
+        except OSError:
+            continue
+        (slow_ports if slow else open_ports).append(port)
+
+    for port in range(base, base + config["filtered"]):
+        sock = socket.socket()
+        try:
+            sock.bind((FILTERED_HOST, port))
+            sock.listen(0)
+        except OSError:
+            sock.close()
+            continue
+        held.append(sock)
+        for _ in range(2):
+            # Never accepted: with the queue full, later SYNs are dropped.
+            filler = socket.socket()
+            filler.setblocking(False)
+            try:
+                filler.connect((FILTERED_HOST, port))
+            except BlockingIOError:
+                pass
+            held.append(filler)
+        filtered_ports.append(port)
+
+    class Responder(asyncio.DatagramProtocol):
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def datagram_received(self, data, addr):
+            self.transport.sendto(_BANNER, addr)
+
+    loop = asyncio.get_running_loop()
+    udp_open, udp_silent = [], []
+    for port in range(base, base + config["udp_open"] + config["udp_silent"]):
+        silent = port >= base + config["udp_open"]
+        try:
+            if silent:
+                # Bound, so no ICMP error, but never answers: open|filtered.
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.bind((OPEN_HOST, port))
+                held.append(sock)
+            else:
+                transport, _ = await loop.create_datagram_endpoint(Responder, local_addr=(OPEN_HOST, port))
+                servers.append(transport)
+        except OSError:
+            continue
+        (udp_silent if silent else udp_open).append(port)
+
+    async def search(request):
+        await asyncio.sleep(config["cve_latency"])
+        product = request.match_info["product"]
+        return web.json_response([{"id": f"CVE-2000-{n:04d}", "summary": f"{product} issue {n}", "cvss": 5.0}
+                                  for n in range(5)])
+
+    app = web.Application()
+    app.add_routes([web.get("/api/search/{vendor}/{product}", search)])
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    api = socket.socket()
+    api.bind(("127.0.0.1", 0))
+    await web.SockSite(runner, api).start()
+    api_port = api.getsockname()[1]
+
+    conn.send({"open": open_ports, "slow": slow_ports, "filtered": filtered_ports,
+               "udp_open": udp_open, "udp_silent": udp_silent,
+               "closed": config["span"] - len(open_ports) - len(slow_ports),
+               "cve_api": f"http://127.0.0.1:{api_port}/api/search/"})
+    # Serve until the parent says stop (or goes away).
+    await asyncio.get_running_loop().run_in_executor(None, _wait_for_stop, conn)
+    await runner.cleanup()
+    for server in servers:
+        server.close()
+    for sock in held:
+        sock.close()
+
+
+def _wait_for_stop(conn):
+    try:
+        conn.recv()
+    except EOFError:
+        pass
+
+
+# -- phases ------------------------------------------------------------------
+
+def _phase_scan(config: dict, fx: dict) -> dict:
+    from scanner_async import AsyncPortScanner
+    latencies: List[float] = []
+
+    class TimedScanner(AsyncPortScanner):
+        async def _probe(self, host, port, attempt, window):
+            start = time.perf_counter()
+            try:
+                return await super()._probe(host, port, attempt, window)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    base = config["base_port"]
+    scanner = TimedScanner(OPEN_HOST, list(range(base, base + config["span"])), config["concurrency"],
+                           config["timeout"], backend=config["backend"])
+    scanner.show_progress = False
+    found = asyncio.run(scanner.run())
+    expected = len(fx["open"]) + len(fx["slow"])
+    return {"ops": config["span"], "latencies": latencies,
+            "found": len(found), "correct": len(found) == expected}
+
+
+def _phase_scan_filtered(config: dict, fx: dict) -> dict:
+    from scanner_async import AsyncPortScanner, FILTERED
+    latencies = []
+    start = time.perf_counter()
+    scanner = AsyncPortScanner(FILTERED_HOST, fx["filtered"], config["concurrency"], config["filtered_timeout"],
+                               retries=0, backend=config["backend"], show_progress=False,
+                               on_result=lambda host, port, state: latencies.append(time.perf_counter() - start))
+    asyncio.run(scanner.run())
+    filtered = sum(1 for s in scanner.results.values() if s == FILTERED)
+    # Completion times, not per-probe latency: shows how well timeouts overlap.
+    return {"ops": len(fx["filtered"]), "latencies": latencies, "found": filtered,
+            "correct": filtered == len(fx["filtered"])}
+
+
+def _phase_banner(config: dict, fx: dict) -> dict:
+    from banner import BannerGrabber
+    latencies: List[float] = []
+
+    class TimedGrabber(BannerGrabber):
+        async def _grab_async(self, port, host=None):
+            start = time.perf_counter()
+            try:
+                return await super()._grab_async(port, host)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    ports = fx["open"] + fx["slow"]
+    grabber = TimedGrabber(OPEN_HOST, config["timeout"], concurrency=config["banner_concurrency"])
+    banners = asyncio.run(grabber.grab_many(ports))
+    got = sum(1 for b in banners.values() if b)
+    return {"ops": len(ports), "latencies": latencies, "found": got, "correct": got == len(ports)}
+
+
+def _phase_udp(config: dict, fx: dict) -> dict:
+    from udp_scanner import OPEN_FILTERED, UDPScanner
+    base = config["base_port"]
+    scanner = UDPScanner([OPEN_HOST], range(base, base + config["udp_span"]), config["filtered_timeout"],
+                         retries=1, rate=config["udp_rate"], inflight=config["concurrency"], show_progress=False)
+    latencies = []
+    start = time.perf_counter()
+    scanner.on_result = lambda host, port, state: latencies.append(time.perf_counter() - start)
+    found = asyncio.run(scanner.run()).get(OPEN_HOST, [])
+    silent = scanner.open_filtered.get(OPEN_HOST, [])
+    # Completion times, as for scan_filtered: silent ports wait out every retransmission.
+    return {"ops": config["udp_span"], "latencies": latencies, "found": len(found),
+            "correct": found == fx["udp_open"] and silent == fx["udp_silent"]
+                       and scanner.stats.get("closed", 0) == config["udp_span"] - len(found) - len(silent)}
+
+
+def _phase_discovery(config: dict, fx: dict) -> dict:
+    from network_scanner import discover_network
+    from targets import TargetSpace
+    hosts = discover_network(DISCOVERY_NET, method="tcp", tcp_ports=[config["base_port"]], timeout_ms=500)
+    size = len(TargetSpace.parse(DISCOVERY_NET))
+    return {"ops": size, "latencies": [], "found": len(hosts), "correct": len(hosts) == size}
+
+
+def _phase_ping_sweep(config: dict, fx: dict) -> Optional[dict]:
+    if not shutil.which("ping"):
+        return None
+    from network_scanner import ping_sweep
+    from targets import TargetSpace
+    ips = TargetSpace.parse(PING_NET)
+    active = ping_sweep(ips, workers=64, timeout_ms=500)
+    return {"ops": len(ips), "latencies": [], "found": len(active), "correct": len(active) == len(ips)}
+
+
+def _phase_cve(config: dict, fx: dict) -> dict:
+    import cve_lookup
+    from cve_client import CVEClient
+    latencies: List[float] = []
+
+    class TimedClient(CVEClient):
+        async def search(self, query):
+            start = time.perf_counter()
+            try:
+                return await super().search(query)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    cve_lookup.CVEClient = TimedClient
+    lookup = cve_lookup.CVELookup(cache=None)
+    lookup.index = None
+    lookup.API_BASE = fx["cve_api"]
+    banners = {f"10.0.{i // 250}.{i % 250}:22": _SERVICE_BANNERS[i % len(_SERVICE_BANNERS)]
+               for i in range(config["services"])}
+    results = asyncio.run(lookup.check_services_async(banners))
+    hits = sum(1 for r in results.values() if r)
+    return {"ops": len(banners), "latencies": latencies, "found": hits, "correct": hits == len(banners)}
+
+
+def _phase_report(config: dict, fx: dict) -> dict:
+    from reporter import Reporter
+    n = config["findings"]
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:22" for i in range(n)]
+    reporter = Reporter("bench", keys, {k: _BANNER.decode().strip() for k in keys},
+                        {k: [{"id": "CVE-2000-0001", "cvss": 5.0}] for k in keys},
+                        {k: "Outdated OpenSSH; upgrade." for k in keys},
+                        {k: {"service": "ssh", "product": "OpenSSH", "version": "8.2p1"} for k in keys})
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext in (".json", ".md", ".html"):
+            start = time.perf_counter()
+            reporter.save(os.path.join(tmp, "report" + ext))
+            latencies.append(time.perf_counter() - start)
+    return {"ops": n * 3, "latencies": latencies, "found": n, "correct": True}
+
+
+# Modules that must load only when the phase needing them runs.
+_HEAVY = ("rich", "aiohttp")
+_HEAVY_CHECK = "import sys; {}; sys.exit(sorted(m for m in {!r} if m in sys.modules) or None)"
+_STARTUP = (
+    ["main.py", "--help"],
+    ["-c", _HEAVY_CHECK.format("import main", _HEAVY)],
+    ["-c", _HEAVY_CHECK.format("import scanner_async, banner, resolver, targets, events", _HEAVY)],
+)
+
+
+def _phase_startup(config: dict, fx: dict) -> dict:
+    import subprocess
+    root = os.path.dirname(os.path.abspath(__file__))
+    latencies = []
+    heavy = set()
+    for _ in range(config["startup_runs"]):
+        for args in _STARTUP:
+            start = time.perf_counter()
+            r = subprocess.run([sys.executable] + args, cwd=root, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, text=True)
+            latencies.append(time.perf_counter() - start)
+            if r.returncode:
+                heavy.add(r.stderr.strip() or f"exit {r.returncode}")
+    return {"ops": len(latencies), "latencies": latencies, "found": len(heavy), "correct": not heavy}
+
+
+_RUNNERS = {name: globals()[f"_phase_{name}"] for name in PHASES}
+
+
+def _rusage():
+    if resource is None:
+        return None, None
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    rss = ru.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else ru.ru_maxrss / 1024
+    return ru.ru_utime + ru.ru_stime, rss
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def _phase_main(name: str, config: dict, fx: dict, conn):
+    try:
+        cpu0, _ = _rusage()
+        start = time.perf_counter()
+        out = _RUNNERS[name](config, fx)
+        wall = time.perf_counter() - start
+        cpu1, rss = _rusage()
+        if out is None:
+            conn.send({"skipped": True})
+            return
+        lat = out.pop("latencies")
+        out.update(wall_s=round(wall, 4), ops_per_s=round(out["ops"] / wall, 1) if wall else None,
+                   p50_ms=_ms(_percentile(lat, 0.50)), p95_ms=_ms(_percentile(lat, 0.95)),
+                   p99_ms=_ms(_percentile(lat, 0.99)), max_ms=_ms(max(lat) if lat else None),
+                   cpu_s=round(cpu1 - cpu0, 3) if cpu0 is not None else None,
+                   peak_rss_mb=round(rss, 1) if rss is not None else None)
+        conn.send(out)
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_phase(ctx, name: str, config: dict, fx: dict) -> dict:
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_phase_main, args=(name, config, fx, child))
+    proc.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {"error": f"phase process exited with code {proc.exitcode}"}
+    proc.join()
+    return result
+
+
+def _median_runs(runs: List[dict]) -> dict:
+    """One result per phase from ``--repeat`` runs: the median of each number."""
+    if len(runs) == 1 or any("error" in r or "skipped" in r for r in runs):
+        return runs[0]
+    out = dict(runs[-1])
+    for key, value in out.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            values = [r[key] for r in runs if r.get(key) is not None]
+            out[key] = round(statistics.median(values), 3) if values else None
+    out["correct"] = all(r.get("correct") for r in runs)
+    out["runs"] = len(runs)
+    return out
+
+
+def run_benchmarks(config: dict, phases=PHASES, repeat: int = 1) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    fixture = ctx.Process(target=_fixture_main, args=(config, child), daemon=True)
+    fixture.start()
+    results = {}
+    try:
+        if not parent.poll(60):
+            raise RuntimeError("fixtures did not start")
+        fx = parent.recv()
+        console.print(f"[cyan]Fixtures:[/cyan] {len(fx['open'])} open, {len(fx['slow'])} slow-banner, "
+                      f"{fx['closed']} closed, {len(fx['filtered'])} filtered ports; CVE stub at {fx['cve_api']}")
+        for name in phases:
+            console.print(f"[cyan]Running {name}[/cyan]")
+            results[name] = _median_runs([run_phase(ctx, name, config, fx) for _ in range(max(1, repeat))])
+    finally:
+        try:
+            parent.send("stop")
+        except (BrokenPipeError, OSError):
+            pass
+        fixture.join(timeout=10)
+        if fixture.is_alive():
+            fixture.terminate()
+    return {
+        "meta": {"timestamp": datetime.utcnow().isoformat() + "Z", "python": platform.python_version(),
+                 "platform": platform.platform(), "cpus": os.cpu_count(), "config": config, "repeat": repeat},
+        "phases": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.15) -> List[dict]:
+    """Per-metric changes against ``baseline``; ``regression`` marks worse-than-threshold ones."""
+    rows = []
+    for phase, now in current["phases"].items():
+        then = baseline.get("phases", {}).get(phase)
+        if not then or "error" in now or "error" in then or "skipped" in now or "skipped" in then:
+            continue
+        for metric, higher_better in METRICS.items():
+            old, new = then.get(metric), now.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_better else change
+            rows.append({"phase": phase, "metric": metric, "baseline": old, "current": new,
+                         "change": round(change, 4), "regression": worse > threshold})
+    return rows
+
+
+def _print_results(report: dict):
+    table = Table(title="Benchmark results")
+    for col in ("phase", "ops", "wall s", "ops/s", "p50 ms", "p95 ms", "p99 ms", "cpu s", "peak RSS MB", "ok"):
+        table.add_column(col, justify="left" if col == "phase" else "right")
+    for phase, r in report["phases"].items():
+        if "error" in r or "skipped" in r:
+            table.add_row(phase, *[""] * 8, r.get("error", "skipped"))
+            continue
+        cells = [r.get(k) for k in ("ops", "wall_s", "ops_per_s", "p50_ms", "p95_ms", "p99_ms", "cpu_s",
+                                    "peak_rss_mb")]
+        table.add_row(phase, *["-" if c is None else str(c) for c in cells],
+                      "[green]yes[/green]" if r.get("correct") else "[red]no[/red]")
+    console.print(table)
+
+
+def _print_comparison(rows: List[dict], threshold: float):
+    table = Table(title=f"Against baseline (regression threshold {threshold:.0%})")
+    for col in ("phase", "metric", "baseline", "current", "change", ""):
+        table.add_column(col, justify="left" if col in ("phase", "metric") else "right")
+    for row in rows:
+        table.add_row(row["phase"], row["metric"], str(row["baseline"]), str(row["current"]),
+                      f"{row['change']:+.1%}", "[red]REGRESSION[/red]" if row["regression"] else "")
+    console.print(table)
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Loopback benchmarks for InvisiScan")
+    p.add_argument("--phases", default=",".join(PHASES), help="comma-separated subset of: " + ", ".join(PHASES))
+    p.add_argument("--repeat", type=int, default=1, help="run each phase N times and keep the medians")
+    p.add_argument("--base-port", type=int, default=20000, help="first fixture port")
+    p.add_argument("--span", type=int, default=10000, help="ports scanned on the open host")
+    p.add_argument("--open", type=int, default=2000, help="listening ports that answer with a banner at once")
+    p.add_argument("--slow", type=int, default=50, help="listening ports that wait before their banner")
+    p.add_argument("--slow-delay", type=float, default=0.2)
+    p.add_argument("--filtered", type=int, default=200, help="ports whose connects time out")
+    p.add_argument("--concurrency", type=int, default=500)
+    p.add_argument("--banner-concurrency", type=int, default=100)
+    p.add_argument("--timeout", type=float, default=1.0)
+    p.add_argument("--filtered-timeout", type=float, default=0.5)
+    p.add_argument("--backend", choices=("stream", "raw"), default="stream")
+    p.add_argument("--udp-span", type=int, default=5000, help="UDP ports scanned on the open host")
+    p.add_argument("--udp-open", type=int, default=200, help="UDP ports that answer every datagram")
+    p.add_argument("--udp-silent", type=int, default=50, help="bound UDP ports that never answer")
+    p.add_argument("--udp-rate", type=float, default=0.0, help="UDP scan send rate in packets/s (0: unpaced)")
+    p.add_argument("--services", type=int, default=500, help="banners looked up in the CVE phase")
+    p.add_argument("--cve-latency", type=float, default=0.02, help="stub CVE API response delay in seconds")
+    p.add_argument("--findings", type=int, default=20000, help="findings written per report format")
+    p.add_argument("--startup-runs", type=int, default=10, help="fresh interpreters per startup command")
+    p.add_argument("--out", default="benchmark.json", help="where to write the results")
+    p.add_argument("--compare", default=None, help="baseline results to compare against")
+    p.add_argument("--threshold", type=float, default=0.15, help="relative change that counts as a regression")
+    args = p.parse_args(argv)
+
+    phases = [x.strip() for x in args.phases.split(",") if x.strip()]
+    unknown = [x for x in phases if x not in PHASES]
+    if unknown:
+        p.error(f"unknown phases: {', '.join(unknown)}")
+    if args.open + args.slow > args.span:
+        p.error("--span must cover --open + --slow")
+    if args.udp_open + args.udp_silent > args.udp_span:
+        p.error("--udp-span must cover --udp-open + --udp-silent")
+    config = {k: getattr(args, k) for k in ("base_port", "span", "open", "slow", "slow_delay", "filtered",
+                                            "concurrency", "banner_concurrency", "timeout", "filtered_timeout",
+                                            "backend", "services", "cve_latency", "findings", "startup_runs",
+                                            "udp_span", "udp_open", "udp_silent", "udp_rate")}
+    report = run_benchmarks(config, phases, args.repeat)
+    _print_results(report)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    console.print(f"[bold green]Saved results → {args.out}[/bold green]")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("config") != config:
+            console.print("[yellow]Baseline was recorded with different settings; changes may not be comparable.[/yellow]")
+        rows = compare(baseline, report, args.threshold)
+        _print_comparison(rows, args.threshold)
+        regressions = [r for r in rows if r["regression"]]
+        if regressions:
+            console.print(f"[bold red]{len(regressions)} regressions[/bold red]")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
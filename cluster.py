@@ -0,0 +1,315 @@
+# cluster.py
+"""Distribute one scan over several scanner nodes.
+
+The coordinator cuts the job into shards (a block of targets x a block of
+ports) and serves them over a small JSON-over-HTTP protocol:
+
+    POST /lease     {"worker"}                        -> {"shard": {...}, "lease": s}
+                                                         | {"wait": s} | {"done": true}
+    POST /renew     {"worker", "shard"}               -> {"ok": bool}
+    POST /results   {"worker", "shard", "records"}    -> {"ok": true}
+    POST /complete  {"worker", "shard"}               -> {"ok": bool}
+    POST /release   {"worker", "shard", "error"}      -> {"ok": bool}
+
+A lease that is not renewed in time expires and the shard goes back to
+the front of the queue for another worker. A worker whose scan of a
+shard fails releases it, and the shard goes to the back of the queue. A slow or lost segment
+therefore delays only its own shards. Findings are accepted from any
+holder, including an expired one, and de-duplicated by (host, port), so
+a re-dispatched shard never double-counts. Workers stream records as
+they find them, so the coordinator's result set fills in while shards
+are still running.
+
+Requests carry a shared secret in ``X-Scan-Token``. ``main.py coordinate``
+listens on loopback by default and refuses any other address without a
+token, since anyone who can reach the port could lease shards or inject
+findings.
+"""
+import asyncio
+import hmac
+import ipaddress
+import socket
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from banner import BannerGrabber
+from events import LazyConsole
+from fingerprint import Fingerprint
+from scanner_async import OPEN, ScanScheduler
+from targets import PortSpace, TargetSpace
+
+console = LazyConsole()
+
+DEFAULT_PORT = 7700
+
+
+def is_loopback(host: str) -> bool:
+    """True when ``host`` only accepts connections from this machine."""
+    host = host.strip("[]")
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def make_shards(targets: TargetSpace, ports: PortSpace, hosts_per_shard: int = 256,
+                ports_per_shard: int = 1024) -> List[dict]:
+    shards = []
+    for t in range(0, targets.size, max(1, hosts_per_shard)):
+        tslice = targets.slice(t, t + hosts_per_shard)
+        for p in range(0, ports.size, max(1, ports_per_shard)):
+            pslice = ports.slice(p, p + ports_per_shard)
+            shards.append({"id": len(shards), "targets": tslice.spec(), "ports": pslice.spec(),
+                           "size": tslice.size * pslice.size})
+    return shards
+
+
+class Coordinator:
+    def __init__(self, shards: List[dict], lease: float = 30.0, options: Optional[dict] = None,
+                 token: str = "", on_open: Optional[Callable[[str, int], None]] = None):
+        self.shards = {s["id"]: s for s in shards}
+        self.lease = lease
+        self.options = options or {}
+        self.token = token
+        self.on_open = on_open
+        self.found: Dict[str, List[int]] = {}
+        self.banners: Dict[str, Dict[int, str]] = {}
+        self.fingerprints: Dict[Tuple[str, int], Fingerprint] = {}
+        self.redispatched = 0
+        self._seen = set()
+        self._pending = deque(self.shards)
+        self._leases: Dict[int, Tuple[str, float]] = {}
+        self._done = set()
+        self._finished = asyncio.Event()
+        self.app = web.Application()
+        self.app.add_routes([web.post("/lease", self._lease), web.post("/renew", self._renew),
+                             web.post("/results", self._results), web.post("/complete", self._complete),
+                             web.post("/release", self._release)])
+
+    @property
+    def progress(self) -> Tuple[int, int]:
+        return len(self._done), len(self.shards)
+
+    async def _body(self, request) -> dict:
+        if self.token and not hmac.compare_digest(request.headers.get("X-Scan-Token", "").encode(),
+                                                  self.token.encode()):
+            raise web.HTTPForbidden()
+        try:
+            return await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest()
+
+    def _expire(self):
+        now = time.monotonic()
+        for sid, (worker, deadline) in list(self._leases.items()):
+            if deadline < now:
+                del self._leases[sid]
+                self._pending.appendleft(sid)
+                self.redispatched += 1
+                console.print(f"[yellow]Lease on shard {sid} held by {worker} expired; re-dispatching[/yellow]")
+
+    async def _lease(self, request):
+        body = await self._body(request)
+        self._expire()
+        if len(self._done) == len(self.shards):
+            return web.json_response({"done": True})
+        if not self._pending:
+            return web.json_response({"wait": min(2.0, self.lease / 4)})
+        sid = self._pending.popleft()
+        self._leases[sid] = (body.get("worker", "?"), time.monotonic() + self.lease)
+        return web.json_response({"shard": self.shards[sid], "lease": self.lease, "options": self.options})
+
+    async def _renew(self, request):
+        body = await self._body(request)
+        self._expire()
+        sid, worker = body.get("shard"), body.get("worker")
+        held = self._leases.get(sid)
+        if held is None or held[0] != worker:
+            return web.json_response({"ok": False})
+        self._leases[sid] = (worker, time.monotonic() + self.lease)
+        return web.json_response({"ok": True})
+
+    async def _results(self, request):
+        body = await self._body(request)
+        for rec in body.get("records", ()):
+            host, port = rec.get("host"), rec.get("port")
+            if not host or port is None:
+                continue
+            if rec.get("type") == "open":
+                if (host, port) not in self._seen:
+                    self._seen.add((host, port))
+                    self.found.setdefault(host, []).append(port)
+                    if self.on_open is not None:
+                        self.on_open(host, port)
+            elif rec.get("type") == "banner":
+                self.banners.setdefault(host, {})[port] = rec.get("banner", "")
+                if rec.get("fingerprint"):
+                    self.fingerprints[(host, port)] = Fingerprint(**rec["fingerprint"])
+        return web.json_response({"ok": True})
+
+    async def _complete(self, request):
+        body = await self._body(request)
+        sid = body.get("shard")
+        if sid not in self.shards:
+            return web.json_response({"ok": False})
+        self._leases.pop(sid, None)
+        if sid in self._pending:
+            # Completed by an earlier holder after its lease had lapsed.
+            self._pending.remove(sid)
+        self._done.add(sid)
+        if len(self._done) == len(self.shards):
+            self._finished.set()
+        return web.json_response({"ok": True})
+
+    async def _release(self, request):
+        body = await self._body(request)
+        sid, worker = body.get("shard"), body.get("worker")
+        held = self._leases.get(sid)
+        if held is None or held[0] != worker:
+            return web.json_response({"ok": False})
+        del self._leases[sid]
+        self._pending.append(sid)
+        self.redispatched += 1
+        console.print(f"[yellow]Shard {sid} failed on {worker} ({body.get('error', '')}); re-dispatching[/yellow]")
+        return web.json_response({"ok": True})
+
+    async def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, linger: float = 5.0):
+        """Serve until every shard is complete; return ``{host: sorted open ports}``."""
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        try:
+            while not self._finished.is_set():
+                try:
+                    await asyncio.wait_for(self._finished.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    self._expire()
+            # Let polling workers hear "done" before the listener goes away.
+            await asyncio.sleep(linger)
+        finally:
+            await runner.cleanup()
+        return {h: sorted(p) for h, p in self.found.items()}
+
+
+class Worker:
+    """Scanner daemon: lease a shard, scan it, stream findings, repeat."""
+
+    def __init__(self, coordinator: str, name: Optional[str] = None, concurrency: int = 500,
+                 token: str = "", flush_interval: float = 0.5, give_up: float = 60.0,
+                 retry_delay: float = 2.0):
+        self.url = coordinator.rstrip("/")
+        self.name = name or socket.gethostname()
+        self.concurrency = concurrency
+        self.token = token
+        self.flush_interval = flush_interval
+        self.give_up = give_up
+        self.retry_delay = retry_delay
+        self.shards_done = 0
+        self.shards_failed = 0
+
+    async def _post(self, session, path: str, payload: dict) -> dict:
+        async with session.post(self.url + path, json=payload, headers={"X-Scan-Token": self.token}) as r:
+            r.raise_for_status()
+            return await r.json()
+
+    async def _release(self, session, sid: int, error: str):
+        try:
+            await self._post(session, "/release", {"worker": self.name, "shard": sid, "error": error})
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # Unreachable: the lease lapses and the shard is re-dispatched anyway.
+            pass
+
+    async def run(self, once: bool = False):
+        unreachable_since = None
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+            while True:
+                try:
+                    reply = await self._post(session, "/lease", {"worker": self.name})
+                    unreachable_since = None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    now = time.monotonic()
+                    unreachable_since = unreachable_since or now
+                    if now - unreachable_since > self.give_up:
+                        console.print(f"[red]Coordinator unreachable for {self.give_up:.0f}s ({e}); exiting[/red]")
+                        return
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+                if reply.get("done"):
+                    return
+                if "shard" not in reply:
+                    await asyncio.sleep(reply.get("wait", 1.0))
+                    continue
+                try:
+                    await self._scan(session, reply["shard"], reply["lease"], reply.get("options", {}))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    # The lease will lapse and the shard goes to someone else.
+                    console.print(f"[red]{self.name}: lost contact during shard {reply['shard']['id']}: {e}[/red]")
+                    await asyncio.sleep(self.retry_delay)
+                except Exception as e:
+                    # A bad shard or a local scanner failure: hand the shard
+                    # back so another worker can take it, and keep serving.
+                    self.shards_failed += 1
+                    console.print(f"[red]{self.name}: shard {reply['shard']['id']} failed: {e!r}[/red]")
+                    await self._release(session, reply["shard"]["id"], repr(e))
+                    await asyncio.sleep(self.retry_delay)
+                if once:
+                    return
+
+    async def _scan(self, session, shard: dict, lease: float, options: dict):
+        sid = shard["id"]
+        records: List[dict] = []
+        targets = TargetSpace.parse(shard["targets"])
+        ports = PortSpace.parse(shard["ports"])
+        timeout = options.get("timeout", 1.0)
+        grabber = BannerGrabber(targets[0], timeout)
+
+        def on_result(host, port, state):
+            if state == OPEN:
+                records.append({"type": "open", "host": host, "port": port})
+
+        async def on_open(host, port, reader, writer):
+            banner = await grabber.grab_stream(reader, writer, port, host)
+            fp = grabber.fingerprints.get((host, port))
+            records.append({"type": "banner", "host": host, "port": port, "banner": banner,
+                            "fingerprint": fp._asdict() if fp is not None else None})
+
+        scanner = ScanScheduler(targets, ports, self.concurrency, timeout,
+                                retries=options.get("retries", 1), adaptive=options.get("adaptive", True),
+                                backend=options.get("backend", "stream"), per_host=options.get("per_host"),
+                                on_open=on_open, on_result=on_result, show_progress=False)
+        console.print(f"[cyan]{self.name}: shard {sid} ({shard['size']} probes)[/cyan]")
+        scan = asyncio.create_task(scanner.run())
+
+        async def flush():
+            if records:
+                batch = records[:]
+                del records[:len(batch)]
+                await self._post(session, "/results", {"worker": self.name, "shard": sid, "records": batch})
+
+        last_renew = time.monotonic()
+        try:
+            while not scan.done():
+                await asyncio.wait({scan}, timeout=self.flush_interval)
+                await flush()
+                if time.monotonic() - last_renew >= lease / 3:
+                    last_renew = time.monotonic()
+                    if not (await self._post(session, "/renew", {"worker": self.name, "shard": sid})).get("ok"):
+                        # Someone else holds the shard now; stop duplicating their work.
+                        console.print(f"[yellow]{self.name}: lost lease on shard {sid}[/yellow]")
+                        scan.cancel()
+                        return
+            scan.result()
+            await flush()
+            await self._post(session, "/complete", {"worker": self.name, "shard": sid})
+            self.shards_done += 1
+        finally:
+            if not scan.done():
+                scan.cancel()
+            await asyncio.gather(scan, return_exceptions=True)
@@ -0,0 +1,155 @@
+# cve_client.py
+"""Asynchronous client for the online CVE search API.
+
+All requests share one aiohttp session with a bounded connection pool.
+Concurrent lookups for the same query key share a single request. A 429
+response is retried after ``Retry-After`` seconds, or after an exponential
+backoff when the server gives no delay. Answers are kept in an on-disk
+SQLite cache with a TTL. When the cache holds more than ``max_entries``
+keys, the least recently used ones are evicted, so repeated scans of
+the same products never leave the machine. aiohttp is only imported when
+a client opens its session; cached and offline lookups never load it.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import aiohttp
+
+CACHE_FILE = os.environ.get(
+    "INVISISCAN_CVE_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cve_cache.db"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    stored REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+"""
+
+
+class ResponseCache:
+    """TTL + size-bounded LRU cache of JSON bodies in SQLite."""
+
+    def __init__(self, path: str = CACHE_FILE, ttl: float = 86400.0, max_entries: int = 5000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def get(self, key: str):
+        row = self._db.execute("SELECT body, stored FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > self.ttl:
+            with self._db:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        with self._db:
+            self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value):
+        now = time.time()
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                             (key, json.dumps(value), now, now))
+            excess = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._db.execute("DELETE FROM responses WHERE key IN "
+                                 "(SELECT key FROM responses ORDER BY used LIMIT ?)", (excess,))
+
+    def close(self):
+        self._db.close()
+
+
+class CVEClient:
+    def __init__(self, base: str, cache: Optional[ResponseCache] = None, concurrency: int = 8,
+                 timeout: float = 6.0, max_retries: int = 4, backoff: float = 1.0, limit: Optional[int] = None):
+        self.base = base
+        # Results beyond ``limit`` are dropped before caching.
+        self.limit = limit
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.requests = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    async def __aenter__(self):
+        import aiohttp
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+        return False
+
+    async def search(self, query: str) -> List[dict]:
+        """Results for ``query`` (e.g. ``openbsd/openssh``); [] on any failure."""
+        if not query:
+            return []
+        if self.cache is not None:
+            cached = self.cache.get(query)
+            if cached is not None:
+                return cached
+        pending = self._inflight.get(query)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[query] = future
+        try:
+            data = await self._fetch(query)
+            if data is not None and self.cache is not None:
+                self.cache.put(query, data)
+            result = data or []
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't leave the exception unretrieved.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[query]
+
+    async def _fetch(self, query: str) -> Optional[List[dict]]:
+        import aiohttp
+        delay = self.backoff
+        for _ in range(self.max_retries + 1):
+            try:
+                self.requests += 1
+                async with self._session.get(self.base + query) as r:
+                    status = r.status
+                    retry_after = r.headers.get("Retry-After", "")
+                    data = await r.json(content_type=None) if status == 200 else None
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                return None
+            if status == 429:
+                # Sleep with the connection back in the pool.
+                await asyncio.sleep(float(retry_after) if retry_after.isdigit() else delay)
+                delay *= 2
+                continue
+            if status != 200:
+                return None
+            if isinstance(data, dict):
+                data = data.get('results') or data.get('data') or []
+            if not isinstance(data, list):
+                return []
+            return data[:self.limit] if self.limit else data
+        return None
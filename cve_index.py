@@ -0,0 +1,284 @@
+# cve_index.py
+"""Offline CVE index built from NVD JSON feeds.
+
+Feeds, either the legacy 1.1 ``nvdcve-1.1-*.json[.gz]`` files or NVD API
+2.0 responses, are imported into a SQLite file. Each row in ``matches`` is
+one vulnerable CPE match: vendor, product, an exact version or ``*``, and
+an optional start/end range. Rows are indexed on (vendor, product).
+Lookups pull the rows for one product once, cache them, and compare
+versions in Python.
+
+Imports are incremental. A CVE whose ``lastModified`` is not newer than
+the stored one is skipped. Otherwise its match rows are replaced. This
+means the daily ``modified`` feed can be applied over an existing index
+without rebuilding it.
+"""
+import gzip
+import json
+import os
+import re
+import sqlite3
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+CVE_DB = os.environ.get("INVISISCAN_CVE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cve.db"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cves (
+    id TEXT PRIMARY KEY,
+    published TEXT,
+    modified TEXT,
+    score REAL,
+    severity TEXT,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS matches (
+    cve_id TEXT NOT NULL,
+    vendor TEXT NOT NULL,
+    product TEXT NOT NULL,
+    version TEXT NOT NULL,
+    start_incl TEXT,
+    start_excl TEXT,
+    end_incl TEXT,
+    end_excl TEXT
+);
+CREATE INDEX IF NOT EXISTS matches_product ON matches (vendor, product);
+CREATE INDEX IF NOT EXISTS matches_cve ON matches (cve_id);
+CREATE TABLE IF NOT EXISTS feeds (
+    name TEXT PRIMARY KEY,
+    imported TEXT,
+    cves INTEGER
+);
+"""
+
+_PRERELEASE = {"dev", "pre", "alpha", "a", "beta", "b", "rc"}
+_ANY = ("*", "-", "")
+
+
+def version_key(version: str) -> Tuple:
+    """Sort key for dotted versions, e.g. ``8.2p1`` > ``8.2`` > ``8.2rc1``.
+
+    Numbers compare numerically. Pre-release tags sort below the release
+    they precede. Other letters such as ``p1`` sort above it.
+    """
+    key = []
+    for token in re.findall(r"\d+|[a-z]+", (version or "").lower()):
+        if token.isdigit():
+            key.append((2, int(token), ""))
+        elif token in _PRERELEASE:
+            key.append((-1, 0, token))
+        else:
+            key.append((1, 0, token))
+    key.append((0, 0, ""))
+    return tuple(key)
+
+
+def split_cpe(uri: str) -> List[str]:
+    """Split a CPE 2.3 formatted string (or a 2.2 URI) into unescaped parts."""
+    if uri.startswith("cpe:/"):
+        return ["cpe", "2.2"] + [p.replace("%2e", ".") for p in uri[5:].split(":")]
+    parts, cur, i = [], [], 0
+    while i < len(uri):
+        c = uri[i]
+        if c == "\\" and i + 1 < len(uri):
+            cur.append(uri[i + 1])
+            i += 2
+            continue
+        if c == ":":
+            parts.append("".join(cur))
+            cur = []
+        else:
+            cur.append(c)
+        i += 1
+    parts.append("".join(cur))
+    return parts
+
+
+def _cpe_fields(uri: str) -> Optional[Tuple[str, str, str]]:
+    """(vendor, product, version) from a CPE, folding NVD's update field in."""
+    parts = split_cpe(uri)
+    if len(parts) < 6:
+        return None
+    vendor, product, version = parts[3].lower(), parts[4].lower(), parts[5]
+    update = parts[6] if len(parts) > 6 else "*"
+    if version not in _ANY and update not in _ANY:
+        # NVD records OpenSSH 8.2p1 as version 8.2, update p1.
+        version += update
+    return vendor, product, version if version not in _ANY else "*"
+
+
+class Match:
+    __slots__ = ("cve_id", "version", "start_incl", "start_excl", "end_incl", "end_excl")
+
+    def __init__(self, cve_id, version, start_incl, start_excl, end_incl, end_excl):
+        self.cve_id = cve_id
+        self.version = version
+        self.start_incl = start_incl
+        self.start_excl = start_excl
+        self.end_incl = end_incl
+        self.end_excl = end_excl
+
+    @property
+    def ranged(self) -> bool:
+        return any((self.start_incl, self.start_excl, self.end_incl, self.end_excl))
+
+    def applies(self, version: str) -> bool:
+        if not version:
+            # Without a version only "every version" entries are certain.
+            return self.version == "*" and not self.ranged
+        if self.version != "*":
+            return version_key(self.version) == version_key(version)
+        key = version_key(version)
+        if self.start_incl and key < version_key(self.start_incl):
+            return False
+        if self.start_excl and key <= version_key(self.start_excl):
+            return False
+        if self.end_incl and key > version_key(self.end_incl):
+            return False
+        if self.end_excl and key >= version_key(self.end_excl):
+            return False
+        return True
+
+
+def _nvd_items(doc: dict) -> Iterator[dict]:
+    """Normalise 1.1 feed and 2.0 API records to one shape."""
+    for item in doc.get("CVE_Items", ()):
+        cve = item.get("cve", {})
+        desc = next((d.get("value", "") for d in cve.get("description", {}).get("description_data", ())
+                     if d.get("lang") == "en"), "")
+        impact = item.get("impact", {})
+        v3 = impact.get("baseMetricV3", {}).get("cvssV3", {})
+        v2 = impact.get("baseMetricV2", {})
+        score = v3.get("baseScore", v2.get("cvssV2", {}).get("baseScore"))
+        severity = v3.get("baseSeverity") or v2.get("severity") or ""
+        matches = []
+
+        def walk(nodes):
+            for node in nodes:
+                matches.extend(node.get("cpe_match", ()))
+                walk(node.get("children", ()))
+        walk(item.get("configurations", {}).get("nodes", ()))
+        yield {
+            "id": cve.get("CVE_data_meta", {}).get("ID", ""),
+            "published": item.get("publishedDate", ""),
+            "modified": item.get("lastModifiedDate", ""),
+            "score": score, "severity": severity, "summary": desc,
+            "matches": [(m.get("cpe23Uri", ""), m) for m in matches if m.get("vulnerable", True)],
+        }
+    for entry in doc.get("vulnerabilities", ()):
+        cve = entry.get("cve", {})
+        desc = next((d.get("value", "") for d in cve.get("descriptions", ()) if d.get("lang") == "en"), "")
+        score, severity = None, ""
+        metrics = cve.get("metrics", {})
+        for name in ("cvssMetricV31", "cvssMetricV30", "cvssMetricV2"):
+            if metrics.get(name):
+                data = metrics[name][0]
+                score = data.get("cvssData", {}).get("baseScore")
+                severity = data.get("cvssData", {}).get("baseSeverity") or data.get("baseSeverity", "")
+                break
+        matches = [(m.get("criteria", ""), m)
+                   for conf in cve.get("configurations", ())
+                   for node in conf.get("nodes", ())
+                   for m in node.get("cpeMatch", ()) if m.get("vulnerable", True)]
+        yield {
+            "id": cve.get("id", ""), "published": cve.get("published", ""),
+            "modified": cve.get("lastModified", ""),
+            "score": score, "severity": severity, "summary": desc, "matches": matches,
+        }
+
+
+def _load_feed(path: str) -> dict:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class CVEIndex:
+    def __init__(self, path: str = CVE_DB):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+        self._rows = lru_cache(maxsize=1024)(self._load_rows)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def import_feed(self, path: str) -> Tuple[int, int]:
+        """Merge one feed file; return (CVEs updated, CVEs skipped as unchanged)."""
+        return self.import_items(_nvd_items(_load_feed(path)), name=os.path.basename(path))
+
+    def import_items(self, items: Iterable[dict], name: str = "") -> Tuple[int, int]:
+        updated = skipped = 0
+        cur = self._db.cursor()
+        with self._db:
+            for item in items:
+                cid = item["id"]
+                if not cid:
+                    continue
+                row = cur.execute("SELECT modified FROM cves WHERE id = ?", (cid,)).fetchone()
+                if row and row[0] and item["modified"] and item["modified"] <= row[0]:
+                    skipped += 1
+                    continue
+                cur.execute("INSERT OR REPLACE INTO cves VALUES (?, ?, ?, ?, ?, ?)",
+                            (cid, item["published"], item["modified"], item["score"],
+                             item["severity"], item["summary"]))
+                cur.execute("DELETE FROM matches WHERE cve_id = ?", (cid,))
+                rows = set()
+                for uri, m in item["matches"]:
+                    fields = _cpe_fields(uri)
+                    if fields is None:
+                        continue
+                    rows.add((cid,) + fields + (m.get("versionStartIncluding"), m.get("versionStartExcluding"),
+                                                m.get("versionEndIncluding"), m.get("versionEndExcluding")))
+                cur.executemany("INSERT INTO matches VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                updated += 1
+            if name:
+                cur.execute("INSERT OR REPLACE INTO feeds VALUES (?, datetime('now'), ?)", (name, updated))
+        self._rows.cache_clear()
+        return updated, skipped
+
+    def _load_rows(self, vendor: str, product: str) -> Tuple[Match, ...]:
+        if vendor:
+            rows = self._db.execute(
+                "SELECT cve_id, version, start_incl, start_excl, end_incl, end_excl FROM matches "
+                "WHERE vendor = ? AND product = ?", (vendor, product))
+        else:
+            rows = self._db.execute(
+                "SELECT cve_id, version, start_incl, start_excl, end_incl, end_excl FROM matches "
+                "WHERE product = ?", (product,))
+        return tuple(Match(*r) for r in rows)
+
+    def lookup(self, vendor: str, product: str, version: str = "", limit: Optional[int] = None) -> List[dict]:
+        """CVEs whose vulnerable configurations cover this product version, highest score first."""
+        vendor, product = (vendor or "").lower(), (product or "").lower()
+        rows = self._rows(vendor, product)
+        if not rows and vendor:
+            # Vendors get renamed in NVD (nginx:nginx became f5:nginx); a
+            # product with no rows under our vendor is tried under any.
+            rows = self._rows("", product)
+        ids = {m.cve_id for m in rows if m.applies(version)}
+        if not ids:
+            return []
+        records = []
+        for cid in ids:
+            row = self._db.execute("SELECT id, published, score, severity, summary FROM cves WHERE id = ?",
+                                   (cid,)).fetchone()
+            if row:
+                records.append({"id": row[0], "published": row[1], "cvss": row[2],
+                                "severity": row[3], "summary": row[4]})
+        records.sort(key=lambda r: (-(r["cvss"] or 0), r["id"]))
+        return records[:limit] if limit else records
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cves": self._db.execute("SELECT COUNT(*) FROM cves").fetchone()[0],
+            "matches": self._db.execute("SELECT COUNT(*) FROM matches").fetchone()[0],
+            "feeds": self._db.execute("SELECT COUNT(*) FROM feeds").fetchone()[0],
+        }
@@ -1,36 +1,95 @@
-import requests
-from typing import Dict, List
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+from fingerprint import Fingerprint, default_db
+from cve_index import CVE_DB, CVEIndex
+from cve_client import CACHE_FILE, CVEClient, ResponseCache
 
 class CVELookup:
     API_BASE = 'https://cve.circl.lu/api/search/'
 
+    def __init__(self, index: Optional[str] = None, max_results: int = 5, cache: Optional[str] = CACHE_FILE,
+                 cache_ttl: float = 86400.0, concurrency: int = 8):
+        # An imported offline index (see `main.py cve-import`) is used when
+        # present; otherwise fall back to the online search API.  A path
+        # given explicitly must exist: opening it would create an empty
+        # index that silently finds nothing.
+        if index and not os.path.exists(index):
+            raise FileNotFoundError(f"no CVE index at {index} (build one with cve-import)")
+        path = index or CVE_DB
+        self.index = CVEIndex(path) if os.path.exists(path) else None
+        self.max_results = max_results
+        self.cache_path = cache
+        self.cache_ttl = cache_ttl
+        self.concurrency = concurrency
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def identify(self, banner: str) -> Optional[Fingerprint]:
+        return default_db().match(banner or '')
+
+    def _query(self, fp: Optional[Fingerprint]) -> str:
+        # Search by CPE vendor/product when the fingerprint has one, which is
+        # what the CVE database is keyed on; fall back to the product name.
+        if fp is None or fp.soft:
+            return ''
+        if fp.vendor and fp.cpe_product:
+            return f"{fp.vendor}/{fp.cpe_product}"
+        return (fp.product or '').split(' ')[0].lower()
+
+    def _offline(self, fp: Optional[Fingerprint]) -> List[dict]:
+        if fp is None or fp.soft or not (fp.cpe_product or fp.product):
+            return []
+        product = fp.cpe_product or fp.product.split(' ')[0].lower()
+        return self.index.lookup(fp.vendor, product, fp.version, limit=self.max_results)
+
     def _service_from_banner(self, banner: str) -> str:
-        b = (banner or '').lower()
-        if 'apache' in b:
-            return 'apache'
-        if 'nginx' in b:
-            return 'nginx'
-        if 'iis' in b or 'microsoft-iis' in b:
-            return 'iis'
-        if 'ssh' in b:
-            return 'openssh'
-        if 'mysql' in b or 'mariadb' in b:
-            return 'mysql'
-        if 'tomcat' in b:
-            return 'tomcat'
-        return ''
-
-    def check_services(self, banners: Dict[int, str]) -> Dict[int, List[dict]]:
-        results = {}
-        for port, banner in banners.items():
-            svc = self._service_from_banner(banner or '')
-            results[port] = []
-            if svc:
-                try:
-                    r = requests.get(self.API_BASE + svc, timeout=6)
-                    if r.status_code == 200:
-                        data = r.json()
-                        results[port] = data[:5]
-                except Exception:
-                    results[port] = []
-        return results
+        return self._query(self.identify(banner))
+
+    def check_services(self, banners: Dict[int, str],
+                       fingerprints: Optional[Dict[int, Fingerprint]] = None) -> Dict[int, List[dict]]:
+        return asyncio.run(self.check_services_async(banners, fingerprints))
+
+    @asynccontextmanager
+    async def client(self) -> AsyncIterator[CVEClient]:
+        """API client and response cache to pass to a run of ``check_services_async`` calls."""
+        cache = ResponseCache(self.cache_path, ttl=self.cache_ttl) if self.cache_path else None
+        try:
+            async with CVEClient(self.API_BASE, cache, concurrency=self.concurrency,
+                                 limit=self.max_results) as client:
+                yield client
+        finally:
+            if cache is not None:
+                cache.close()
+
+    async def check_services_async(self, banners: Dict[int, str],
+                                   fingerprints: Optional[Dict[int, Fingerprint]] = None,
+                                   client: Optional[CVEClient] = None) -> Dict[int, List[dict]]:
+        if not banners:
+            return {}
+        fingerprints = fingerprints or {}
+        fps = {port: fingerprints.get(port) or self.identify(banner or '') for port, banner in banners.items()}
+        if self.index is not None:
+            return {port: self._offline(fp) for port, fp in fps.items()}
+        if client is None:
+            async with self.client() as client:
+                return await self._search(client, fps)
+        return await self._search(client, fps)
+
+    async def _search(self, client: CVEClient, fps: Dict[int, Optional[Fingerprint]]) -> Dict[int, List[dict]]:
+        # Ten hosts running the same nginx are one query: the client
+        # coalesces identical keys and serves repeats from its disk cache.
+        queries = {port: self._query(fp) for port, fp in fps.items()}
+        found = await asyncio.gather(*(client.search(q) for q in queries.values()), return_exceptions=True)
+        return {port: r if isinstance(r, list) else [] for port, r in zip(queries, found)}
@@ -0,0 +1,77 @@
+# delta.py
+"""Delta rescans: use the previous results to order and prune the work.
+
+Ports found open last time are probed first, so anything that closed or
+changed shows up within seconds. The remaining ports are then swept
+across all hosts, most likely first: historical frequency in the history
+store, then global top-port rank, then port number. With a time budget,
+the scan stops after the most valuable probes are done. Banners that hash
+the same as last time keep their previous CVE hits and explanation.
+"""
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from history import banner_hash
+from resolver import without_hosts
+from scanner_async import ScanScheduler
+from targets import space_size
+
+# Most frequently open TCP ports on the internet, most common first
+# (after nmap's services frequency table).
+TOP_PORTS = (
+    80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306, 8080, 1723, 111, 995, 993, 5900,
+    1025, 587, 8888, 199, 1720, 465, 548, 113, 81, 6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000,
+    32768, 554, 26, 1433, 49152, 2001, 515, 8008, 49154, 1027, 5666, 646, 5000, 5631, 631, 49153, 8081,
+    2049, 88, 79, 5800, 106, 2121, 1110, 49155, 6000, 513, 990, 5357, 427, 49156, 543, 544, 5101, 144,
+    7, 389, 6379, 5432, 27017, 9200, 11211,
+)
+_TOP_RANK = {port: rank for rank, port in enumerate(TOP_PORTS)}
+
+
+def rank_ports(ports: Iterable[int], counts: Dict[int, int]) -> List[int]:
+    """``ports`` ordered by historical open count, then global rank, then number."""
+    unranked = len(TOP_PORTS)
+    return sorted(ports, key=lambda p: (-counts.get(p, 0), _TOP_RANK.get(p, unranked), p))
+
+
+class DeltaScheduler(ScanScheduler):
+    """ScanScheduler whose probe order comes from a previous scan.
+
+    ``known_open`` are the (host, port) pairs open last time. They are
+    probed first, and then skipped in the sweep of everything else.
+    ``randomize`` has no effect here.
+    """
+
+    def __init__(self, targets: Sequence[str], ports: Sequence[int],
+                 known_open: Iterable[Tuple[str, int]] = (), port_counts: Optional[Dict[int, int]] = None,
+                 **kwargs):
+        super().__init__(targets, ports, **kwargs)
+        self.known_open = [(h, p) for h, p in known_open if h in targets and p in ports]
+        self.port_counts = port_counts or {}
+
+    def _plan(self) -> Tuple[Iterator[Tuple[str, int]], int]:
+        targets = without_hosts(self.targets, self.unresolved)
+        skip = set(self.unresolved)
+        known_open = [(h, p) for h, p in self.known_open if h not in skip]
+        known = set(known_open)
+        order = rank_ports(self.ports, self.port_counts)
+
+        def probes():
+            yield from known_open
+            for port in order:
+                for host in targets:
+                    if (host, port) not in known:
+                        yield host, port
+
+        k, n = self.shard
+        total = space_size(targets) * space_size(self.ports)
+        return islice(probes(), k, None, n), len(range(k, total, n))
+
+
+def reuse_enrichment(previous: Dict[Tuple[str, int], dict], host: str, port: int,
+                     banner: str) -> Optional[dict]:
+    """Last scan's CVEs and explanation for this port if its banner is unchanged."""
+    prev = previous.get((host, port))
+    if not prev or not banner or prev.get("banner_hash") != banner_hash(banner):
+        return None
+    return prev
@@ -0,0 +1,207 @@
+# events.py
+"""Typed scan events and the bus that fans them out to subscribers.
+
+``run_scan`` reports everything it does as events on an EventBus: the
+rich console display, the JSON-lines output of ``--jsonl`` and any
+programmatic consumer are just subscribers. ``EventBus.run`` turns a
+scan coroutine into an async generator of its events:
+
+    bus = EventBus()
+    async for event in bus.run(run_scan(targets, ports, 500, 1.0, "r.json", events=bus)):
+        if isinstance(event, PortOpen):
+            ...
+
+Progress events are throttled at the source (see
+``ScanScheduler.progress_interval``), so a subscriber never sees one per
+probe. Nothing here imports rich until a ConsoleView or LazyConsole
+actually draws something.
+"""
+import asyncio
+import json
+import sys
+from typing import AsyncIterator, Awaitable, Callable, List, NamedTuple
+
+
+class ScanStarted(NamedTuple):
+    label: str
+    total: int
+    kind = "scan_started"
+
+
+class Progress(NamedTuple):
+    done: int
+    total: int
+    kind = "progress"
+
+
+class HostUp(NamedTuple):
+    host: str
+    kind = "host_up"
+
+
+class PortOpen(NamedTuple):
+    host: str
+    port: int
+    kind = "port_open"
+
+
+class PortOpenFiltered(NamedTuple):
+    """A UDP port that neither replied nor drew an ICMP error."""
+    host: str
+    port: int
+    kind = "port_open_filtered"
+
+
+class PortStates(NamedTuple):
+    """Probe verdict counts of a finished scan, e.g. {"open": 3, "closed": 1021}."""
+    counts: dict
+    kind = "port_states"
+
+
+class Banner(NamedTuple):
+    host: str
+    port: int
+    banner: str
+    kind = "banner"
+
+
+class ServiceFingerprint(NamedTuple):
+    host: str
+    port: int
+    fingerprint: dict
+    kind = "fingerprint"
+
+
+class CVEFound(NamedTuple):
+    host: str
+    port: int
+    cves: list
+    explanation: str
+    kind = "cve"
+
+
+class PhaseDone(NamedTuple):
+    phase: str
+    seconds: float
+    kind = "phase_done"
+
+
+class ScanDone(NamedTuple):
+    report: str
+    open_ports: int
+    kind = "scan_done"
+
+
+Subscriber = Callable[[NamedTuple], None]
+
+
+def to_dict(event) -> dict:
+    return {"type": event.kind, **event._asdict()}
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: List[Subscriber] = []
+
+    def subscribe(self, subscriber: Subscriber) -> Subscriber:
+        self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.remove(subscriber)
+
+    def emit(self, event):
+        for subscriber in self._subscribers:
+            subscriber(event)
+
+    async def run(self, scan: Awaitable) -> AsyncIterator:
+        """Run ``scan`` (which emits on this bus) and yield its events as they happen."""
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        self.subscribe(queue.put_nowait)
+        task = asyncio.ensure_future(scan)
+        task.add_done_callback(lambda _: queue.put_nowait(done))
+        try:
+            while True:
+                event = await queue.get()
+                if event is done:
+                    break
+                yield event
+            task.result()
+        finally:
+            self.unsubscribe(queue.put_nowait)
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+
+class JSONLines:
+    """Subscriber that writes each event as one JSON line (``--jsonl``)."""
+
+    def __init__(self, out=None, progress: bool = True):
+        self.out = out or sys.stdout
+        self.progress = progress
+
+    def __call__(self, event):
+        if not self.progress and isinstance(event, Progress):
+            return
+        self.out.write(json.dumps(to_dict(event), separators=(",", ":"), default=str) + "\n")
+        self.out.flush()
+
+
+def _discard(*args, **kwargs):
+    pass
+
+
+class LazyConsole:
+    """Stands in for a rich Console, which is only created on first output.
+
+    Commands that print nothing (``--help``, ``--quiet``, ``--jsonl``) never
+    import rich; while ``quiet`` is set, output calls are dropped.
+    """
+
+    def __init__(self, **kwargs):
+        self.quiet = False
+        self._kwargs = kwargs
+        self._console = None
+
+    @property
+    def rich(self):
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console(**self._kwargs)
+        return self._console
+
+    def __getattr__(self, name):
+        if self.quiet:
+            return _discard
+        return getattr(self.rich, name)
+
+
+class ConsoleView:
+    """Subscriber that draws the scan on a rich console: a rule, then a progress bar."""
+
+    def __init__(self, console=None):
+        self.console = console
+        self._progress = None
+        self._task = None
+
+    def __call__(self, event):
+        if isinstance(event, ScanStarted):
+            from rich.console import Console
+            from rich.progress import Progress as Bar, SpinnerColumn, BarColumn, TextColumn, TimeElapsedColumn
+            self.console = self.console or Console()
+            self.console.rule(f"[green]Scanning {event.label}[/green]")
+            self._progress = Bar(SpinnerColumn(), TextColumn("Scanning {task.fields[target]}"), BarColumn(),
+                                 TimeElapsedColumn(), console=self.console)
+            self._task = self._progress.add_task("scan", total=event.total, target=event.label)
+            self._progress.start()
+        elif isinstance(event, Progress) and self._progress is not None:
+            self._progress.update(self._task, completed=event.done, total=event.total)
+        elif isinstance(event, PhaseDone) and event.phase == "scan":
+            self.close()
+
+    def close(self):
+        if self._progress is not None:
+            self._progress.stop()
+            self._progress = None
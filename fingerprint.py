@@ -0,0 +1,362 @@
+# fingerprint.py
+"""Data-driven service fingerprinting from service-probes.txt.
+
+Rules are compiled once.  Every match regex contributes its leading
+literal (lower-cased) to a single Aho-Corasick automaton, so a banner is
+scanned once to find the few rules that can possibly match; only those
+regexes are run.  Rules without a usable literal are always candidates.
+UDP probes and their rules are compiled into a separate ProbeDB
+(``ProbeDB.udp``), so datagram signatures never see TCP banners.
+"""
+import os
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+
+PROBES_FILE = os.environ.get(
+    "INVISISCAN_PROBES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "service-probes.txt"))
+
+_ESCAPES = {ord("r"): 13, ord("n"): 10, ord("t"): 9, ord("0"): 0, ord("\\"): 92, ord("a"): 7, ord("f"): 12}
+_META = set(b".^$*+?{}[]\\|()")
+_TEMPLATE_FIELDS = {"p": "product", "v": "version", "i": "info", "h": "hostname", "o": "os"}
+
+
+class Fingerprint(NamedTuple):
+    service: str
+    product: str = ""
+    version: str = ""
+    info: str = ""
+    hostname: str = ""
+    os: str = ""
+    cpe: str = ""
+    soft: bool = False
+
+    @property
+    def vendor(self) -> str:
+        """CPE vendor part, e.g. ``openbsd`` for ``cpe:/a:openbsd:openssh:8.2p1``."""
+        parts = self.cpe.split(":")
+        return parts[2] if len(parts) > 3 else ""
+
+    @property
+    def cpe_product(self) -> str:
+        parts = self.cpe.split(":")
+        return parts[3] if len(parts) > 3 else ""
+
+
+class Rule:
+    __slots__ = ("service", "regex", "templates", "soft", "literal", "probe", "order")
+
+    def __init__(self, service: str, regex, templates: Dict[str, str], soft: bool, literal: bytes,
+                 probe: str, order: int):
+        self.service = service
+        self.regex = regex
+        self.templates = templates
+        self.soft = soft
+        self.literal = literal
+        self.probe = probe
+        self.order = order
+
+    def apply(self, data: bytes) -> Optional[Fingerprint]:
+        m = self.regex.search(data)
+        if not m:
+            return None
+
+        def fill(template: str) -> str:
+            def group(g):
+                try:
+                    value = m.group(int(g.group(1)))
+                except IndexError:
+                    return ""
+                return (value or b"").decode("latin-1")
+            return re.sub(r"\$(\d)", group, template).strip()
+
+        fields = {name: fill(t) for name, t in self.templates.items()}
+        return Fingerprint(service=self.service, soft=self.soft, **fields)
+
+
+class Probe:
+    __slots__ = ("name", "payload", "ports", "rules")
+
+    def __init__(self, name: str, payload: bytes):
+        self.name = name
+        self.payload = payload
+        self.ports: Set[int] = set()
+        self.rules: List[Rule] = []
+
+
+class _AhoCorasick:
+    """Multi-literal matcher: one pass over the text reports every hit."""
+
+    def __init__(self, literals: Dict[bytes, List[int]]):
+        self._goto: List[Dict[int, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        for literal, ids in literals.items():
+            state = 0
+            for byte in literal:
+                nxt = self._goto[state].get(byte)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][byte] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] = self._out[state] + tuple(ids)
+        # Breadth-first so every fail target is finished before it is used.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for byte, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and byte not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(byte, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, text: bytes) -> Set[int]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for byte in text:
+            while state and byte not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(byte, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+def _unescape(text: str) -> bytes:
+    raw = text.encode("latin-1")
+    out = bytearray()
+    i = 0
+    while i < len(raw):
+        c = raw[i]
+        if c == 92 and i + 1 < len(raw):
+            nxt = raw[i + 1]
+            if nxt == ord("x") and i + 3 < len(raw):
+                out.append(int(raw[i + 2:i + 4], 16))
+                i += 4
+                continue
+            out.append(_ESCAPES.get(nxt, nxt))
+            i += 2
+            continue
+        out.append(c)
+        i += 1
+    return bytes(out)
+
+
+def _leading_literal(pattern: bytes) -> bytes:
+    """Literal bytes every match must contain, or b"" when none can be derived.
+
+    Walks the pattern from its start (after ``^``) until the first
+    metacharacter; a character followed by an optional quantifier is
+    dropped.  Patterns with top-level alternation yield nothing.
+    """
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == 92:
+            i += 2
+            continue
+        if in_class:
+            in_class = c != ord("]")
+        elif c == ord("["):
+            in_class = True
+        elif c == ord("("):
+            depth += 1
+        elif c == ord(")"):
+            depth -= 1
+        elif c == ord("|") and depth == 0:
+            return b""
+        i += 1
+
+    out = bytearray()
+    i = 1 if pattern.startswith(b"^") else 0
+    while i < len(pattern):
+        c = pattern[i]
+        step = 1
+        if c == 92:
+            if i + 1 >= len(pattern):
+                break
+            nxt = pattern[i + 1]
+            if nxt == ord("x") and i + 3 < len(pattern):
+                char = int(pattern[i + 2:i + 4], 16)
+                step = 4
+            elif nxt in _ESCAPES:
+                char = _ESCAPES[nxt]
+                step = 2
+            elif chr(nxt).isalnum():
+                break
+            else:
+                char = nxt
+                step = 2
+        elif c in _META:
+            break
+        else:
+            char = c
+        i += step
+        if i < len(pattern) and pattern[i] in b"?*{":
+            break
+        out.append(char)
+        if i < len(pattern) and pattern[i] == ord("+"):
+            break
+    return bytes(out).lower()
+
+
+def _split_field(line: str, start: int) -> Tuple[str, int]:
+    """Read ``Xdelim...delim`` starting at ``line[start]``; return (body, index after it)."""
+    delim = line[start]
+    end = line.index(delim, start + 1)
+    return line[start + 1:end], end + 1
+
+
+class ProbeDB:
+    def __init__(self, probes: List[Probe], udp: Optional["ProbeDB"] = None):
+        self.probes = probes
+        self.udp = udp
+        self.rules: List[Rule] = [r for p in probes for r in p.rules]
+        self._by_name = {p.name: p for p in probes}
+        literals: Dict[bytes, List[int]] = {}
+        self._always: List[int] = []
+        for idx, rule in enumerate(self.rules):
+            if rule.literal:
+                literals.setdefault(rule.literal, []).append(idx)
+            else:
+                self._always.append(idx)
+        self._matcher = _AhoCorasick(literals)
+
+    @classmethod
+    def load(cls, path: str = PROBES_FILE) -> "ProbeDB":
+        with open(path, "r", encoding="latin-1") as f:
+            return cls.parse(f)
+
+    @classmethod
+    def parse(cls, lines: Iterable[str]) -> "ProbeDB":
+        probes: Dict[str, List[Probe]] = {"TCP": [], "UDP": []}
+        current: Optional[Probe] = None
+        order = 0
+        for lineno, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            keyword, _, rest = line.partition(" ")
+            try:
+                if keyword == "Probe":
+                    proto, name, payload = rest.split(" ", 2)
+                    if proto not in probes:
+                        current = None
+                        continue
+                    body, _ = _split_field(payload, 1)
+                    current = Probe(name, _unescape(body))
+                    probes[proto].append(current)
+                elif keyword == "ports" and current is not None:
+                    current.ports.update(_parse_ports(rest))
+                elif keyword in ("match", "softmatch") and current is not None:
+                    current.rules.append(cls._parse_rule(keyword == "softmatch", rest, current.name, order))
+                    order += 1
+            except (ValueError, re.error) as e:
+                raise ValueError(f"service probes line {lineno}: {e}") from None
+        return cls(probes["TCP"], udp=cls(probes["UDP"]) if probes["UDP"] else None)
+
+    @staticmethod
+    def _parse_rule(soft: bool, rest: str, probe: str, order: int) -> Rule:
+        service, _, spec = rest.partition(" ")
+        if not spec.startswith("m"):
+            raise ValueError("expected m<delim>regex<delim>")
+        body, pos = _split_field(spec, 1)
+        flags = 0
+        while pos < len(spec) and spec[pos] in "si":
+            flags |= re.S if spec[pos] == "s" else re.I
+            pos += 1
+        pattern = body.encode("latin-1")
+        templates = ProbeDB._templates(spec[pos:])
+        return Rule(service, re.compile(pattern, flags), templates, soft, _leading_literal(pattern), probe, order)
+
+    @staticmethod
+    def _templates(spec: str) -> Dict[str, str]:
+        templates = {}
+        pos = 0
+        while pos < len(spec):
+            if spec[pos].isspace():
+                pos += 1
+                continue
+            if spec.startswith("cpe:", pos):
+                value, pos = _split_field(spec, pos + 4)
+                templates["cpe"] = "cpe:/" + value
+                if pos < len(spec) and spec[pos] == "a":
+                    pos += 1
+            elif spec[pos] in _TEMPLATE_FIELDS and pos + 1 < len(spec):
+                key = _TEMPLATE_FIELDS[spec[pos]]
+                value, pos = _split_field(spec, pos + 1)
+                templates[key] = value
+            else:
+                pos += 1
+        return templates
+
+    def probe(self, name: str) -> Optional[Probe]:
+        return self._by_name.get(name)
+
+    def client_first(self, port: int) -> bool:
+        """True when ``port`` is only hinted by probes that send a payload."""
+        null = self._by_name.get("NULL")
+        if null is not None and port in null.ports:
+            return False
+        return any(p.payload and port in p.ports for p in self.probes)
+
+    def greets(self, port: int) -> bool:
+        null = self._by_name.get("NULL")
+        return null is not None and port in null.ports
+
+    def active_probe(self, port: int) -> Probe:
+        """Best payload-bearing probe for ``port``; GetRequest when nothing is hinted."""
+        for p in self.probes:
+            if p.payload and port in p.ports:
+                return p
+        return self._by_name.get("GetRequest") or next(p for p in self.probes if p.payload)
+
+    def udp_probe(self, port: int) -> Probe:
+        """Datagram to send to UDP ``port``: its protocol's probe, else an empty one."""
+        probes = self.udp.probes if self.udp is not None else []
+        for p in probes:
+            if port in p.ports:
+                return p
+        return next((p for p in probes if not p.payload), None) or Probe("Empty", b"")
+
+    def match(self, data: Union[bytes, str], probe: Optional[str] = None) -> Optional[Fingerprint]:
+        """Fingerprint ``data``; rules of ``probe`` (the one that elicited it) are tried first."""
+        if isinstance(data, str):
+            data = data.encode("latin-1", errors="ignore")
+        if not data:
+            return None
+        candidates = self._matcher.search(data.lower())
+        candidates.update(self._always)
+        ordered = sorted(candidates, key=lambda i: (self.rules[i].probe != probe if probe else False,
+                                                    self.rules[i].soft, self.rules[i].order))
+        for idx in ordered:
+            fp = self.rules[idx].apply(data)
+            if fp is not None:
+                return fp
+        return None
+
+
+def _parse_ports(spec: str) -> Set[int]:
+    ports = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            a, b = part.split("-", 1)
+            ports.update(range(int(a), int(b) + 1))
+        elif part:
+            ports.add(int(part))
+    return ports
+
+
+@lru_cache(maxsize=1)
+def default_db() -> ProbeDB:
+    return ProbeDB.load()
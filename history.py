@@ -0,0 +1,227 @@
+# history.py
+"""Persistent scan history in SQLite (WAL mode).
+
+Every scan's NDJSON result stream is imported as one ``scans`` row, plus
+one ``findings`` row per open (host, port) and one ``cve_hits`` row per
+CVE. Inserts are batched into a single transaction. Diffs between two
+scans and "who exposes port X" are indexed set operations in SQL, so they
+stay fast over months of nightly scans without loading any report into
+Python.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from reporter import read_stream
+
+HISTORY_DB = os.environ.get(
+    "INVISISCAN_HISTORY", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.db"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    target TEXT NOT NULL,
+    started TEXT NOT NULL,
+    findings INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS scans_target ON scans (target, id);
+CREATE INDEX IF NOT EXISTS scans_started ON scans (started);
+CREATE TABLE IF NOT EXISTS findings (
+    scan_id INTEGER NOT NULL REFERENCES scans (id) ON DELETE CASCADE,
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    service TEXT NOT NULL DEFAULT '',
+    product TEXT NOT NULL DEFAULT '',
+    version TEXT NOT NULL DEFAULT '',
+    cpe TEXT NOT NULL DEFAULT '',
+    banner TEXT NOT NULL DEFAULT '',
+    banner_hash TEXT NOT NULL DEFAULT '',
+    cves TEXT NOT NULL DEFAULT '[]',
+    explanation TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (scan_id, host, port)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS findings_port ON findings (port, scan_id);
+CREATE INDEX IF NOT EXISTS findings_service ON findings (service, scan_id);
+CREATE INDEX IF NOT EXISTS findings_host ON findings (host, port);
+CREATE TABLE IF NOT EXISTS cve_hits (
+    scan_id INTEGER NOT NULL REFERENCES scans (id) ON DELETE CASCADE,
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    cve_id TEXT NOT NULL,
+    cvss REAL,
+    PRIMARY KEY (scan_id, host, port, cve_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cve_hits_cve ON cve_hits (cve_id);
+"""
+
+_FINDING_COLUMNS = ("host", "port", "service", "product", "version", "cpe", "banner", "banner_hash",
+                    "cves", "explanation")
+# Columns added after the first schema, with their definitions.
+_ADDED_COLUMNS = {"cves": "TEXT NOT NULL DEFAULT '[]'", "explanation": "TEXT NOT NULL DEFAULT ''"}
+
+
+def banner_hash(banner: str) -> str:
+    return hashlib.sha1((banner or "").encode("utf-8", "replace")).hexdigest() if banner else ""
+
+
+def _split_key(key, default_host: str) -> Tuple[str, Optional[int]]:
+    text = str(key)
+    host, sep, port = text.rpartition(":")
+    try:
+        return (host if sep else default_host), int(port)
+    except ValueError:
+        return default_host, None
+
+
+class HistoryStore:
+    def __init__(self, path: str = HISTORY_DB, batch: int = 1000):
+        self.path = path
+        self.batch = batch
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        have = {r[1] for r in self._db.execute("PRAGMA table_info(findings)")}
+        for name, definition in _ADDED_COLUMNS.items():
+            if name not in have:
+                self._db.execute(f"ALTER TABLE findings ADD COLUMN {name} {definition}")
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def record_stream(self, stream: str) -> int:
+        """Import one scan's NDJSON result stream; return the new scan id."""
+        return self.record(read_stream(stream))
+
+    def record(self, records: Iterable[dict]) -> int:
+        cur = self._db.cursor()
+        with self._db:
+            cur.execute("INSERT INTO scans (target, started) VALUES ('', datetime('now'))")
+            scan_id = cur.lastrowid
+            target = ""
+            rows: Dict[Tuple[str, int], tuple] = {}
+            hits: List[tuple] = []
+
+            def flush():
+                cur.executemany(
+                    f"INSERT OR REPLACE INTO findings (scan_id, {', '.join(_FINDING_COLUMNS)}) "
+                    f"VALUES (?, {', '.join('?' * len(_FINDING_COLUMNS))})",
+                    ((scan_id,) + r for r in rows.values()))
+                cur.executemany("INSERT OR IGNORE INTO cve_hits VALUES (?, ?, ?, ?, ?)", hits)
+                rows.clear()
+                hits.clear()
+
+            for rec in records:
+                kind = rec.get("type")
+                if kind == "meta":
+                    target = rec.get("target", "")
+                    cur.execute("UPDATE scans SET target = ?, started = COALESCE(?, started) WHERE id = ?",
+                                (target, rec.get("timestamp") or None, scan_id))
+                    continue
+                if kind not in ("open", "service"):
+                    continue
+                host, port = rec.get("host"), rec.get("port")
+                if not host or port is None:
+                    host, port = _split_key(rec.get("key"), target)
+                if port is None:
+                    continue
+                if kind == "open":
+                    rows.setdefault((host, port), (host, port, "", "", "", "", "", "", "[]", ""))
+                else:
+                    fp = rec.get("fingerprint") or {}
+                    banner = rec.get("banner") or ""
+                    rows[(host, port)] = (host, port, fp.get("service", ""), fp.get("product", ""),
+                                          fp.get("version", ""), fp.get("cpe", ""), banner, banner_hash(banner),
+                                          json.dumps(rec.get("cves") or []), rec.get("explanation") or "")
+                    for cve in rec.get("cves") or []:
+                        cid = cve.get("id") or cve.get("cve")
+                        if cid:
+                            hits.append((scan_id, host, port, cid, cve.get("cvss")))
+                if len(rows) + len(hits) >= self.batch:
+                    flush()
+            flush()
+            # "open" rows flushed before their "service" row are replaced above.
+            cur.execute("UPDATE scans SET findings = (SELECT COUNT(*) FROM findings WHERE scan_id = ?) "
+                        "WHERE id = ?", (scan_id, scan_id))
+        return scan_id
+
+    def scans(self, target: Optional[str] = None, limit: int = 20) -> List[dict]:
+        if target is None:
+            rows = self._db.execute("SELECT id, target, started, findings FROM scans ORDER BY id DESC LIMIT ?",
+                                    (limit,))
+        else:
+            rows = self._db.execute("SELECT id, target, started, findings FROM scans WHERE target = ? "
+                                    "ORDER BY id DESC LIMIT ?", (target, limit))
+        return [{"id": r[0], "target": r[1], "started": r[2], "findings": r[3]} for r in rows]
+
+    def latest_pair(self, target: str) -> Tuple[Optional[int], Optional[int]]:
+        """(previous, latest) scan ids for ``target``."""
+        ids = [r[0] for r in self._db.execute(
+            "SELECT id FROM scans WHERE target = ? ORDER BY id DESC LIMIT 2", (target,))]
+        return (ids[1] if len(ids) > 1 else None), (ids[0] if ids else None)
+
+    def diff(self, old: Optional[int], new: int) -> Dict[str, List[dict]]:
+        """Ports opened, closed, and whose service or banner changed between two scans."""
+        old = -1 if old is None else old
+        opened = self._db.execute(
+            "SELECT host, port FROM findings WHERE scan_id = ? "
+            "EXCEPT SELECT host, port FROM findings WHERE scan_id = ? ORDER BY host, port", (new, old))
+        closed = self._db.execute(
+            "SELECT host, port FROM findings WHERE scan_id = ? "
+            "EXCEPT SELECT host, port FROM findings WHERE scan_id = ? ORDER BY host, port", (old, new))
+        out = {
+            "opened": [{"host": h, "port": p} for h, p in opened],
+            "closed": [{"host": h, "port": p} for h, p in closed],
+        }
+        changed = self._db.execute(
+            "SELECT n.host, n.port, o.service, n.service, o.product, n.product, o.version, n.version "
+            "FROM findings n JOIN findings o ON o.scan_id = ? AND o.host = n.host AND o.port = n.port "
+            "WHERE n.scan_id = ? AND (o.banner_hash != n.banner_hash OR o.service != n.service "
+            "OR o.version != n.version) ORDER BY n.host, n.port", (old, new))
+        out["changed"] = [{"host": r[0], "port": r[1], "before": " ".join(x for x in r[2:7:2] if x),
+                           "after": " ".join(x for x in r[3:8:2] if x)} for r in changed]
+        return out
+
+    def hosts_with_port(self, port: int, latest: bool = True) -> List[dict]:
+        """Hosts exposing ``port``: in each target's latest scan, or ever when ``latest`` is False."""
+        if latest:
+            rows = self._db.execute(
+                "SELECT f.host, s.target, s.started, f.service, f.product, f.version FROM findings f "
+                "JOIN scans s ON s.id = f.scan_id "
+                "WHERE f.port = ? AND f.scan_id IN (SELECT MAX(id) FROM scans GROUP BY target) "
+                "ORDER BY f.host", (port,))
+        else:
+            rows = self._db.execute(
+                "SELECT f.host, s.target, MAX(s.started), f.service, f.product, f.version FROM findings f "
+                "JOIN scans s ON s.id = f.scan_id WHERE f.port = ? GROUP BY f.host ORDER BY f.host", (port,))
+        return [{"host": r[0], "target": r[1], "seen": r[2], "service": r[3], "product": r[4], "version": r[5]}
+                for r in rows]
+
+    def previous(self, target: str) -> Dict[Tuple[str, int], dict]:
+        """Findings of ``target``'s latest recorded scan, keyed by (host, port)."""
+        _, latest = self.latest_pair(target)
+        if latest is None:
+            return {}
+        rows = self._db.execute(
+            "SELECT host, port, banner_hash, cves, explanation FROM findings WHERE scan_id = ?", (latest,))
+        return {(r[0], r[1]): {"banner_hash": r[2], "cves": json.loads(r[3] or "[]"), "explanation": r[4]}
+                for r in rows}
+
+    def port_counts(self, target: Optional[str] = None) -> Dict[int, int]:
+        """How often each port has been found open, across all scans or one target's."""
+        if target is None:
+            rows = self._db.execute("SELECT port, COUNT(*) FROM findings GROUP BY port")
+        else:
+            rows = self._db.execute("SELECT f.port, COUNT(*) FROM findings f JOIN scans s ON s.id = f.scan_id "
+                                    "WHERE s.target = ? GROUP BY f.port", (target,))
+        return dict(rows.fetchall())
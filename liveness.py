@@ -0,0 +1,264 @@
+# liveness.py
+"""In-process host liveness probing for discover_network.
+
+Nothing here forks a process.  ICMP echo goes through Linux's unprivileged
+"ping sockets" (SOCK_DGRAM + IPPROTO_ICMP, gated by
+net.ipv4.ping_group_range); hosts can also be probed with TCP connects,
+where either a SYN-ACK or an RST proves the host is up.
+"""
+import asyncio
+import errno
+import itertools
+import os
+import socket
+import struct
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from targets import ip_sort_key
+
+METHODS = ("auto", "icmp", "tcp")
+DEFAULT_TCP_PORTS = (80, 443, 22, 445, 3389, 139, 135, 53, 8080, 21, 23, 25)
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP6_ECHO_REQUEST = 128
+ICMP6_ECHO_REPLY = 129
+
+_LINGER_RST = struct.pack("ii", 1, 0)
+
+
+def _ping_group_allows() -> bool:
+    try:
+        with open("/proc/sys/net/ipv4/ping_group_range", "r") as f:
+            low, high = (int(x) for x in f.read().split())
+    except (OSError, ValueError):
+        return False
+    groups = {os.getgid(), os.getegid(), *os.getgroups()}
+    return any(low <= g <= high for g in groups)
+
+
+def icmp_available() -> bool:
+    """True when this process may open an unprivileged ICMP datagram socket."""
+    if not hasattr(socket, "IPPROTO_ICMP") or not _ping_group_allows():
+        return False
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP).close()
+        return True
+    except OSError:
+        return False
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class _Pacer:
+    """Hands out send slots ``1/rate`` seconds apart without a lock."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class IcmpPinger:
+    """Echo requests over ping sockets, matched back to callers by (ip, seq).
+
+    The kernel rewrites the ICMP identifier to the socket's own id and
+    delivers only replies addressed to it, so matching on sequence number
+    and source address is enough.  One socket per address family serves all
+    concurrent pings.
+    """
+
+    def __init__(self, timeout_ms: int = 500, attempts: int = 2, rate: float = 2000.0):
+        self.timeout = max(1, timeout_ms) / 1000.0
+        self.attempts = max(1, attempts)
+        self._pacer = _Pacer(rate)
+        self._seq = itertools.count(1)
+        self._socks: Dict[int, socket.socket] = {}
+        self._pending: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    def _socket(self, family: int) -> socket.socket:
+        sock = self._socks.get(family)
+        if sock is None:
+            proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+            sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+            sock.setblocking(False)
+            asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable, sock, family)
+            self._socks[family] = sock
+        return sock
+
+    def _on_readable(self, sock: socket.socket, family: int):
+        reply_type = ICMP_ECHO_REPLY if family == socket.AF_INET else ICMP6_ECHO_REPLY
+        while True:
+            try:
+                data, addr = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # Queued ICMP errors (e.g. host unreachable) surface here.
+                continue
+            if len(data) < 8 or data[0] != reply_type:
+                continue
+            seq = struct.unpack("!H", data[6:8])[0]
+            fut = self._pending.get((addr[0], seq))
+            if fut is not None and not fut.done():
+                fut.set_result(True)
+
+    async def ping(self, ip: str) -> bool:
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        sock = self._socket(family)
+        request = ICMP_ECHO_REQUEST if family == socket.AF_INET else ICMP6_ECHO_REQUEST
+        loop = asyncio.get_running_loop()
+        for _ in range(self.attempts):
+            seq = next(self._seq) & 0xFFFF
+            header = struct.pack("!BBHHH", request, 0, 0, 0, seq)
+            payload = b"invisiscan" + struct.pack("!d", time.time())
+            packet = struct.pack("!BBHHH", request, 0, _checksum(header + payload), 0, seq) + payload
+            key = (ip, seq)
+            fut = loop.create_future()
+            self._pending[key] = fut
+            try:
+                await self._pacer.wait()
+                try:
+                    await loop.sock_sendto(sock, packet, (ip, 0))
+                except OSError as e:
+                    if e.errno in (errno.EHOSTUNREACH, errno.ENETUNREACH):
+                        return False
+                    continue
+                try:
+                    return await asyncio.wait_for(fut, timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    continue
+            finally:
+                self._pending.pop(key, None)
+        return False
+
+    def close(self):
+        for sock in self._socks.values():
+            try:
+                asyncio.get_running_loop().remove_reader(sock.fileno())
+            except Exception:
+                pass
+            sock.close()
+        self._socks.clear()
+
+
+class TcpPinger:
+    """A host is up if any of ``ports`` answers a connect with SYN-ACK or RST."""
+
+    def __init__(self, ports: Iterable[int] = DEFAULT_TCP_PORTS, timeout_ms: int = 500, rate: float = 2000.0):
+        self.ports = list(ports) or list(DEFAULT_TCP_PORTS)
+        self.timeout = max(1, timeout_ms) / 1000.0
+        self._pacer = _Pacer(rate)
+
+    async def _knock(self, ip: str, port: int) -> bool:
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.setblocking(False)
+            await self._pacer.wait()
+            await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout=self.timeout)
+            return True
+        except ConnectionRefusedError:
+            return True
+        except Exception:
+            return False
+        finally:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RST)
+            except OSError:
+                pass
+            sock.close()
+
+    async def ping(self, ip: str) -> bool:
+        knocks = [asyncio.ensure_future(self._knock(ip, p)) for p in self.ports]
+        try:
+            for fut in asyncio.as_completed(knocks):
+                if await fut:
+                    return True
+            return False
+        finally:
+            for k in knocks:
+                k.cancel()
+
+    def close(self):
+        pass
+
+
+class LivenessEngine:
+    """Sweep addresses with ICMP or TCP pings from a single event loop.
+
+    ``method="auto"`` uses ICMP when ping sockets are permitted and TCP
+    otherwise.  At most ``concurrency`` hosts are outstanding at once and
+    addresses are pulled from the input lazily, so the sweep never holds
+    more than that many probes in memory.
+    """
+
+    def __init__(self, method: str = "auto", timeout_ms: int = 500, rate: float = 2000.0,
+                 concurrency: int = 1024, attempts: int = 2, tcp_ports: Optional[Iterable[int]] = None):
+        if method not in METHODS:
+            raise ValueError(f"unknown liveness method: {method}")
+        if method == "auto":
+            method = "icmp" if icmp_available() else "tcp"
+        self.method = method
+        self.timeout_ms = timeout_ms
+        self.rate = rate
+        self.concurrency = max(1, concurrency)
+        self.attempts = attempts
+        self.tcp_ports = list(tcp_ports) if tcp_ports else list(DEFAULT_TCP_PORTS)
+
+    def _pinger(self):
+        if self.method == "icmp":
+            return IcmpPinger(self.timeout_ms, self.attempts, self.rate)
+        return TcpPinger(self.tcp_ports, self.timeout_ms, self.rate)
+
+    async def sweep(self, ips: Iterable[str],
+                    on_alive: Optional[Callable[[str], Awaitable[None]]] = None) -> List[str]:
+        """Live addresses of ``ips``, sorted; each is also passed to ``on_alive`` as soon as it answers.
+
+        ``on_alive`` is awaited by the worker that found the host, so a slow
+        consumer (e.g. a full queue) slows the sweep down instead of piling
+        up results.
+        """
+        pinger = self._pinger()
+        alive = []
+        source = iter(ips)
+
+        async def worker():
+            for ip in source:
+                try:
+                    up = await pinger.ping(ip)
+                except Exception:
+                    continue
+                if up:
+                    alive.append(ip)
+                    if on_alive is not None:
+                        await on_alive(ip)
+
+        workers = self.concurrency
+        if self.method == "tcp":
+            # Each TCP ping holds one socket per port; keep the fd count flat.
+            workers = max(1, workers // len(self.tcp_ports))
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        finally:
+            pinger.close()
+        return sorted(alive, key=ip_sort_key)
+
+    def sweep_sync(self, ips: Iterable[str]) -> List[str]:
+        return asyncio.run(self.sweep(ips))
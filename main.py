@@ -1,75 +1,471 @@
 #!/usr/bin/env python3
 import argparse
 import asyncio
-import ipaddress
 import json
-from urllib.parse import urlparse
-from rich.console import Console
-from scanner_async import AsyncPortScanner
+import os
+import random
+from contextlib import contextmanager
+from scanner_async import ScanScheduler, BACKENDS, CLOSED, OPEN
 from banner import BannerGrabber
-from cve_lookup import CVELookup
-from ai_helper import AIHelper
-from reporter import Reporter
+from reporter import ResultSink, read_stream, render, stream_path
+from targets import PortSpace, ip_sort_key, space_size, spec_digest
+from history import HISTORY_DB, HistoryStore
+from delta import DeltaScheduler, reuse_enrichment
+from checkpoint import Checkpoint, checkpoint_path, stored_params
+from resolver import Resolver, expand_addresses, hostnames
+from metrics import Metrics
+from events import (Banner, CVEFound, ConsoleView, EventBus, HostUp, JSONLines, LazyConsole, PhaseDone, PortOpen,
+                    PortOpenFiltered, PortStates, Progress, ScanDone, ScanStarted, ServiceFingerprint)
 
-console = Console()
+# rich, aiohttp (CVE and AI lookups), multiprocessing (sharding) and the
+# cluster/discovery modules are imported where their phase runs, so
+# ``--help`` and small scans don't pay for them up front.
+console = LazyConsole()
 
-def normalize_target(raw: str) -> str:
-    """Convert URL or input to hostname/IP"""
-    raw = (raw or "").strip()
-    if raw.startswith("http://") or raw.startswith("https://"):
-        try:
-            p = urlparse(raw)
-            return p.hostname
-        except Exception:
-            return raw
-    # remove possible trailing slashes
-    return raw.split("/")[0]
-
-def parse_ports(ports_str: str):
-    ports = set()
+def parse_ports(ports_str: str, exclude: str = ""):
+    # PortSpace stores ranges, not one int per port, but indexes and
+    # iterates like the sorted list this used to return.
     try:
-        parts = [p.strip() for p in ports_str.split(",") if p.strip()]
-        for p in parts:
-            if "-" in p:
-                a, b = p.split("-", 1)
-                ports.update(range(int(a), int(b) + 1))
-            else:
-                ports.add(int(p))
+        ports = PortSpace.parse(ports_str, exclude)
     except Exception:
         # fallback to common ports
         return [21,22,80,443,3306,8080]
-    return sorted(ports)
+    return ports
+
+async def run_scan(targets, ports, concurrency, timeout, savefile, retries=1, adaptive=True, backend="stream",
+                   per_host=None, label=None, randomize=False, seed=None, inline_grab=True, cve_db=None,
+                   history=HISTORY_DB, delta=False, budget=None, processes=1, checkpoint=True, resume=False,
+                   all_addresses=False, events=None, udp=False, udp_rate=500.0):
+    if isinstance(targets, str):
+        targets = [targets]
+    # Everything the scan finds is also emitted on ``events``; the console
+    # display and --jsonl output are subscribers (see events.py).
+    events = events if events is not None else EventBus()
+    progress = lambda done, total: events.emit(Progress(done, total))
+    if resume and (delta or processes > 1 or udp):
+        console.print("[red]--resume works with single-process, non-delta TCP scans only.[/red]")
+        return
+    if udp and (delta or processes > 1):
+        console.print("[red]--udp scans run in one process and without --delta.[/red]")
+        return
+    # One resolver for the scan and the banner grabs: every hostname is
+    # looked up once, up front, and probes connect to literal addresses.
+    resolver = Resolver()
+    if all_addresses and hostnames(targets):
+        targets, names = await expand_addresses(targets, resolver)
+        for address, hosts in names.items():
+            console.print(f"[cyan]{', '.join(hosts)}[/cyan] → {address}")
+        if space_size(targets) < 1:
+            console.print("[red]No target resolved to an address.[/red]")
+            return
+    grabbed = {}
+    announced = set()
+    on_open = None
+    metrics = Metrics()
+    grabber = BannerGrabber(targets[0], timeout, resolver=resolver, metrics=metrics)
+    if inline_grab:
+        # Grab banners over the very connection that found each port open,
+        # while the scan is still running.
+        async def on_open(host, port, reader, writer):
+            banner = await grabber.grab_stream(reader, writer, port, host)
+            grabbed.setdefault(host, {})[port] = banner
+            announce(events, grabber, host, port, banner)
+            announced.add((host, port))
+
+    # Single-host reports keep plain port keys; multi-host ones use "host:port".
+    multi = space_size(targets) > 1
+    def key(host, port):
+        return f"{host}:{port}" if multi else port
+
+    # Findings are appended to an NDJSON stream as they happen; the report
+    # is rendered from that stream at the end.  A resumed scan continues the
+    # interrupted one's stream and starts from the ports it had found.
+    restored = {}
+    if resume:
+        restored = restore_found(stream_path(savefile))
+    sink = ResultSink(stream_path(savefile), append=resume)
+    def record(event):
+        if isinstance(event, PortOpen) and event.port not in restored.get(event.host, ()):
+            sink.open_port(key(event.host, event.port), event.host, event.port)
+        elif isinstance(event, PortOpenFiltered):
+            sink.open_filtered(key(event.host, event.port), event.host, event.port)
+        elif isinstance(event, PortStates):
+            sink.states(event.counts)
+    events.subscribe(record)
 
-async def run_scan(target, ports, concurrency, timeout, savefile):
-    console.rule(f"[green]Scanning {target}[/green]")
+    # A refused connection proves the host is up as much as an accept does.
+    up = set()
+    def on_result(host, port, state):
+        if state in (OPEN, CLOSED) and host not in up:
+            up.add(host)
+            events.emit(HostUp(host))
+        if state == OPEN:
+            events.emit(PortOpen(host, port))
+
+    ckpt = None
+    if checkpoint and processes == 1 and not delta and not udp:
+        path = checkpoint_path(savefile)
+        if resume:
+            try:
+                seed = stored_params(path).get("seed")
+            except (OSError, ValueError) as e:
+                console.print(f"[red]Cannot resume:[/red] {e}")
+                sink.close()
+                return
+        elif randomize and seed is None:
+            # The permutation must be reproducible to resume it.
+            seed = random.getrandbits(32)
+        params = {"label": label, "targets": spec_digest(targets), "ports": spec_digest(ports),
+                  "seed": seed, "randomize": bool(randomize)}
+        try:
+            ckpt = Checkpoint(path, space_size(targets) * space_size(ports), params, resume=resume,
+                              before_sync=sink.sync)
+        except (OSError, ValueError) as e:
+            console.print(f"[red]Cannot {'resume' if resume else 'checkpoint'}:[/red] {e}")
+            if resume:
+                sink.close()
+                return
+        if resume and ckpt is not None:
+            console.print(f"[cyan]Resuming:[/cyan] {ckpt.done} of {ckpt.size} probes already done, "
+                          f"{sum(map(len, restored.values()))} open ports restored")
+
+    previous = {}
+    metrics.start(savefile)
+    metrics.begin("scan")
+    states = None
     try:
-        scanner = AsyncPortScanner(target, ports, concurrency, timeout)
-        open_ports = await scanner.run()
+        options = dict(retries=retries, adaptive=adaptive, backend=backend, per_host=per_host,
+                       randomize=randomize, seed=seed, budget=budget)
+        known_open = counts = None
+        if delta and history:
+            # Last scan of the same target spec decides what to probe first.
+            with HistoryStore(history) as store:
+                previous = store.previous(label or targets[0])
+                counts = store.port_counts()
+            known_open = list(previous)
+        if processes > 1:
+            label = label or (targets[0] if not multi else f"{space_size(targets)} hosts")
+            sink.meta(label)
+            from sharding import run_sharded
+            events.emit(ScanStarted(f"{label} ({processes} processes)", space_size(targets) * space_size(ports)))
+            found, worker_banners, stats, expired = await run_sharded(
+                processes, targets, ports, concurrency, timeout, inline_grab=inline_grab, on_result=on_result,
+                grabber=grabber, label=label, known_open=known_open, port_counts=counts,
+                on_progress=progress, **options)
+            grabbed.update(worker_banners)
+            # Workers keep their own instruments; only their totals come back.
+            for state, count in stats.items():
+                metrics.inc("probes_total", count, outcome=state)
+            states = stats
+        elif udp:
+            from udp_scanner import OPEN_FILTERED, UDPScanner, reply_text
+
+            def on_udp_result(host, port, state):
+                on_result(host, port, state)
+                if state == OPEN_FILTERED:
+                    events.emit(PortOpenFiltered(host, port))
+
+            scanner = UDPScanner(targets, ports, timeout, retries=retries, rate=udp_rate, inflight=concurrency,
+                                 probes=grabber.probes, resolver=resolver, on_result=on_udp_result,
+                                 randomize=randomize, seed=seed, on_progress=progress)
+            # UDP results get their own history so they are never diffed against TCP ones.
+            label = f"{label or scanner.label} (udp)"
+            sink.meta(label)
+            events.emit(ScanStarted(label, space_size(targets) * space_size(ports)))
+            found = await scanner.run()
+            states = scanner.stats
+            expired = False
+            # The reply is the banner: finish_scan must not try to grab over TCP.
+            inline_grab = True
+            for (host, port), data in scanner.replies.items():
+                grabbed.setdefault(host, {})[port] = reply_text(data)
+            grabber.fingerprints.update(scanner.fingerprints)
+            if scanner.unresolved:
+                console.print(f"[yellow]Could not resolve:[/yellow] {', '.join(scanner.unresolved)}")
+            silent = sum(map(len, scanner.open_filtered.values()))
+            if silent:
+                console.print(f"[yellow]{silent} ports open|filtered (no reply, no ICMP error)"
+                              f"{'' if scanner.icmp else '; closed ports cannot be told apart here'}[/yellow]")
+        else:
+            options.update(on_open=on_open, on_result=on_result, metrics=metrics, on_progress=progress)
+            if known_open is not None:
+                scanner = DeltaScheduler(targets, ports, known_open=known_open, port_counts=counts,
+                                         concurrency=concurrency, timeout=timeout, resolver=resolver, **options)
+            else:
+                scanner = ScanScheduler(targets, ports, concurrency, timeout, checkpoint=ckpt, resolver=resolver,
+                                        **options)
+            label = label or scanner.label
+            if not resume:
+                sink.meta(label)
+            events.emit(ScanStarted(label, space_size(targets) * space_size(ports)))
+            try:
+                found = await scanner.run()
+            finally:
+                if ckpt is not None:
+                    ckpt.close()
+            states = scanner.stats
+            expired = scanner.expired
+            if scanner.unresolved:
+                console.print(f"[yellow]Could not resolve:[/yellow] {', '.join(scanner.unresolved)}")
+            if ckpt is not None and not expired:
+                ckpt.remove()
+                ckpt = None
+        if known_open is not None:
+            console.print(f"[cyan]Delta scan:[/cyan] {len(previous)} previously open ports probed first")
+        if expired:
+            console.print(f"[yellow]Time budget of {budget}s reached; remaining probes skipped.[/yellow]")
     except Exception as e:
+        label = label or ", ".join(targets)
         console.print(f"[red]Scanner error:[/red] {e}")
-        open_ports = []
+        if not sink.records and not resume:
+            sink.meta(label)
+        found = {}
+    metrics.end("scan")
+    if states:
+        events.emit(PortStates(dict(states)))
+    events.emit(PhaseDone("scan", round(metrics.phases.get("scan", 0.0), 4)))
+    if ckpt is not None:
+        console.print(f"[yellow]Scan incomplete; rerun the same command with --resume to continue "
+                      f"from {ckpt.path}[/yellow]")
 
-    console.print("[bold cyan]Open ports:[/bold cyan]", open_ports)
+    if restored:
+        for host, ports_ in restored.items():
+            found[host] = sorted(set(found.get(host, ())) | ports_)
+        found = {host: found[host] for host in sorted(found, key=ip_sort_key)}
+        if inline_grab:
+            # Banners grabbed before the interruption were not kept.
+            results = await asyncio.gather(*(grabber.grab_many(sorted(p), h) for h, p in restored.items()),
+                                           return_exceptions=True)
+            for host, r in zip(restored, results):
+                if isinstance(r, dict):
+                    grabbed.setdefault(host, {}).update(r)
+
+    await finish_scan(found, grabbed, grabber, sink, savefile, label, multi, inline_grab=inline_grab,
+                      cve_db=cve_db, history=history, previous=previous, metrics=metrics, events=events,
+                      announced=announced)
 
-    grabber = BannerGrabber(target, timeout)
-    try:
-        banners = await grabber.grab_many(open_ports)
-    except Exception:
-        banners = {}
 
-    cve = CVELookup()
+def scan_events(targets, ports, concurrency, timeout, savefile, **kwargs):
+    """``run_scan`` as an async generator of the events.py events it emits."""
+    bus = EventBus()
+    return bus.run(run_scan(targets, ports, concurrency, timeout, savefile, events=bus, **kwargs))
+
+
+def announce(events, grabber, host, port, banner):
+    """Emit the banner and fingerprint (if any) found for one open port."""
+    events.emit(Banner(host, port, banner))
+    fp = grabber.fingerprints.get((host, port))
+    if fp is not None:
+        events.emit(ServiceFingerprint(host, port, fp._asdict()))
+
+
+@contextmanager
+def phase(metrics, events, name):
+    """Time ``name`` in ``metrics`` and emit PhaseDone when it ends."""
+    with metrics.phase(name):
+        yield
+    events.emit(PhaseDone(name, round(metrics.phases.get(name, 0.0), 4)))
+
+
+def restore_found(stream: str):
+    """``{host: {ports}}`` already recorded open in an interrupted scan's stream."""
+    found = {}
     try:
-        cve_results = cve.check_services(banners)
-    except Exception:
-        cve_results = {}
+        for rec in read_stream(stream):
+            if rec.get("type") == "open" and rec.get("host") and rec.get("port") is not None:
+                found.setdefault(rec["host"], set()).add(rec["port"])
+    except FileNotFoundError:
+        pass
+    return found
+
+
+async def finish_scan(found, grabbed, grabber, sink, savefile, label, multi, inline_grab=True, cve_db=None,
+                      history=HISTORY_DB, previous=None, metrics=None, events=None, announced=()):
+    """Grab (if not done inline), enrich, report and record the open ports of a finished scan."""
+    previous = previous or {}
+    metrics = metrics or Metrics()
+    events = events if events is not None else EventBus()
+    def key(host, port):
+        return f"{host}:{port}" if multi else port
+
+    hosts = sorted(found, key=ip_sort_key)
+    if multi:
+        for host in hosts:
+            console.print(f"[bold cyan]{host} open ports:[/bold cyan]", found[host])
+    open_ports = [key(h, p) for h in hosts for p in found[h]]
+    if not multi:
+        console.print("[bold cyan]Open ports:[/bold cyan]", open_ports)
+
+    if not inline_grab:
+        with phase(metrics, events, "banners"):
+            results = await asyncio.gather(*(grabber.grab_many(found[h], h) for h in hosts),
+                                           return_exceptions=True)
+        grabbed = {h: r for h, r in zip(hosts, results) if isinstance(r, dict)}
+    banners = {}
+    fingerprints = {}
+    for host in hosts:
+        host_banners = grabbed.get(host, {})
+        for port in found[host]:
+            banners[key(host, port)] = host_banners.get(port, '')
+            fp = grabber.fingerprints.get((host, port))
+            if fp is not None:
+                fingerprints[key(host, port)] = fp
+            if (host, port) not in announced:
+                announce(events, grabber, host, port, banners[key(host, port)])
+
+    # Unchanged banners keep last scan's enrichment; only the rest is looked up.
+    reused = {}
+    for host in hosts:
+        for port in found[host]:
+            prev = reuse_enrichment(previous, host, port, banners[key(host, port)])
+            if prev is not None:
+                reused[key(host, port)] = prev
+    fresh = {k: b for k, b in banners.items() if k not in reused}
+
+    with phase(metrics, events, "cve"):
+        try:
+            from cve_lookup import CVELookup
+            with CVELookup(cve_db) as cve:
+                cve_results = await cve.check_services_async(fresh, fingerprints)
+        except Exception:
+            cve_results = {}
+    metrics.inc("cve_lookups_total", len(fresh))
+    metrics.inc("cve_reused_total", len(reused))
+
+    with phase(metrics, events, "ai"):
+        from ai_helper import AIHelper
+        ai = AIHelper()
+        explanations = await ai.explain_cves_async(cve_results)
+    for k, prev in reused.items():
+        cve_results[k] = prev["cves"]
+        explanations[k] = prev["explanation"]
+    if reused:
+        console.print(f"[cyan]Reused enrichment for {len(reused)} unchanged services[/cyan]")
+
+    for host in hosts:
+        for port in found[host]:
+            k = key(host, port)
+            fp = fingerprints.get(k)
+            if cve_results.get(k):
+                events.emit(CVEFound(host, port, cve_results[k], explanations.get(k, '')))
+            sink.service(k, banners[k], fp._asdict() if fp is not None else None,
+                         cve_results.get(k, []), explanations.get(k, ''), host=host, port=port)
+    save_report(sink, savefile, label, history, metrics, events, len(open_ports))
 
-    ai = AIHelper()
-    explanations = ai.explain_cves(cve_results)
 
-    report = Reporter(target, open_ports, banners, cve_results, explanations)
-    report.save(savefile)
+def save_report(sink, savefile, label, history, metrics, events, open_ports):
+    """Close the result stream, render the report from it and record it in the history."""
+    sink.metrics(metrics.snapshot())
+    sink.close()
+    with phase(metrics, events, "report"):
+        render(sink.path, savefile)
+    if history:
+        metrics.begin("history")
+        try:
+            with HistoryStore(history) as store:
+                scan_id = store.record_stream(sink.path)
+                changes = store.diff(store.latest_pair(label)[0], scan_id)
+            console.print(f"[cyan]History scan #{scan_id}:[/cyan] {len(changes['opened'])} opened, "
+                          f"{len(changes['closed'])} closed, {len(changes['changed'])} changed since last scan")
+        except Exception as e:
+            console.print(f"[red]History store error:[/red] {e}")
+        metrics.end("history")
+        events.emit(PhaseDone("history", round(metrics.phases.get("history", 0.0), 4)))
+    metrics.stop()
 
     console.print(f"[bold green]Saved report → {savefile}[/bold green]")
+    events.emit(ScanDone(savefile, open_ports))
+
+
+async def run_assess(targets, ports, savefile, label, cve_db=None, history=HISTORY_DB, events=None, **options):
+    """Discover, scan, grab and enrich in one pipeline (see pipeline.py), then report."""
+    from pipeline import AssessPipeline
+    events = events if events is not None else EventBus()
+    metrics = Metrics()
+    sink = ResultSink(stream_path(savefile))
+    sink.meta(label)
+
+    def on_open(host, port):
+        sink.open_port(f"{host}:{port}", host, port)
+        events.emit(PortOpen(host, port))
+
+    def on_banner(host, port, banner, fp):
+        events.emit(Banner(host, port, banner))
+        if fp is not None:
+            events.emit(ServiceFingerprint(host, port, fp._asdict()))
+
+    def on_service(host, port, banner, fp, cves, explanation):
+        if cves:
+            events.emit(CVEFound(host, port, cves, explanation))
+        sink.service(f"{host}:{port}", banner, fp._asdict() if fp is not None else None, cves, explanation,
+                     host=host, port=port)
+
+    def on_error(stage, error):
+        console.print(f"[yellow]{stage} failed:[/yellow] {error!r}")
+
+    pipeline = AssessPipeline(targets, ports, cve_db=cve_db, metrics=metrics,
+                              on_host=lambda host: events.emit(HostUp(host)), on_open=on_open,
+                              on_banner=on_banner, on_service=on_service, on_error=on_error, **options)
+    console.rule(f"[green]Assessing {label}[/green]")
+    metrics.start(savefile)
+    try:
+        found = await pipeline.run()
+    except Exception as e:
+        console.print(f"[red]Pipeline error:[/red] {e}")
+        found = pipeline.found
+    if pipeline.stats:
+        sink.states(pipeline.stats)
+        events.emit(PortStates(dict(pipeline.stats)))
+    for stage in ("discover", "scan", "banners", "enrich"):
+        events.emit(PhaseDone(stage, round(metrics.phases.get(stage, 0.0), 4)))
+    console.print(f"[cyan]{len(pipeline.hosts_up)} hosts up[/cyan]")
+    for host in sorted(found, key=ip_sort_key):
+        console.print(f"[bold cyan]{host} open ports:[/bold cyan]", found[host])
+    save_report(sink, savefile, label, history, metrics, events, sum(map(len, found.values())))
+
+
+async def run_coordinator(targets, ports, savefile, label, listen="127.0.0.1:7700", hosts_per_shard=256,
+                          ports_per_shard=1024, lease=30.0, token="", options=None, cve_db=None,
+                          history=HISTORY_DB):
+    """Serve shards of the scan to workers, then enrich and report the merged results."""
+    from cluster import Coordinator, make_shards
+    multi = space_size(targets) > 1
+    def key(host, port):
+        return f"{host}:{port}" if multi else port
+
+    sink = ResultSink(stream_path(savefile))
+    sink.meta(label)
+    shards = make_shards(targets, ports, hosts_per_shard, ports_per_shard)
+    coordinator = Coordinator(shards, lease=lease, options=options, token=token,
+                              on_open=lambda host, port: sink.open_port(key(host, port), host, port))
+    metrics = Metrics()
+    metrics.counter("shards_done_total", lambda: coordinator.progress[0])
+    metrics.gauge("shards", lambda: coordinator.progress[1])
+    metrics.counter("shards_redispatched_total", lambda: coordinator.redispatched)
+    metrics.start(savefile)
+    host, _, port = listen.rpartition(":")
+    console.rule(f"[green]Coordinating {label}: {len(shards)} shards on {listen}[/green]")
+    with metrics.phase("scan"):
+        found = await coordinator.serve(host or "127.0.0.1", int(port))
+    if coordinator.redispatched:
+        console.print(f"[yellow]{coordinator.redispatched} shard leases expired and were re-dispatched[/yellow]")
+    grabber = BannerGrabber(targets[0], (options or {}).get("timeout", 1.0))
+    grabber.fingerprints.update(coordinator.fingerprints)
+    await finish_scan(found, coordinator.banners, grabber, sink, savefile, label, multi,
+                      cve_db=cve_db, history=history, metrics=metrics)
+
+
+def console_events(quiet=False, jsonl=False):
+    """The event bus for a CLI run and its console view (None under --quiet/--jsonl)."""
+    events = EventBus()
+    view = None
+    if quiet or jsonl:
+        console.quiet = True
+    else:
+        view = events.subscribe(ConsoleView(console.rich))
+    if jsonl:
+        events.subscribe(JSONLines())
+    return events, view
 
 
 def main():
@@ -77,39 +473,240 @@ def main():
     sub = parser.add_subparsers(dest="cmd", required=True)
 
     s = sub.add_parser("scan", help="Run port scan")
-    s.add_argument("--target", "-t", required=True)
+    s.add_argument("--target", "-t", required=True,
+                   help="host, URL, CIDR, last-octet range or @hostfile; comma-separated for several")
+    s.add_argument("--exclude", default="", help="hosts to skip, same syntax as --target")
+    s.add_argument("--exclude-ports", default="", help="ports to skip, same syntax as --ports")
+    s.add_argument("--randomize", action="store_true", help="probe (host, port) pairs in a keyed random order")
+    s.add_argument("--seed", type=int, default=None, help="permutation seed for --randomize (implies it)")
+    s.add_argument("--per-host", type=int, default=None,
+                   help="max concurrent probes against one host when scanning several (default: concurrency/4)")
     s.add_argument("--ports", "-p", default="1-1024")
     s.add_argument("--concurrency", type=int, default=500)
-    s.add_argument("--timeout", type=float, default=1.0)
+    s.add_argument("--timeout", type=float, default=1.0, help="per-probe connect deadline in seconds")
+    s.add_argument("--retries", type=int, default=1, help="extra attempts for probes that time out")
+    s.add_argument("--fixed-window", action="store_true", help="disable adaptive concurrency, always use --concurrency")
+    s.add_argument("--backend", choices=BACKENDS, default="stream",
+                   help="stream: asyncio streams per probe; raw: bare non-blocking sockets closed with RST")
+    s.add_argument("--separate-grab", action="store_true",
+                   help="reconnect for banner grabbing after the scan instead of reusing the scan connection")
+    s.add_argument("--cve-db", default=None, help="offline CVE index from cve-import (default: cve.db if present)")
+    s.add_argument("--history", default=HISTORY_DB, help="scan history database (default: history.db)")
+    s.add_argument("--no-history", action="store_true", help="do not record this scan in the history database")
+    s.add_argument("--delta", action="store_true",
+                   help="probe last scan's open ports first, then the rest by historical frequency; "
+                        "reuse enrichment for unchanged banners")
+    s.add_argument("--budget", type=float, default=None, help="stop starting new probes after this many seconds")
+    s.add_argument("--processes", type=int, default=1,
+                   help="split the scan across N worker processes, each with its own event loop (uvloop if installed)")
+    s.add_argument("--all-addresses", action="store_true",
+                   help="scan every A/AAAA address of hostname targets, not just the first")
+    s.add_argument("--resume", action="store_true",
+                   help="continue an interrupted scan of the same targets/ports from its checkpoint")
+    s.add_argument("--no-checkpoint", action="store_true",
+                   help="do not keep a resumable checkpoint (<save>.ckpt) while scanning")
+    s.add_argument("--udp", action="store_true",
+                   help="scan UDP ports with protocol probes (DNS, NTP, SNMP, ...); --concurrency caps probes in flight")
+    s.add_argument("--udp-rate", type=float, default=500.0,
+                   help="UDP datagrams per second over all targets, retransmissions included (0: unlimited)")
+    s.add_argument("--quiet", "-q", action="store_true", help="no console output or progress display")
+    s.add_argument("--jsonl", action="store_true",
+                   help="write scan events to stdout as JSON lines instead of the console display (implies --quiet)")
     s.add_argument("--fast", action="store_true")
     s.add_argument("--save", default="report.json")
 
+    co = sub.add_parser("coordinate", help="Split a scan into shards and serve them to worker nodes")
+    co.add_argument("--target", "-t", required=True, help="same syntax as scan --target")
+    co.add_argument("--exclude", default="")
+    co.add_argument("--ports", "-p", default="1-1024")
+    co.add_argument("--exclude-ports", default="")
+    co.add_argument("--listen", default="127.0.0.1:7700",
+                    help="host:port for workers to connect to; anything but loopback requires --token")
+    co.add_argument("--hosts-per-shard", type=int, default=256)
+    co.add_argument("--ports-per-shard", type=int, default=1024)
+    co.add_argument("--lease", type=float, default=30.0,
+                    help="seconds a worker may hold a shard without renewing before it is re-dispatched")
+    co.add_argument("--token", default="", help="shared secret workers must present (required off loopback)")
+    co.add_argument("--timeout", type=float, default=1.0, help="per-probe connect deadline passed to workers")
+    co.add_argument("--retries", type=int, default=1)
+    co.add_argument("--backend", choices=BACKENDS, default="stream")
+    co.add_argument("--per-host", type=int, default=None)
+    co.add_argument("--cve-db", default=None)
+    co.add_argument("--history", default=HISTORY_DB)
+    co.add_argument("--no-history", action="store_true")
+    co.add_argument("--save", default="report.json")
+
+    w = sub.add_parser("worker", help="Scan shards handed out by a coordinator")
+    w.add_argument("--coordinator", required=True, help="e.g. http://10.0.0.1:7700")
+    w.add_argument("--name", default=None, help="worker name in coordinator logs (default: hostname)")
+    w.add_argument("--concurrency", type=int, default=500)
+    w.add_argument("--token", default="")
+
     d = sub.add_parser("discover", help="Discover devices in network")
     d.add_argument("--target", "-t", required=True, help="Example: 192.168.1.0/24")
+    d.add_argument("--method", choices=("auto", "icmp", "tcp", "ping"), default="auto",
+                   help="auto: in-process ICMP ping sockets if permitted, else TCP probes; ping: system ping")
+    d.add_argument("--timeout", type=int, default=500, help="liveness timeout in ms")
+    d.add_argument("--tcp-ports", default="", help="comma-separated ports for TCP liveness probes")
+    d.add_argument("--rate", type=float, default=2000.0, help="probe packets per second")
+
+    a = sub.add_parser("assess", help="Discover, scan, grab banners and enrich as one pipeline")
+    a.add_argument("--target", "-t", required=True, help="same syntax as scan --target, e.g. 192.168.1.0/24")
+    a.add_argument("--exclude", default="")
+    a.add_argument("--ports", "-p", default="1-1024")
+    a.add_argument("--exclude-ports", default="")
+    a.add_argument("--discover", choices=("auto", "icmp", "tcp", "none"), default="auto",
+                   help="liveness check before scanning a host; none: scan every target")
+    a.add_argument("--ping-timeout", type=int, default=500, help="liveness timeout in ms")
+    a.add_argument("--ping-ports", default="", help="comma-separated ports for TCP liveness probes")
+    a.add_argument("--rate", type=float, default=2000.0, help="liveness probe packets per second")
+    a.add_argument("--scan-hosts", type=int, default=8, help="hosts port-scanned at once")
+    a.add_argument("--concurrency", type=int, default=500, help="connects in flight over all hosts being scanned")
+    a.add_argument("--timeout", type=float, default=1.0, help="per-probe connect deadline in seconds")
+    a.add_argument("--retries", type=int, default=1)
+    a.add_argument("--grab-concurrency", type=int, default=100, help="banner grabs at once")
+    a.add_argument("--enrich-workers", type=int, default=2, help="concurrent CVE/AI enrichment batches")
+    a.add_argument("--queue-size", type=int, default=256, help="items buffered between two stages")
+    a.add_argument("--cve-db", default=None)
+    a.add_argument("--history", default=HISTORY_DB)
+    a.add_argument("--no-history", action="store_true")
+    a.add_argument("--quiet", "-q", action="store_true")
+    a.add_argument("--jsonl", action="store_true", help="write events to stdout as JSON lines (implies --quiet)")
+    a.add_argument("--save", default="report.json")
+
+    c = sub.add_parser("cve-import", help="Build or update the offline CVE index from NVD JSON feeds")
+    c.add_argument("feeds", nargs="+", help="NVD 1.1 feed files or 2.0 API responses (.json or .json.gz)")
+    c.add_argument("--db", default=None, help="index file (default: cve.db next to main.py)")
+
+    h = sub.add_parser("history", help="Query the scan history database")
+    h.add_argument("--db", default=HISTORY_DB)
+    hsub = h.add_subparsers(dest="query", required=True)
+    hs = hsub.add_parser("scans", help="list recorded scans")
+    hs.add_argument("--target", default=None)
+    hs.add_argument("--limit", type=int, default=20)
+    hd = hsub.add_parser("diff", help="what changed between two scans (default: a target's last two)")
+    hd.add_argument("--target", default=None)
+    hd.add_argument("--old", type=int, default=None)
+    hd.add_argument("--new", type=int, default=None)
+    hp = hsub.add_parser("port", help="hosts exposing a port")
+    hp.add_argument("port", type=int)
+    hp.add_argument("--ever", action="store_true", help="any scan, not just each target's latest")
 
     args = parser.parse_args()
 
+    if getattr(args, "cve_db", None) and not os.path.exists(args.cve_db):
+        console.print(f"[red]No CVE index at {args.cve_db}; build one with cve-import first.[/red]")
+        return
+
+    if args.cmd == "history":
+        with HistoryStore(args.db) as store:
+            if args.query == "scans":
+                result = store.scans(args.target, args.limit)
+            elif args.query == "port":
+                result = store.hosts_with_port(args.port, latest=not args.ever)
+            else:
+                old, new = args.old, args.new
+                if new is None:
+                    if not args.target:
+                        parser.error("history diff needs --target or --new")
+                    prev, new = store.latest_pair(args.target)
+                    old = prev if old is None else old
+                result = store.diff(old, new) if new is not None else {}
+        console.print_json(json.dumps(result))
+        return
+
+    if args.cmd == "cve-import":
+        from cve_index import CVE_DB, CVEIndex
+        with CVEIndex(args.db or CVE_DB) as index:
+            for feed in args.feeds:
+                updated, skipped = index.import_feed(feed)
+                console.print(f"[green]{feed}[/green]: {updated} CVEs updated, {skipped} unchanged")
+            stats = index.stats()
+        console.print(f"[bold green]Index {index.path}: {stats['cves']} CVEs, {stats['matches']} CPE matches[/bold green]")
+        return
+
+    if args.cmd == "coordinate":
+        from cluster import is_loopback
+        if not args.token and not is_loopback(args.listen.rpartition(":")[0]):
+            # Without a token anyone who can reach the port could lease shards or inject findings.
+            console.print(f"[red]Refusing to listen on {args.listen} without --token.[/red]")
+            return
+        from network_scanner import expand_targets
+        targets = expand_targets(args.target, args.exclude)
+        ports = PortSpace.parse(args.ports, args.exclude_ports)
+        if space_size(targets) < 1 or space_size(ports) < 1:
+            console.print("[red]Nothing left to scan.[/red]")
+            return
+        label = targets[0] if space_size(targets) == 1 else args.target
+        options = dict(timeout=args.timeout, retries=args.retries, backend=args.backend, per_host=args.per_host)
+        asyncio.run(run_coordinator(targets, ports, args.save, label, listen=args.listen,
+                                    hosts_per_shard=args.hosts_per_shard, ports_per_shard=args.ports_per_shard,
+                                    lease=args.lease, token=args.token, options=options, cve_db=args.cve_db,
+                                    history=None if args.no_history else args.history))
+        return
+
+    if args.cmd == "worker":
+        from cluster import Worker
+        worker = Worker(args.coordinator, args.name, args.concurrency, args.token)
+        asyncio.run(worker.run())
+        console.print(f"[bold green]{worker.name}: done, {worker.shards_done} shards scanned[/bold green]")
+        return
+
     if args.cmd == "discover":
         from network_scanner import discover_network
         console.rule(f"[cyan]Discovering {args.target}[/cyan]")
-        devices = discover_network(args.target)
+        tcp_ports = [int(x) for x in args.tcp_ports.split(",") if x.strip()] or None
+        devices = discover_network(args.target, timeout_ms=args.timeout, method=args.method,
+                                   tcp_ports=tcp_ports, rate=args.rate)
         console.print(f"[green]Active devices:[/green] {devices}")
         with open("discovery.json", "w") as f:
             json.dump({"network": args.target, "devices": devices}, f, indent=2)
         console.print("[bold green]Saved discovery.json[/bold green]")
         return
 
+    if args.cmd == "assess":
+        from network_scanner import expand_targets
+        targets = expand_targets(args.target, args.exclude)
+        ports = PortSpace.parse(args.ports, args.exclude_ports)
+        if space_size(targets) < 1 or space_size(ports) < 1:
+            console.print("[red]Nothing left to assess.[/red]")
+            return
+        events, _ = console_events(args.quiet, args.jsonl)
+        ping_ports = [int(x) for x in args.ping_ports.split(",") if x.strip()] or None
+        asyncio.run(run_assess(targets, ports, args.save, args.target, cve_db=args.cve_db,
+                               history=None if args.no_history else args.history, events=events,
+                               discover=None if args.discover == "none" else args.discover,
+                               ping_timeout_ms=args.ping_timeout, ping_ports=ping_ports, rate=args.rate,
+                               timeout=args.timeout, retries=args.retries, scan_hosts=args.scan_hosts,
+                               concurrency=args.concurrency, grab_concurrency=args.grab_concurrency,
+                               enrich_workers=args.enrich_workers, queue_size=args.queue_size))
+        return
+
     if args.cmd == "scan":
-        target = normalize_target(args.target)
-        # validate IP or hostname
+        from network_scanner import expand_targets
+        targets = expand_targets(args.target, args.exclude)
+        if space_size(targets) < 1:
+            console.print("[red]No targets left to scan.[/red]")
+            return
+        ports = [21,22,80,443,3306,8080] if args.fast else parse_ports(args.ports, args.exclude_ports)
+        label = targets[0] if space_size(targets) == 1 else args.target
+        events, view = console_events(args.quiet, args.jsonl)
         try:
-            # if a CIDR or IP accidentally passed, ensure we error early
-            _ = ipaddress.ip_address(target)
-        except Exception:
-            pass
-        ports = [21,22,80,443,3306,8080] if args.fast else parse_ports(args.ports)
-        asyncio.run(run_scan(target, ports, args.concurrency, args.timeout, args.save))
-
+            asyncio.run(run_scan(targets, ports, args.concurrency, args.timeout, args.save,
+                                 retries=args.retries, adaptive=not args.fixed_window, backend=args.backend,
+                                 per_host=args.per_host, label=label, randomize=args.randomize, seed=args.seed,
+                                 inline_grab=not args.separate_grab, cve_db=args.cve_db,
+                                 history=None if args.no_history else args.history,
+                                 delta=args.delta, budget=args.budget, processes=args.processes,
+                                 checkpoint=not args.no_checkpoint, resume=args.resume,
+                                 all_addresses=args.all_addresses, events=events, udp=args.udp,
+                                 udp_rate=args.udp_rate))
+        except KeyboardInterrupt:
+            if not args.no_checkpoint and args.processes == 1 and not args.delta and not args.udp:
+                console.print("[yellow]Interrupted; rerun the same command with --resume to continue.[/yellow]")
+        finally:
+            if view is not None:
+                view.close()
 
 if __name__ == "__main__":
     main()
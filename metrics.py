@@ -0,0 +1,236 @@
+# metrics.py
+"""Scan instrumentation: phase timers, counters, gauges and histograms.
+
+Recording is cheap enough for the probe loop: a counter bump is a dict
+update, a histogram observation is a bisect over a fixed bucket
+list, and gauges such as in-flight probes are callables sampled only when
+a snapshot is taken. While a scan runs, ``publish`` writes a JSON
+snapshot and a Prometheus text exposition next to the report about once
+a second (the dashboard serves the latter on ``/metrics``), and the final
+snapshot is embedded in the report itself.
+"""
+import asyncio
+import bisect
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+METRICS_NAME = "scan_metrics"
+PREFIX = "invisiscan_"
+
+# Seconds; connect and banner latencies on a LAN and over the internet.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def metrics_paths(filename: str) -> Tuple[str, str]:
+    """(json, prom) metrics files that go with a report: next to it, like report_visual.json."""
+    base = os.path.join(os.path.dirname(os.path.abspath(filename)), METRICS_NAME)
+    return base + ".json", base + ".prom"
+
+
+def _key(name: str, labels: dict) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Iterable[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {"buckets": dict(zip(map(str, self.bounds), self.counts)), "overflow": self.counts[-1],
+                "sum": round(self.sum, 6), "count": self.count,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.counters: Dict[Key, float] = {}
+        # Values read from the instrumented code only when a snapshot is taken.
+        self._sampled: Dict[Key, Tuple[str, Callable[[], float]]] = {}
+        self.histograms: Dict[Key, Histogram] = {}
+        self.phases: Dict[str, float] = {}
+        self._running: Dict[str, float] = {}
+        self._publisher = None
+        self._filename = None
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        hist.observe(value)
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        """The histogram itself, for callers that observe in a tight loop."""
+        key = _key(name, labels)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        return self.histograms[key]
+
+    def gauge(self, name: str, read: Callable[[], float], **labels):
+        """Register ``read`` to be sampled as gauge ``name`` at snapshot time."""
+        self._sampled[_key(name, labels)] = ("gauge", read)
+
+    def counter(self, name: str, read: Callable[[], float], **labels):
+        """Like ``gauge``, for a running total the instrumented code already keeps."""
+        self._sampled[_key(name, labels)] = ("counter", read)
+
+    def _sample(self) -> Tuple[Dict[Key, float], Dict[Key, float]]:
+        counters, gauges = dict(self.counters), {}
+        for key, (kind, read) in self._sampled.items():
+            try:
+                value = float(read())
+            except Exception:
+                continue
+            if kind == "counter":
+                counters[key] = counters.get(key, 0) + value
+            else:
+                gauges[key] = value
+        return counters, gauges
+
+    def begin(self, name: str):
+        self._running[name] = time.perf_counter()
+
+    def end(self, name: str):
+        start = self._running.pop(name, None)
+        if start is not None:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    @contextmanager
+    def phase(self, name: str):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def _phase_times(self) -> Dict[str, float]:
+        now = time.perf_counter()
+        phases = dict(self.phases)
+        for name, start in self._running.items():
+            phases[name] = phases.get(name, 0.0) + now - start
+        return {k: round(v, 4) for k, v in phases.items()}
+
+    def snapshot(self) -> dict:
+        counters, gauges = self._sample()
+
+        def flat(items):
+            return [{"name": n, "labels": dict(l), "value": v} for (n, l), v in items]
+
+        return {
+            "started": self.started,
+            "elapsed": round(time.time() - self.started, 3),
+            "running": sorted(self._running),
+            "phases": self._phase_times(),
+            "counters": flat(sorted(counters.items())),
+            "gauges": flat(sorted(gauges.items())),
+            "histograms": [dict(name=n, labels=dict(l), **h.snapshot()) for (n, l), h in sorted(self.histograms.items())],
+        }
+
+    def prometheus(self) -> str:
+        """The current values in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+
+        def head(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        def labels(pairs, extra=()):
+            pairs = tuple(pairs) + tuple(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        counters, gauges = self._sample()
+        head(PREFIX + "phase_seconds", "gauge")
+        for phase, seconds in self._phase_times().items():
+            lines.append(f'{PREFIX}phase_seconds{{phase="{_escape(phase)}"}} {seconds}')
+        head(PREFIX + "phase_running", "gauge")
+        for phase in sorted(self._running):
+            lines.append(f'{PREFIX}phase_running{{phase="{_escape(phase)}"}} 1')
+        for (name, pairs), value in sorted(counters.items()):
+            head(PREFIX + name, "counter")
+            lines.append(f"{PREFIX}{name}{labels(pairs)} {value:g}")
+        for (name, pairs), value in sorted(gauges.items()):
+            head(PREFIX + name, "gauge")
+            lines.append(f"{PREFIX}{name}{labels(pairs)} {value:g}")
+        for (name, pairs), hist in sorted(self.histograms.items()):
+            head(PREFIX + name, "histogram")
+            cumulative = 0
+            for bound, n in zip(hist.bounds, hist.counts):
+                cumulative += n
+                lines.append(f"{PREFIX}{name}_bucket{labels(pairs, (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{labels(pairs, (('le', '+Inf'),))} {hist.count}")
+            lines.append(f"{PREFIX}{name}_sum{labels(pairs)} {hist.sum:.6f}")
+            lines.append(f"{PREFIX}{name}_count{labels(pairs)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename: str):
+        """Write the JSON and Prometheus files that go with report ``filename``."""
+        json_path, prom_path = metrics_paths(filename)
+        for path, text in ((json_path, json.dumps(self.snapshot())), (prom_path, self.prometheus())):
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+
+    async def publish(self, filename: str, interval: float = 1.0):
+        """Rewrite the metrics files every ``interval`` seconds until cancelled."""
+        while True:
+            try:
+                self.write(filename)
+            except OSError:
+                pass
+            await asyncio.sleep(interval)
+
+    def start(self, filename: str, interval: float = 1.0):
+        """Publish in the background while the scan runs; ``stop`` writes the final values."""
+        self._filename = filename
+        self._publisher = asyncio.create_task(self.publish(filename, interval))
+
+    def stop(self):
+        publisher, self._publisher = self._publisher, None
+        if publisher is None:
+            return
+        publisher.cancel()
+        try:
+            self.write(self._filename)
+        except OSError:
+            pass
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
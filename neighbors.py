@@ -0,0 +1,257 @@
+# neighbors.py
+"""Neighbor (ARP/NDP) table snapshots and MAC vendor lookup.
+
+On Linux the table is read straight from the kernel, via an rtnetlink
+RTM_GETNEIGH dump (IPv4 and IPv6) or /proc/net/arp, with no subprocess.
+Other platforms fall back to the ``arp``/``ip neigh`` parsing in
+network_scanner.  Vendors come from a local OUI file loaded once into a
+per-prefix-length integer index.
+"""
+import os
+import socket
+import struct
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+
+OUI_FILE = os.environ.get("INVISISCAN_OUI", os.path.join(os.path.dirname(os.path.abspath(__file__)), "oui.txt"))
+
+_NETLINK_ROUTE = 0
+_RTM_NEWNEIGH = 28
+_RTM_GETNEIGH = 30
+_NLM_F_REQUEST = 0x1
+_NLM_F_DUMP = 0x300
+_NLMSG_ERROR = 2
+_NLMSG_DONE = 3
+_NDA_DST = 1
+_NDA_LLADDR = 2
+_NUD_INCOMPLETE = 0x01
+_NUD_FAILED = 0x20
+_NUD_NOARP = 0x40
+_NLMSG_HDR = struct.Struct("=IHHII")
+_NDMSG = struct.Struct("=BBHiHBB")
+_RTATTR = struct.Struct("=HH")
+_EMPTY_MAC = "00:00:00:00:00:00"
+
+
+def _format_mac(raw: bytes) -> str:
+    return ":".join(f"{b:02x}" for b in raw)
+
+
+def read_proc_arp(path: str = "/proc/net/arp") -> Dict[str, str]:
+    """IPv4 neighbors from /proc/net/arp (complete entries only)."""
+    mapping = {}
+    with open(path, "r") as f:
+        next(f, None)
+        for line in f:
+            parts = line.split()
+            if len(parts) < 4:
+                continue
+            ip, flags, mac = parts[0], parts[2], parts[3].lower()
+            # ATF_COM (0x2) marks a resolved entry.
+            if int(flags, 16) & 0x2 and mac != _EMPTY_MAC:
+                mapping[ip] = mac
+    return mapping
+
+
+def read_netlink_neighbors(timeout: float = 1.0) -> Dict[str, str]:
+    """IPv4 and IPv6 neighbors from one rtnetlink RTM_GETNEIGH dump."""
+    mapping = {}
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, _NETLINK_ROUTE)
+    try:
+        sock.settimeout(timeout)
+        sock.bind((0, 0))
+        seq = int(time.time()) & 0xFFFFFFFF
+        body = _NDMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0, 0, 0)
+        sock.send(_NLMSG_HDR.pack(_NLMSG_HDR.size + len(body), _RTM_GETNEIGH,
+                                  _NLM_F_REQUEST | _NLM_F_DUMP, seq, 0) + body)
+        while True:
+            data = sock.recv(65536)
+            offset = 0
+            while offset + _NLMSG_HDR.size <= len(data):
+                length, msg_type, _, msg_seq, _ = _NLMSG_HDR.unpack_from(data, offset)
+                if length < _NLMSG_HDR.size:
+                    return mapping
+                if msg_type == _NLMSG_DONE:
+                    return mapping
+                if msg_type == _NLMSG_ERROR:
+                    raise OSError("rtnetlink neighbor dump failed")
+                if msg_type == _RTM_NEWNEIGH and msg_seq == seq:
+                    _parse_neigh(data, offset + _NLMSG_HDR.size, offset + length, mapping)
+                offset += (length + 3) & ~3
+    finally:
+        sock.close()
+
+
+def _parse_neigh(data: bytes, start: int, end: int, mapping: Dict[str, str]):
+    family, _, _, _, state, _, _ = _NDMSG.unpack_from(data, start)
+    if state & (_NUD_INCOMPLETE | _NUD_FAILED | _NUD_NOARP):
+        return
+    dst = lladdr = None
+    pos = start + _NDMSG.size
+    while pos + _RTATTR.size <= end:
+        rta_len, rta_type = _RTATTR.unpack_from(data, pos)
+        if rta_len < _RTATTR.size:
+            break
+        value = data[pos + _RTATTR.size:pos + rta_len]
+        if rta_type == _NDA_DST:
+            dst = value
+        elif rta_type == _NDA_LLADDR:
+            lladdr = value
+        pos += (rta_len + 3) & ~3
+    if dst and lladdr and len(lladdr) == 6:
+        mac = _format_mac(lladdr)
+        if mac != _EMPTY_MAC:
+            mapping[socket.inet_ntop(family, dst)] = mac
+
+
+def read_kernel_neighbors() -> Dict[str, str]:
+    """Best in-process source available: rtnetlink, then /proc/net/arp."""
+    if hasattr(socket, "AF_NETLINK"):
+        try:
+            return read_netlink_neighbors()
+        except OSError:
+            pass
+    return read_proc_arp()
+
+
+class NeighborCache:
+    """TTL-cached neighbor snapshot that accumulates across refreshes.
+
+    Each refresh merges the current kernel table into what was already
+    seen, so entries that age out of the kernel during a long sweep are
+    kept, and hosts that answered late pick up their MAC on the next
+    refresh.  ``watch()`` refreshes on a background thread while a sweep
+    runs.
+    """
+
+    def __init__(self, ttl: float = 5.0, source: Optional[Callable[[], Dict[str, str]]] = None):
+        self.ttl = ttl
+        self._source = source or read_kernel_neighbors
+        self._entries: Dict[str, str] = {}
+        self._stamp = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> Dict[str, str]:
+        with self._lock:
+            if force or time.monotonic() - self._stamp >= self.ttl:
+                try:
+                    self._entries.update(self._source())
+                except Exception:
+                    pass
+                self._stamp = time.monotonic()
+            return dict(self._entries)
+
+    def snapshot(self) -> Dict[str, str]:
+        return self.refresh()
+
+    def get(self, ip: str, default: str = "") -> str:
+        return self.refresh().get(ip, default)
+
+    def watch(self, interval: Optional[float] = None) -> "_Watcher":
+        return _Watcher(self, interval or self.ttl)
+
+
+class _Watcher:
+    def __init__(self, cache: NeighborCache, interval: float):
+        self.cache = cache
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="neighbor-refresh", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.cache.refresh(force=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self.cache
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.cache.refresh(force=True)
+        return False
+
+
+class OuiIndex:
+    """MAC prefix -> vendor, keyed by integer prefix per assignment size.
+
+    Accepts the IEEE ``oui.txt`` layout (``00-50-56   (hex)\\t\\tVMware``) and
+    the Wireshark ``manuf`` layout (``00:50:56<TAB>VMware``, with optional
+    ``/28`` or ``/36`` suffixes for MA-M and MA-S blocks).  Lookups try the
+    longest registered prefix first.
+    """
+
+    def __init__(self):
+        self._tables: Dict[int, Dict[int, str]] = {}
+
+    @classmethod
+    def load(cls, path: str = OUI_FILE) -> "OuiIndex":
+        index = cls()
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    index._add_line(line)
+        except OSError:
+            pass
+        return index
+
+    def _add_line(self, line: str):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            return
+        if "(hex)" in line:
+            prefix, vendor = line.split("(hex)", 1)
+            bits = 24
+        else:
+            fields = line.split(None, 1)
+            if len(fields) < 2:
+                return
+            prefix, vendor = fields
+            bits = 24
+            if "/" in prefix:
+                prefix, size = prefix.split("/", 1)
+                bits = int(size)
+            # manuf has "short<TAB>long name"; keep the long one when present.
+            vendor = vendor.split("\t")[-1]
+        digits = "".join(c for c in prefix if c not in ":-.").strip()
+        try:
+            value = int(digits, 16) >> (len(digits) * 4 - bits) if len(digits) * 4 >= bits else None
+        except ValueError:
+            return
+        if value is None:
+            return
+        self.add(value, bits, vendor.strip())
+
+    def add(self, prefix: int, bits: int, vendor: str):
+        self._tables.setdefault(bits, {})[prefix] = vendor
+
+    def lookup(self, mac: str) -> str:
+        digits = "".join(c for c in (mac or "") if c not in ":-.")
+        if len(digits) != 12:
+            return ""
+        try:
+            value = int(digits, 16)
+        except ValueError:
+            return ""
+        for bits in sorted(self._tables, reverse=True):
+            vendor = self._tables[bits].get(value >> (48 - bits))
+            if vendor:
+                return vendor
+        if value >> 40 & 0x02:
+            return "(locally administered)"
+        return ""
+
+    def __len__(self) -> int:
+        return sum(len(t) for t in self._tables.values())
+
+
+@lru_cache(maxsize=1)
+def default_oui_index() -> OuiIndex:
+    return OuiIndex.load()
+
+
+def mac_vendor(mac: str) -> str:
+    return default_oui_index().lookup(mac)
@@ -1,10 +1,12 @@
 # network_scanner.py
+import itertools
 import platform
 import subprocess
-import ipaddress
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, List
+from neighbors import NeighborCache, mac_vendor, read_kernel_neighbors
+from targets import TargetSpace, ip_sort_key
 
 def get_local_os():
     return platform.system().lower()
@@ -27,6 +29,12 @@ def ping_host(ip: str, timeout: int = 1000) -> bool:
 def parse_arp_table() -> Dict[str, str]:
     system = get_local_os()
     mapping = {}
+    if system == "linux":
+        # Read the kernel table directly; only shell out if that fails.
+        try:
+            return read_kernel_neighbors()
+        except Exception:
+            pass
     try:
         if system == "windows":
             out = subprocess.check_output(["arp", "-a"], stderr=subprocess.DEVNULL).decode(errors="ignore")
@@ -59,47 +67,74 @@ def parse_arp_table() -> Dict[str, str]:
         pass
     return mapping
 
+# Shared across discover_network calls so repeated sweeps reuse the
+# snapshot within its TTL and keep MACs learned by earlier refreshes.
+_neighbors = NeighborCache(ttl=5.0, source=parse_arp_table)
+
 def ip_range_from_cidr(cidr_or_ip: str) -> List[str]:
-    try:
-        if "/" in cidr_or_ip:
-            net = ipaddress.ip_network(cidr_or_ip, strict=False)
-            return [str(ip) for ip in net.hosts()]
-        else:
-            return [cidr_or_ip]
-    except Exception:
-        if "-" in cidr_or_ip:
-            base, rng = cidr_or_ip.rsplit(".", 1)
-            start_end = rng.split("-", 1)
-            if len(start_end) == 2:
-                start, end = int(start_end[0]), int(start_end[1])
-                return [f"{base}.{i}" for i in range(start, end+1)]
-        return []
+    """Hosts of one target spec as a list; ``TargetSpace.parse`` without the laziness."""
+    return list(TargetSpace.parse(cidr_or_ip))
+
+def expand_targets(spec: str, exclude: str = "") -> TargetSpace:
+    """Expand a scan target spec into a lazy, de-duplicated host sequence.
 
-def ping_sweep(ip_list: List[str], workers: int = 100, timeout_ms: int = 500) -> List[str]:
+    ``spec`` is a comma-separated list of IPs, hostnames, URLs, CIDRs
+    (``10.0.0.0/24``), ranges (``10.0.0.5-20``, ``10.0.0.5-10.0.1.9``) or
+    host files (``@hosts.txt`` or any existing path, one entry per line,
+    ``#`` comments).  Hosts matching ``exclude`` (same syntax) are dropped.
+    """
+    return TargetSpace.parse(spec, exclude)
+
+def ping_sweep(ip_list: Iterable[str], workers: int = 100, timeout_ms: int = 500) -> List[str]:
     active = []
+    ips = iter(ip_list)
     with ThreadPoolExecutor(max_workers=workers) as ex:
-        futures = {ex.submit(ping_host, ip, timeout_ms): ip for ip in ip_list}
-        for fut in as_completed(futures):
-            ip = futures[fut]
-            try:
-                ok = fut.result()
-                if ok:
-                    active.append(ip)
-            except Exception:
-                pass
-    return sorted(active, key=lambda x: tuple(int(p) for p in x.split('.')))
+        # Keep a bounded number of submissions outstanding instead of one
+        # future per address, so huge ranges don't allocate up front.
+        futures = {}
+        for ip in itertools.islice(ips, workers * 4):
+            futures[ex.submit(ping_host, ip, timeout_ms)] = ip
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for fut in done:
+                ip = futures.pop(fut)
+                try:
+                    if fut.result():
+                        active.append(ip)
+                except Exception:
+                    pass
+                for nxt in itertools.islice(ips, 1):
+                    futures[ex.submit(ping_host, nxt, timeout_ms)] = nxt
+    return sorted(active, key=ip_sort_key)
 
-def discover_network(target_or_cidr: str, workers: int = 200, timeout_ms: int = 500) -> List[Dict[str, str]]:
-    ips = ip_range_from_cidr(target_or_cidr)
+def discover_network(target_or_cidr: str, workers: int = 200, timeout_ms: int = 500,
+                     method: str = "ping", tcp_ports: List[int] = None, rate: float = 2000.0) -> List[Dict[str, str]]:
+    """Find live hosts in ``target_or_cidr`` and attach MACs and vendors.
+
+    ``method`` selects the liveness check: ``ping`` forks the system ping
+    per address; ``icmp``, ``tcp`` and ``auto`` run in-process through
+    :mod:`liveness` (``auto`` picks ICMP ping sockets when allowed, TCP
+    connect probes on ``tcp_ports`` otherwise).  The neighbor table is
+    re-read in the background while the sweep runs.
+    """
+    ips = TargetSpace.parse(target_or_cidr)
     if not ips:
         return []
-    active = ping_sweep(ips, workers=workers, timeout_ms=timeout_ms)
-    arp = parse_arp_table()
+    with _neighbors.watch() as neighbors:
+        if method == "ping":
+            active = ping_sweep(ips, workers=workers, timeout_ms=timeout_ms)
+        else:
+            from liveness import LivenessEngine
+            engine = LivenessEngine(method, timeout_ms=timeout_ms, rate=rate, tcp_ports=tcp_ports)
+            active = engine.sweep_sync(ips)
+    arp = neighbors.snapshot()
     results = []
     for ip in active:
+        mac = arp.get(ip, "")
         results.append({
             "ip": ip,
-            "mac": arp.get(ip, ""),
+            "mac": mac,
+            "vendor": mac_vendor(mac) if mac else "",
         })
     return results
 
@@ -109,6 +144,11 @@ if __name__ == "__main__":
     p.add_argument("--target", "-t", required=True, help="Target IP or CIDR (e.g. 192.168.1.0/24 or 192.168.1.5)")
     p.add_argument("--workers", type=int, default=200)
     p.add_argument("--timeout", type=int, default=500, help="ping timeout in ms (windows uses ms, linux converted)")
+    p.add_argument("--method", choices=("ping", "auto", "icmp", "tcp"), default="ping")
+    p.add_argument("--tcp-ports", default="", help="comma-separated ports for tcp liveness probes")
+    p.add_argument("--rate", type=float, default=2000.0, help="probe packets per second for icmp/tcp methods")
     args = p.parse_args()
-    res = discover_network(args.target, workers=args.workers, timeout_ms=args.timeout)
+    tcp_ports = [int(x) for x in args.tcp_ports.split(",") if x.strip()] or None
+    res = discover_network(args.target, workers=args.workers, timeout_ms=args.timeout,
+                           method=args.method, tcp_ports=tcp_ports, rate=args.rate)
     print(json.dumps(res, indent=2))
@@ -0,0 +1,226 @@
+# pipeline.py
+"""Discover, scan, grab and enrich as one pipeline instead of four phases.
+
+    targets → liveness sweep → [hosts] → port scans → [open connections]
+            → banner grabs → [services] → CVE lookup + AI explanation
+
+Each arrow in brackets is a bounded asyncio.Queue and each stage has its
+own worker count. A host is port-scanned as soon as it answers a ping, an
+open port's connection is handed to a banner worker while the rest of
+the host is still being scanned, and banners are enriched in small
+batches as they arrive. When a queue is full, the stage feeding it waits
+(the sweep itself pauses in ``on_alive``), so a slow stage throttles the
+ones before it rather than buffering without limit. End-to-end time
+approaches that of the slowest stage instead of the sum of all of them.
+
+Stages finish in order: when every worker of a stage is done, one
+sentinel per downstream worker is queued behind the last real item.
+"""
+import asyncio
+import sys
+from contextlib import AsyncExitStack
+from typing import Callable, Dict, List, Optional, Sequence
+
+from banner import BannerGrabber
+from fingerprint import Fingerprint
+from liveness import LivenessEngine
+from resolver import Resolver
+from scanner_async import OPEN, ScanScheduler
+from targets import space_size
+
+_DONE = None
+
+HostHandler = Callable[[str], None]
+OpenHandler = Callable[[str, int], None]
+BannerHandler = Callable[[str, int, str, Optional[Fingerprint]], None]
+ServiceHandler = Callable[[str, int, str, Optional[Fingerprint], List[dict], str], None]
+ErrorHandler = Callable[[str, BaseException], None]
+
+
+def _report_error(stage: str, error: BaseException):
+    print(f"assess: {stage} failed: {error!r}", file=sys.stderr)
+
+
+class AssessPipeline:
+    def __init__(self, targets: Sequence[str], ports: Sequence[int], discover: Optional[str] = "auto",
+                 ping_timeout_ms: int = 500, ping_ports: Optional[Sequence[int]] = None, rate: float = 2000.0,
+                 timeout: float = 1.0, retries: int = 1, scan_hosts: int = 8, concurrency: int = 500,
+                 grab_concurrency: int = 100, enrich_workers: int = 2, enrich_batch: int = 32,
+                 queue_size: int = 256, cve_db: Optional[str] = None, metrics=None,
+                 on_host: Optional[HostHandler] = None, on_open: Optional[OpenHandler] = None,
+                 on_banner: Optional[BannerHandler] = None, on_service: Optional[ServiceHandler] = None,
+                 on_error: Optional[ErrorHandler] = None):
+        self.targets = targets
+        self.ports = ports
+        # LivenessEngine method, or None to scan every target without pinging it.
+        self.discover = discover
+        self.ping_timeout_ms = ping_timeout_ms
+        self.ping_ports = ping_ports
+        self.rate = rate
+        self.timeout = timeout
+        self.retries = retries
+        # Hosts scanned at once; ``concurrency`` connects are split between them.
+        self.scan_hosts = max(1, scan_hosts)
+        self.concurrency = max(1, concurrency)
+        self.grab_concurrency = max(1, grab_concurrency)
+        self.enrich_workers = max(1, enrich_workers)
+        self.enrich_batch = max(1, enrich_batch)
+        self.queue_size = max(1, queue_size)
+        self.cve_db = cve_db
+        self.metrics = metrics
+        self.on_host = on_host
+        self.on_open = on_open
+        self.on_banner = on_banner
+        self.on_service = on_service
+        # on_error(stage, exception) hears about a host scan or an enrich
+        # batch that failed; the pipeline carries on without it.
+        self.on_error = on_error or _report_error
+        self.resolver = Resolver()
+        self.grabber = BannerGrabber(targets[0], timeout, concurrency=self.grab_concurrency,
+                                     resolver=self.resolver, metrics=metrics)
+        self.hosts_up: List[str] = []
+        self.found: Dict[str, List[int]] = {}
+        self.stats: Dict[str, int] = {}
+
+    def _begin(self, stage: str):
+        if self.metrics is not None:
+            self.metrics.begin(stage)
+
+    def _end(self, stage: str):
+        if self.metrics is not None:
+            self.metrics.end(stage)
+
+    async def run(self) -> Dict[str, List[int]]:
+        """Run every stage to completion; return open ports for hosts that have any."""
+        import ai_helper
+        from cve_lookup import CVELookup
+        hosts: asyncio.Queue = asyncio.Queue(self.queue_size)
+        opened: asyncio.Queue = asyncio.Queue(self.queue_size)
+        services: asyncio.Queue = asyncio.Queue(self.queue_size)
+        if self.metrics is not None:
+            for stage, queue in (("hosts", hosts), ("open", opened), ("services", services)):
+                self.metrics.gauge("pipeline_queued", queue.qsize, queue=stage)
+            self.metrics.counter("hosts_up_total", lambda: len(self.hosts_up))
+        cve = CVELookup(self.cve_db)
+        ai = ai_helper.AIHelper()
+        # One API client and one completion session serve every enrich
+        # batch, so connections, caches and request coalescing are shared.
+        clients = AsyncExitStack()
+        cve_client = ai_client = None
+        per_host = max(1, self.concurrency // min(self.scan_hosts, space_size(self.targets)))
+
+        async def alive(host):
+            self.hosts_up.append(host)
+            if self.on_host is not None:
+                self.on_host(host)
+            await hosts.put(host)
+
+        async def discover():
+            if self.discover is None:
+                for host in self.targets:
+                    await alive(host)
+                return
+            engine = LivenessEngine(self.discover, timeout_ms=self.ping_timeout_ms, rate=self.rate,
+                                    tcp_ports=self.ping_ports)
+            await engine.sweep(self.targets, on_alive=alive)
+
+        async def handoff(host, port, reader, writer):
+            # Holds the connection until a banner worker is free.
+            await opened.put((host, port, reader, writer))
+
+        def record(host, port, state):
+            self.stats[state] = self.stats.get(state, 0) + 1
+            if state == OPEN:
+                self.found.setdefault(host, []).append(port)
+                if self.on_open is not None:
+                    self.on_open(host, port)
+
+        async def scan():
+            while True:
+                host = await hosts.get()
+                if host is _DONE:
+                    return
+                scanner = ScanScheduler([host], self.ports, per_host, self.timeout, retries=self.retries,
+                                        on_open=handoff, on_result=record, show_progress=False,
+                                        resolver=self.resolver)
+                try:
+                    await scanner.run()
+                except Exception as e:
+                    self.on_error(f"scan of {host}", e)
+
+        async def grab():
+            while True:
+                item = await opened.get()
+                if item is _DONE:
+                    return
+                host, port, reader, writer = item
+                banner = await self.grabber.grab_stream(reader, writer, port, host)
+                fp = self.grabber.fingerprints.get((host, port))
+                if self.on_banner is not None:
+                    self.on_banner(host, port, banner, fp)
+                await services.put((host, port, banner, fp))
+
+        async def enrich():
+            finished = False
+            while not finished:
+                batch = []
+                item = await services.get()
+                # Enrich whatever else is already waiting along with it.
+                while True:
+                    if item is _DONE:
+                        finished = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.enrich_batch or services.empty():
+                        break
+                    item = services.get_nowait()
+                if not batch:
+                    continue
+                keys = {f"{host}:{port}": (host, port, banner, fp) for host, port, banner, fp in batch}
+                try:
+                    results = await cve.check_services_async({k: v[2] for k, v in keys.items()},
+                                                             {k: v[3] for k, v in keys.items() if v[3]},
+                                                             client=cve_client)
+                except Exception as e:
+                    self.on_error("CVE lookup", e)
+                    results = {}
+                try:
+                    explanations = await ai.explain_cves_async(results, client=ai_client)
+                except Exception as e:
+                    self.on_error("CVE explanation", e)
+                    explanations = {}
+                if self.on_service is not None:
+                    for k, (host, port, banner, fp) in keys.items():
+                        self.on_service(host, port, banner, fp, results.get(k, []), explanations.get(k, ''))
+
+        async def stage(name, workers, downstream: Optional[asyncio.Queue] = None, consumers: int = 0):
+            self._begin(name)
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                self._end(name)
+            for _ in range(consumers):
+                await downstream.put(_DONE)
+
+        tasks = []
+        try:
+            if cve.index is None:
+                cve_client = await clients.enter_async_context(cve.client())
+            if ai_helper.USE_OPENAI:
+                ai_client = await clients.enter_async_context(ai.client())
+            tasks = [
+                asyncio.ensure_future(stage("discover", [discover()], hosts, self.scan_hosts)),
+                asyncio.ensure_future(stage("scan", [scan() for _ in range(self.scan_hosts)],
+                                            opened, self.grab_concurrency)),
+                asyncio.ensure_future(stage("banners", [grab() for _ in range(self.grab_concurrency)],
+                                            services, self.enrich_workers)),
+                asyncio.ensure_future(stage("enrich", [enrich() for _ in range(self.enrich_workers)])),
+            ]
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await clients.aclose()
+            cve.close()
+        return {host: sorted(ports) for host, ports in self.found.items()}
@@ -1,71 +1,358 @@
 import json
+import shutil
+import tempfile
+import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional
 import os
 
+VISUAL_NAME = "report_visual.json"
+
+
+def stream_path(filename: str) -> str:
+    """NDJSON result stream that goes with a report file: report.json -> report.ndjson."""
+    return os.path.splitext(filename)[0] + ".ndjson"
+
+
+class ResultSink:
+    """Append-only NDJSON record of a scan, written as findings arrive.
+
+    One ``meta`` line, then an ``open`` line per open (host, port) as the
+    scanner finds it (``open_filtered`` for silent UDP ports), a ``states``
+    line with the scan's verdict counts, and a ``service`` line per port
+    once its banner, fingerprint, CVEs and explanation are known.  The file is flushed on
+    every record and fsynced every ``sync_every`` records or
+    ``sync_interval`` seconds, so a crash loses at most that much.
+    With ``append`` an interrupted scan's stream is continued, not replaced.
+    """
+
+    def __init__(self, path: str, sync_every: int = 64, sync_interval: float = 1.0, append: bool = False):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.records = 0
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        if append:
+            _trim_torn_line(path)
+        self._f = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, record: dict):
+        self._f.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._f.flush()
+        self.records += 1
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every or time.monotonic() - self._synced_at >= self.sync_interval:
+            self.sync()
+
+    def meta(self, target: str):
+        self.write({'type': 'meta', 'target': target, 'timestamp': datetime.utcnow().isoformat() + 'Z'})
+
+    def open_port(self, key, host: str, port: int):
+        self.write({'type': 'open', 'key': key, 'host': host, 'port': port})
+
+    def open_filtered(self, key, host: str, port: int):
+        self.write({'type': 'open_filtered', 'key': key, 'host': host, 'port': port})
+
+    def states(self, counts: Dict[str, int]):
+        self.write({'type': 'states', 'counts': counts})
+
+    def service(self, key, banner: str = '', fingerprint: Optional[dict] = None,
+                cves: Optional[List[dict]] = None, explanation: str = '',
+                host: Optional[str] = None, port: Optional[int] = None):
+        self.write({'type': 'service', 'key': key, 'host': host, 'port': port, 'banner': banner,
+                    'fingerprint': fingerprint, 'cves': cves or [], 'explanation': explanation})
+
+    def metrics(self, snapshot: dict):
+        self.write({'type': 'metrics', 'metrics': snapshot})
+
+    def sync(self):
+        if self._unsynced:
+            os.fsync(self._f.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        if not self._f.closed:
+            self.sync()
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _trim_torn_line(path: str):
+    # A crash mid-write leaves a partial last line; appending after it would
+    # glue the next record onto it.
+    try:
+        with open(path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                start = max(0, pos - 65536)
+                f.seek(start)
+                chunk = f.read(pos - start)
+                if pos == end and chunk.endswith(b'\n'):
+                    return
+                cut = chunk.rfind(b'\n')
+                if cut >= 0:
+                    f.truncate(start + cut + 1)
+                    return
+                pos = start
+            f.truncate(0)
+    except FileNotFoundError:
+        pass
+
+
+def read_stream(path: str) -> Iterator[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A crash can leave a torn last line; everything before it stands.
+                continue
+
+
 class Reporter:
-    def __init__(self, target: str, open_ports: List[int], banners: Dict[int, str], cves: Dict[int, List[dict]], explanations: Dict[int, str]):
+    def __init__(self, target: str, open_ports: List[int], banners: Dict[int, str], cves: Dict[int, List[dict]], explanations: Dict[int, str],
+                 fingerprints: Optional[Dict[int, dict]] = None):
         self.target = target
         self.open_ports = open_ports
         self.banners = banners
         self.cves = cves
         self.explanations = explanations
-
-    def _make_data(self):
-        return {
-            'target': self.target,
-            'timestamp': datetime.utcnow().isoformat() + 'Z',
-            'open_ports': self.open_ports,
-            'banners': self.banners,
-            'cves': self.cves,
-            'explanations': self.explanations,
-        }
+        self.fingerprints = fingerprints or {}
 
     def save(self, filename: str = 'report.json'):
-        data = self._make_data()
-        if filename.lower().endswith('.json'):
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2)
-        elif filename.lower().endswith('.md'):
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(f"# Scan report for {self.target}\n\n")
-                f.write(f"Timestamp: {data['timestamp']}\n\n")
-                f.write('## Open ports\n')
-                for p in self.open_ports:
-                    f.write(f"- {p}\n")
-                f.write('\n## Banners\n')
-                for p, b in self.banners.items():
-                    f.write(f"### Port {p}\n```\n{b}\n```\n")
-                f.write('\n## CVE Hints & Explanations\n')
-                for p, expl in self.explanations.items():
-                    f.write(f"### Port {p}\n{expl}\n\n")
-        elif filename.lower().endswith('.html'):
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(f"<html><head><meta charset='utf-8'><title>Scan report {self.target}</title></head><body>")
-                f.write(f"<h1>Scan report for {self.target}</h1>")
-                f.write(f"<p>Timestamp: {data['timestamp']}</p>")
-                f.write("<h2>Open ports</h2><ul>")
-                for p in self.open_ports:
-                    f.write(f"<li>{p}</li>")
-                f.write("</ul>")
-                f.write("<h2>Banners</h2>")
-                for p, b in self.banners.items():
-                    f.write(f"<h3>Port {p}</h3><pre>{(b or '')}</pre>")
-                f.write("<h2>CVE Hints & Explanations</h2>")
-                for p, expl in self.explanations.items():
-                    f.write(f"<h3>Port {p}</h3><pre>{(expl or '')}</pre>")
-                f.write("</body></html>")
+        """Write the in-memory results to a stream, then render it like a live scan's."""
+        path = stream_path(filename)
+        with ResultSink(path) as sink:
+            sink.meta(self.target)
+            for p in self.open_ports:
+                sink.open_port(p, None, p)
+            for p in dict.fromkeys(list(self.banners) + list(self.explanations)):
+                sink.service(p, self.banners.get(p, ''), self.fingerprints.get(p),
+                             self.cves.get(p, []), self.explanations.get(p, ''))
+        render(path, filename)
+
+
+def _service_line(fp: Optional[dict]) -> str:
+    if not fp:
+        return ''
+    return ' '.join(x for x in (fp.get('service'), fp.get('product'), fp.get('version')) if x)
+
+
+def _json_key(key) -> str:
+    return json.dumps(str(key))
+
+
+class _Spill:
+    """Per-section temp files filled in one pass over the stream, then joined."""
+
+    def __init__(self, *sections: str):
+        self.files = {name: tempfile.TemporaryFile('w+', encoding='utf-8') for name in sections}
+        self.counts = dict.fromkeys(sections, 0)
+
+    def write(self, section: str, text: str):
+        self.files[section].write(text)
+        self.counts[section] += 1
+
+    def copy(self, section: str, out):
+        f = self.files[section]
+        f.seek(0)
+        shutil.copyfileobj(f, out)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def render(stream: str, filename: str):
+    """Render a report from an NDJSON stream in a single bounded-memory pass.
+
+    The output format follows the extension (.json, .md, .html; anything else is
+    JSON).  Sections are spilled to temp files while reading and concatenated
+    at the end, so memory does not grow with the number of findings.  The
+    dashboard's report_visual.json becomes a hard link to a JSON report, or a
+    small pointer file to the stream when the report is not JSON.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    kind = ext if ext in ('.md', '.html') else '.json'
+    sections = {'.json': ('open_ports', 'open_filtered', 'banners', 'fingerprints', 'cves', 'explanations'),
+                '.md': ('open_ports', 'open_filtered', 'banners', 'explanations'),
+                '.html': ('open_ports', 'open_filtered', 'banners', 'explanations')}[kind]
+    spill = _Spill(*sections)
+    meta = {'target': '', 'timestamp': ''}
+    metrics = states = None
+    try:
+        for rec in read_stream(stream):
+            rtype = rec.get('type')
+            if rtype == 'meta':
+                meta = rec
+            elif rtype == 'open':
+                _render_open(kind, spill, rec['key'])
+            elif rtype == 'open_filtered':
+                _render_open(kind, spill, rec['key'], 'open_filtered')
+            elif rtype == 'states':
+                states = rec.get('counts')
+            elif rtype == 'service':
+                _render_service(kind, spill, rec)
+            elif rtype == 'metrics':
+                metrics = rec.get('metrics')
+        tmp = filename + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as out:
+            _render_document(kind, spill, meta, out, metrics, states)
+        os.replace(tmp, filename)
+    finally:
+        spill.close()
+    _link_visual(filename, stream, kind)
+
+
+def _render_open(kind: str, spill: _Spill, key, section: str = 'open_ports'):
+    if kind == '.json':
+        sep = ',' if spill.counts[section] else ''
+        spill.write(section, sep + json.dumps(key))
+    elif kind == '.md':
+        spill.write(section, f"- {key}\n")
+    else:
+        spill.write(section, f"<li>{key}</li>")
+
+
+def _render_service(kind: str, spill: _Spill, rec: dict):
+    key, banner, fp, expl = rec['key'], rec.get('banner') or '', rec.get('fingerprint'), rec.get('explanation') or ''
+    if kind == '.json':
+        k = _json_key(key)
+        for section, value in (('banners', banner), ('cves', rec.get('cves') or []), ('explanations', expl)):
+            sep = ',' if spill.counts[section] else ''
+            spill.write(section, f"{sep}{k}:{json.dumps(value)}")
+        if fp:
+            sep = ',' if spill.counts['fingerprints'] else ''
+            spill.write('fingerprints', f"{sep}{k}:{json.dumps(fp)}")
+    elif kind == '.md':
+        service = _service_line(fp)
+        spill.write('banners', f"### Port {key}\n" + (f"Service: {service}\n\n" if service else '')
+                    + f"```\n{banner}\n```\n")
+        spill.write('explanations', f"### Port {key}\n{expl}\n\n")
+    else:
+        service = _service_line(fp)
+        spill.write('banners', f"<h3>Port {key}</h3>" + (f"<p>Service: {service}</p>" if service else '')
+                    + f"<pre>{banner}</pre>")
+        spill.write('explanations', f"<h3>Port {key}</h3><pre>{expl}</pre>")
+
+
+def _metrics_lines(metrics: dict) -> List[str]:
+    lines = [f"{name}: {seconds:.2f}s" for name, seconds in metrics.get('phases', {}).items()]
+    for item in metrics.get('counters', []):
+        labels = ','.join(f"{k}={v}" for k, v in item.get('labels', {}).items())
+        lines.append(f"{item['name']}{'{' + labels + '}' if labels else ''}: {item['value']:g}")
+    for hist in metrics.get('histograms', []):
+        labels = ','.join(f"{k}={v}" for k, v in hist.get('labels', {}).items())
+        if hist.get('count'):
+            lines.append(f"{hist['name']}{'{' + labels + '}' if labels else ''}: n={hist['count']} "
+                         f"p50<={hist['p50']}s p95<={hist['p95']}s p99<={hist['p99']}s")
+    return lines
+
+
+def _states_line(states: Dict[str, int]) -> str:
+    return ', '.join(f"{state}: {count}" for state, count in sorted(states.items()))
+
+
+def _render_document(kind: str, spill: _Spill, meta: dict, out, metrics: Optional[dict] = None,
+                     states: Optional[Dict[str, int]] = None):
+    target, timestamp = meta.get('target', ''), meta.get('timestamp', '')
+    if kind == '.json':
+        out.write('{\n')
+        out.write(f'  "target": {json.dumps(target)},\n  "timestamp": {json.dumps(timestamp)},\n')
+        out.write('  "open_ports": [')
+        spill.copy('open_ports', out)
+        out.write(']')
+        if spill.counts['open_filtered']:
+            out.write(',\n  "open_filtered": [')
+            spill.copy('open_filtered', out)
+            out.write(']')
+        if states is not None:
+            out.write(f',\n  "port_states": {json.dumps(states)}')
+        for section in ('banners', 'fingerprints', 'cves', 'explanations'):
+            out.write(f',\n  "{section}": {{')
+            spill.copy(section, out)
+            out.write('}')
+        if metrics is not None:
+            out.write(f',\n  "metrics": {json.dumps(metrics)}')
+        out.write('\n}\n')
+    elif kind == '.md':
+        out.write(f"# Scan report for {target}\n\n")
+        out.write(f"Timestamp: {timestamp}\n\n")
+        out.write('## Open ports\n')
+        spill.copy('open_ports', out)
+        if spill.counts['open_filtered']:
+            out.write('\n## Open|filtered ports (no reply)\n')
+            spill.copy('open_filtered', out)
+        if states is not None:
+            out.write(f"\nPort states: {_states_line(states)}\n")
+        out.write('\n## Banners\n')
+        spill.copy('banners', out)
+        out.write('\n## CVE Hints & Explanations\n')
+        spill.copy('explanations', out)
+        if metrics is not None:
+            out.write('\n## Scan metrics\n')
+            out.write(''.join(f"- {line}\n" for line in _metrics_lines(metrics)))
+    else:
+        out.write(f"<html><head><meta charset='utf-8'><title>Scan report {target}</title></head><body>")
+        out.write(f"<h1>Scan report for {target}</h1>")
+        out.write(f"<p>Timestamp: {timestamp}</p>")
+        out.write("<h2>Open ports</h2><ul>")
+        spill.copy('open_ports', out)
+        out.write("</ul>")
+        if spill.counts['open_filtered']:
+            out.write("<h2>Open|filtered ports (no reply)</h2><ul>")
+            spill.copy('open_filtered', out)
+            out.write("</ul>")
+        if states is not None:
+            out.write(f"<p>Port states: {_states_line(states)}</p>")
+        out.write("<h2>Banners</h2>")
+        spill.copy('banners', out)
+        out.write("<h2>CVE Hints & Explanations</h2>")
+        spill.copy('explanations', out)
+        if metrics is not None:
+            out.write("<h2>Scan metrics</h2><ul>")
+            out.write(''.join(f"<li>{line}</li>" for line in _metrics_lines(metrics)))
+            out.write("</ul>")
+        out.write("</body></html>")
+
+
+def _link_visual(filename: str, stream: str, kind: str):
+    try:
+        base_dir = os.path.dirname(os.path.abspath(filename))
+    except Exception:
+        base_dir = os.getcwd()
+    visual_path = os.path.join(base_dir, VISUAL_NAME)
+    if os.path.abspath(filename) == visual_path:
+        return
+    tmp = visual_path + '.tmp'
+    try:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if kind == '.json':
+            try:
+                os.link(filename, tmp)
+            except OSError:
+                # No hard links here (e.g. FAT or across mounts): point instead.
+                _write_pointer(tmp, filename)
         else:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2)
-
-        try:
-            base_dir = os.path.dirname(os.path.abspath(filename))
-        except Exception:
-            base_dir = os.getcwd()
-        visual_path = os.path.join(base_dir, "report_visual.json")
-        try:
-            with open(visual_path, 'w', encoding='utf-8') as vf:
-                json.dump(data, vf, indent=2)
-        except Exception:
-            pass
+            _write_pointer(tmp, stream)
+        os.replace(tmp, visual_path)
+    except Exception:
+        pass
+
+
+def _write_pointer(path: str, target: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'pointer': os.path.abspath(target)}, f)
@@ -0,0 +1,139 @@
+# resolver.py
+"""Resolve hostnames once per scan instead of once per probe.
+
+``asyncio.open_connection(name, port)`` runs ``getaddrinfo`` on every
+call, so scanning 1024 ports of one hostname used to mean 1024 lookups
+through the default thread pool. A Resolver looks each name up once,
+caches every A/AAAA address it returns for ``ttl`` seconds (failures for
+``negative_ttl``), and coalesces concurrent lookups of the same name.
+``resolve_many`` resolves a whole host list up front with bounded
+concurrency, so probing starts with a warm cache and connects to literal
+addresses only.
+"""
+import asyncio
+import ipaddress
+import socket
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from targets import IntRanges, TargetSpace, _to_int
+
+Address = Tuple[int, str]  # (family, literal address)
+
+
+def literal(host: str) -> Optional[Address]:
+    """``(family, address)`` when ``host`` already is an IP address, else None."""
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return None
+    return (socket.AF_INET if ip.version == 4 else socket.AF_INET6), host
+
+
+def hostnames(targets) -> List[str]:
+    """The entries of ``targets`` that need a DNS lookup."""
+    if isinstance(targets, TargetSpace):
+        return list(targets.hostnames)
+    return [h for h in dict.fromkeys(targets) if literal(h) is None]
+
+
+def without_hosts(targets, names: Iterable[str]):
+    """``targets`` minus the hostnames in ``names`` (e.g. those that did not resolve)."""
+    drop = set(names)
+    if not drop:
+        return targets
+    if isinstance(targets, TargetSpace):
+        return TargetSpace(targets.addresses, [h for h in targets.hostnames if h not in drop])
+    return [h for h in targets if h not in drop]
+
+
+def host_index(targets, name: str) -> int:
+    """Position of hostname ``name`` in ``targets``, without walking the addresses."""
+    if isinstance(targets, TargetSpace):
+        return targets.addresses.size + targets.hostnames.index(name)
+    return list(targets).index(name)
+
+
+class Resolver:
+    def __init__(self, ttl: float = 300.0, negative_ttl: float = 30.0, concurrency: int = 64,
+                 family: int = socket.AF_UNSPEC):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.family = family
+        self.lookups = 0
+        self._cache: Dict[str, Tuple[float, object]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def resolve(self, host: str) -> List[Address]:
+        """Every address of ``host``, in resolver order; raises OSError if it has none."""
+        lit = literal(host)
+        if lit is not None:
+            return [lit]
+        hit = self._cache.get(host)
+        if hit is not None and hit[0] > time.monotonic():
+            if isinstance(hit[1], OSError):
+                raise hit[1]
+            return hit[1]
+        pending = self._pending.get(host)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[host] = future
+        try:
+            addresses = await self._lookup(host)
+        except OSError as e:
+            self._cache[host] = (time.monotonic() + self.negative_ttl, e)
+            future.set_exception(e)
+            # Mark retrieved so a lookup nobody else waited on is not logged.
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            self._cache[host] = (time.monotonic() + self.ttl, addresses)
+            future.set_result(addresses)
+            return addresses
+        finally:
+            del self._pending[host]
+
+    async def _lookup(self, host: str) -> List[Address]:
+        async with self._sem:
+            self.lookups += 1
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, family=self.family,
+                                                                 type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys((family, sockaddr[0]) for family, _, _, _, sockaddr in infos))
+        if not addresses:
+            raise socket.gaierror(socket.EAI_NONAME, f"no addresses for {host}")
+        return addresses
+
+    async def address(self, host: str) -> Address:
+        """The address probes of ``host`` connect to: the first one returned."""
+        return (await self.resolve(host))[0]
+
+    async def resolve_many(self, hosts: Iterable[str]) -> Dict[str, List[Address]]:
+        """Resolve ``hosts`` concurrently; names that fail map to an empty list."""
+        hosts = list(dict.fromkeys(hosts))
+        results = await asyncio.gather(*(self.resolve(h) for h in hosts), return_exceptions=True)
+        return {h: (r if isinstance(r, list) else []) for h, r in zip(hosts, results)}
+
+
+async def expand_addresses(targets, resolver: Optional[Resolver] = None):
+    """``targets`` with every hostname replaced by all of its A/AAAA addresses.
+
+    Returns ``(targets, names)`` where ``names`` maps each address that came
+    from a hostname back to the names that resolved to it.
+    """
+    resolver = resolver or Resolver()
+    resolved = await resolver.resolve_many(hostnames(targets))
+    names: Dict[str, List[str]] = {}
+    for host, addresses in resolved.items():
+        for _, address in addresses:
+            names.setdefault(address, []).append(host)
+    if isinstance(targets, TargetSpace):
+        values = [_to_int(ipaddress.ip_address(a)) for a in names]
+        ranges = targets.addresses.ranges() + [(v, v + 1) for v in values]
+        return TargetSpace(IntRanges(ranges)), names
+    literals = [h for h in targets if literal(h) is not None]
+    return list(dict.fromkeys(literals + list(names))), names
@@ -1,47 +1,498 @@
 # scanner_async.py
 import asyncio
-from typing import List
-from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn, TimeElapsedColumn
+import errno
+import socket
+import struct
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from targets import ProbeSpace, space_size
+from resolver import Resolver, host_index, hostnames, without_hosts
 
-class AsyncPortScanner:
-    def __init__(self, target: str, ports: List[int], concurrency: int = 500, timeout: float = 1.0):
-        self.target = target
+# Probe outcomes. UNREACHABLE is reported as filtered but, unlike a silent
+# drop, it is an answer from the network and is never retried.
+OPEN = "open"
+CLOSED = "closed"
+FILTERED = "filtered"
+UNREACHABLE = "unreachable"
+ERROR = "error"
+
+# errno values that mean the scanning box itself is out of sockets/buffers
+# rather than anything about the target port.
+LOCAL_ERRNOS = {
+    errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.EAGAIN, errno.EADDRNOTAVAIL,
+}
+UNREACHABLE_ERRNOS = {errno.EHOSTUNREACH, errno.ENETUNREACH, errno.EHOSTDOWN}
+
+BACKENDS = ("stream", "raw")
+
+OpenHandler = Callable[[str, int, asyncio.StreamReader, asyncio.StreamWriter], Awaitable[None]]
+ResultHandler = Callable[[str, int, str], None]
+ProgressHandler = Callable[[int, int], None]
+
+# l_onoff=1, l_linger=0: close() sends RST and skips TIME_WAIT entirely.
+_LINGER_RST = struct.pack("ii", 1, 0)
+
+
+class AdaptiveWindow:
+    """AIMD-controlled limit on the number of probes in flight.
+
+    The window grows like TCP slow start / congestion avoidance for every
+    probe that gets an answer (SYN-ACK or RST) and is cut multiplicatively
+    when the network shows signs of loss: local socket errors, probes that
+    only answered on a retry, or a timeout rate well above the running
+    baseline.  A host that silently drops everything raises the baseline
+    instead of collapsing the window, so filtered hosts still scan at speed.
+    """
+
+    def __init__(self, maximum: int, initial: Optional[int] = None, minimum: int = 1,
+                 backoff: float = 0.5, sample: int = 64, loss_margin: float = 0.25):
+        self.maximum = max(1, int(maximum))
+        self.minimum = max(1, min(int(minimum), self.maximum))
+        if initial is None:
+            initial = min(self.maximum, 32)
+        self.cwnd = float(max(self.minimum, min(int(initial), self.maximum)))
+        self.ssthresh = float(self.maximum)
+        self.backoff = backoff
+        self.sample = sample
+        self.loss_margin = loss_margin
+        self.inflight = 0
+        self._waiters = deque()
+        self._replies = 0
+        self._timeouts = 0
+        self._errors = 0
+        self._timeout_baseline = None
+        self._recovering = False
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self.cwnd)
+
+    async def acquire(self):
+        while self.inflight >= self.limit:
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut in self._waiters:
+                    self._waiters.remove(fut)
+                raise
+        self.inflight += 1
+
+    def release(self, outcome: str, retried: bool = False):
+        self.inflight -= 1
+        if outcome in (OPEN, CLOSED, UNREACHABLE):
+            self._replies += 1
+            if retried:
+                # The first attempt vanished but the retry got an answer:
+                # that is a genuine drop, not a filtered port.
+                self._decrease()
+            elif self.cwnd < self.ssthresh:
+                self.cwnd = min(self.maximum, self.cwnd + 1)
+            else:
+                self.cwnd = min(self.maximum, self.cwnd + 1.0 / self.cwnd)
+        elif outcome == FILTERED:
+            self._timeouts += 1
+        else:
+            self._errors += 1
+            self._decrease()
+        if self._replies + self._timeouts + self._errors >= self.sample:
+            self._end_sample()
+        self._wake()
+
+    def _decrease(self):
+        # Cut at most once per sample so a burst of losses from one
+        # congestion event does not drive the window straight to the floor.
+        if self._recovering:
+            return
+        self._recovering = True
+        self.ssthresh = max(float(self.minimum), self.cwnd * self.backoff)
+        self.cwnd = self.ssthresh
+        self.decreases += 1
+
+    def _end_sample(self):
+        total = self._replies + self._timeouts + self._errors
+        rate = self._timeouts / total
+        if self._timeout_baseline is None:
+            self._timeout_baseline = rate
+        elif rate > self._timeout_baseline + self.loss_margin and self._replies:
+            self._decrease()
+        elif not self._recovering:
+            # Timeouts at the usual rate are filtered ports, not loss: let
+            # them count towards growth so mostly-dropped hosts still ramp up.
+            if self.cwnd < self.ssthresh:
+                self.cwnd = min(self.maximum, self.cwnd + self._timeouts)
+            else:
+                self.cwnd = min(self.maximum, self.cwnd + self._timeouts / self.cwnd)
+        self._timeout_baseline = 0.8 * self._timeout_baseline + 0.2 * rate
+        self._replies = self._timeouts = self._errors = 0
+        self._recovering = False
+
+    def _wake(self):
+        free = self.limit - self.inflight
+        while free > 0 and self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+
+class ScanScheduler:
+    """Scan many hosts x ports from one event loop under a shared budget.
+
+    All probes share one AdaptiveWindow of at most ``concurrency`` in-flight
+    connects; ``per_host`` caps how many of those may target the same host so
+    a slow or filtered host cannot monopolise the window.  Probes are drawn
+    lazily from a ProbeSpace (one port across all hosts, then the next, or a
+    keyed random permutation with ``randomize``/``seed``) and parked in a
+    small per-host backlog when their host is at its cap.  ``targets`` and
+    ``ports`` may be any sequences, including TargetSpace/PortSpace.
+    """
+
+    def __init__(self, targets: Sequence[str], ports: Sequence[int], concurrency: int = 500, timeout: float = 1.0,
+                 retries: int = 1, adaptive: bool = True, backend: str = "stream",
+                 per_host: Optional[int] = None, randomize: bool = False, seed: Optional[int] = None,
+                 on_open: Optional[OpenHandler] = None, on_result: Optional[ResultHandler] = None,
+                 budget: Optional[float] = None, shard: Tuple[int, int] = (0, 1), show_progress: bool = True,
+                 checkpoint=None, resolver: Optional[Resolver] = None, metrics=None,
+                 on_progress: Optional[ProgressHandler] = None, progress_interval: float = 0.1,
+                 handoff_limit: Optional[int] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown scan backend: {backend}")
+        self.targets = targets
         self.ports = ports
         self.concurrency = concurrency
         self.timeout = timeout
+        self.retries = max(0, retries)
+        self.adaptive = adaptive
+        self.backend = backend
+        self.randomize = randomize
+        self.seed = seed
+        hosts = space_size(targets)
+        if per_host is None:
+            per_host = concurrency if hosts == 1 else max(1, concurrency // 4)
+        self.per_host = max(1, min(per_host, concurrency))
+        self.stats: Dict[str, int] = {}
+        # Hostnames are looked up once (all of them before probing starts)
+        # and probes connect to the cached literal address.
+        self.resolver = resolver or Resolver()
+        self.unresolved: List[str] = []
+        # When set, the connection that proved a port open is handed to
+        # on_open(host, port, reader, writer) instead of being closed, so
+        # banner grabbing can reuse it without a second handshake.  At most
+        # handoff_limit (default: concurrency) connections are with on_open
+        # at once; past that, the probe that found the next open port keeps
+        # its window slot until one is free.
+        self.on_open = on_open
+        self.handoff_limit = max(1, handoff_limit if handoff_limit is not None else concurrency)
+        self._handoff_slots = None
+        # on_result(host, port, state) sees each final verdict as it lands,
+        # e.g. to stream findings to disk while the scan runs.
+        self.on_result = on_result
+        # Wall-clock seconds after which no new probes start; the probe
+        # order decides what gets done first.
+        self.budget = budget
+        self.expired = False
+        # (k, n): only scan every n-th probe of the plan, starting at k, so n
+        # processes can split one scan without coordinating.
+        self.shard = shard
+        # on_progress(done, total) is called at most every progress_interval
+        # seconds and once at the end; without one, show_progress draws a
+        # rich bar from the same throttled updates.
+        self.show_progress = show_progress
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        # A checkpoint.Checkpoint: probes whose bit is set are skipped, and
+        # each final verdict sets its probe's bit.
+        self.checkpoint = checkpoint
+        self._indices: Dict[Tuple[str, int], int] = {}
+        # A metrics.Metrics: outcome counts, retries and in-flight gauges are
+        # sampled from scan state; only connect latency is recorded per probe.
+        self.metrics = metrics
+        self.retried = 0
+        self._latency = None
+        self._handoffs = set()
 
-    async def _try_connect(self, port: int, sem: asyncio.Semaphore):
-        async with sem:
-            try:
-                reader, writer = await asyncio.open_connection(self.target, port)
+    @property
+    def label(self) -> str:
+        hosts = space_size(self.targets)
+        return self.targets[0] if hosts == 1 else f"{hosts} hosts"
+
+    def _classify(self, exc: BaseException) -> str:
+        if isinstance(exc, asyncio.TimeoutError):
+            return FILTERED
+        if isinstance(exc, ConnectionRefusedError):
+            return CLOSED
+        if isinstance(exc, OSError):
+            if exc.errno in UNREACHABLE_ERRNOS:
+                return UNREACHABLE
+            if exc.errno in LOCAL_ERRNOS:
+                return ERROR
+        return ERROR
+
+    async def _try_connect(self, host: str, port: int) -> str:
+        try:
+            _, address = await self.resolver.address(host)
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(address, port), timeout=self.timeout)
+        except Exception as e:
+            return self._classify(e)
+        if self.on_open is not None:
+            await self._handoff(host, port, reader, writer)
+            return OPEN
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
+        return OPEN
+
+    async def _handoff(self, host: str, port: int, reader, writer):
+        try:
+            await self._handoff_slots.acquire()
+        except BaseException:
+            writer.close()
+            raise
+        task = asyncio.create_task(self.on_open(host, port, reader, writer))
+        self._handoffs.add(task)
+        task.add_done_callback(self._handed_off)
+
+    def _handed_off(self, task):
+        self._handoffs.discard(task)
+        self._handoff_slots.release()
+
+    async def _raw_connect(self, host: str, port: int) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            family, address = await self.resolver.address(host)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+        except OSError as e:
+            return self._classify(e)
+        connected = False
+        try:
+            sock.setblocking(False)
+            addr = (address, port) if family == socket.AF_INET else (address, port, 0, 0)
+            # sock_connect issues a non-blocking connect and parks the socket in
+            # the loop's selector, so completions are polled in one batch per
+            # loop iteration rather than through a transport per probe.
+            await asyncio.wait_for(loop.sock_connect(sock, addr), timeout=self.timeout)
+            connected = True
+            if self.on_open is not None:
+                reader, writer = await asyncio.open_connection(sock=sock)
+                sock = None
+                await self._handoff(host, port, reader, writer)
+            return OPEN
+        except Exception as e:
+            return OPEN if connected else self._classify(e)
+        finally:
+            if sock is not None:
                 try:
-                    writer.close()
-                    await writer.wait_closed()
-                except Exception:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RST)
+                except OSError:
                     pass
-                return port, True
-            except Exception:
-                return port, False
+                sock.close()
+
+    async def _probe(self, host: str, port: int, attempt: int, window: AdaptiveWindow):
+        state = ERROR
+        start = time.perf_counter()
+        try:
+            if self.backend == "raw":
+                state = await self._raw_connect(host, port)
+            else:
+                state = await self._try_connect(host, port)
+        finally:
+            window.release(state, retried=attempt > 0)
+            if self._latency is not None:
+                self._latency[state].observe(time.perf_counter() - start)
+        return host, port, attempt, state
+
+    def _record(self, host: str, port: int, state: str):
+        self.stats[state] = self.stats.get(state, 0) + 1
+        if self.on_result is not None:
+            self.on_result(host, port, state)
+        if self.checkpoint is not None:
+            self.checkpoint.mark(self._indices.pop((host, port)))
+
+    def _plan(self) -> Tuple[Iterator[Tuple[str, int]], int]:
+        """Probe order and count; subclasses reorder or prune the (host, port) space.
+
+        Names that did not resolve are left out of both.
+        """
+        k, n = self.shard
+        if self.checkpoint is None:
+            space = ProbeSpace(without_hosts(self.targets, self.unresolved), self.ports,
+                               seed=self.seed, randomize=self.randomize)
+            return ((host, port) for _, host, port in space.indexed(k, n)), len(range(k, space.size, n))
+        # Checkpoint bits are indices into the full space, which must not
+        # shift when a name fails to resolve on one run and not the next.
+        space = ProbeSpace(self.targets, self.ports, seed=self.seed, randomize=self.randomize)
+        checkpoint, indices = self.checkpoint, self._indices
+        skip = set(self.unresolved)
+        hosts = space_size(self.targets)
+        skipped = 0
+        for name in skip:
+            h = host_index(self.targets, name)
+            skipped += sum(p * hosts + h not in checkpoint for p in range(space_size(self.ports)))
+
+        def pending():
+            for index, host, port in space.indexed(k, n):
+                if index not in checkpoint and host not in skip:
+                    # Remembered until the verdict lands, so at most the
+                    # in-flight and parked probes are held here.
+                    indices[(host, port)] = index
+                    yield host, port
+
+        return pending(), len(range(k, space.size, n)) - checkpoint.done - skipped
+
+    async def run(self) -> Dict[str, List[int]]:
+        """Probe every (host, port) pair; return open ports for hosts that have any."""
+        found: Dict[str, List[int]] = {}
+        self.stats = {}
+        self.retried = 0
+        self._handoff_slots = asyncio.Semaphore(self.handoff_limit)
+        if self.adaptive:
+            window = AdaptiveWindow(self.concurrency)
+        else:
+            window = AdaptiveWindow(self.concurrency, initial=self.concurrency, minimum=self.concurrency)
+        self.unresolved = []
+        names = hostnames(self.targets)
+        if names:
+            resolved = await self.resolver.resolve_many(names)
+            self.unresolved = [h for h, addresses in resolved.items() if not addresses]
+        probes, total = self._plan()
+        self.expired = False
+        deadline = time.monotonic() + self.budget if self.budget else None
+        retry = deque()
+        backlog: Dict[str, deque] = {}
+        unblocked = deque()
+        inflight: Dict[str, int] = {}
+        max_backlog = 4 * self.concurrency
+        parked = 0
+        tasks = set()
+
+        done = 0
+        last_report = 0.0
+        report = self.on_progress
+        display = None
+        if report is None and self.show_progress:
+            from events import ConsoleView, Progress, ScanStarted
+            display = ConsoleView()
+            display(ScanStarted(self.label, total))
+            report = lambda d, t: display(Progress(d, t))
+
+        metrics = self.metrics
+        if metrics is not None:
+            for state in (OPEN, CLOSED, FILTERED, ERROR):
+                metrics.counter("probes_total", lambda s=state: self.stats.get(s, 0), outcome=state)
+            metrics.counter("probe_retries_total", lambda: self.retried)
+            metrics.gauge("probes_inflight", lambda: len(tasks))
+            metrics.gauge("probes_parked", lambda: parked)
+            metrics.gauge("probe_window", lambda: window.limit)
+            metrics.gauge("probes_remaining", lambda: total - sum(self.stats.values()))
+            self._latency = {state: metrics.histogram("connect_seconds", outcome=state)
+                             for state in (OPEN, CLOSED, FILTERED, UNREACHABLE, ERROR)}
+
+        def finished(task):
+            nonlocal done, last_report
+            tasks.discard(task)
+            if task.cancelled():
+                return
+            host, port, attempt, state = task.result()
+            inflight[host] -= 1
+            if not inflight[host]:
+                del inflight[host]
+            if backlog.get(host):
+                unblocked.append(host)
+            if state in (FILTERED, ERROR) and attempt < self.retries:
+                retry.append((host, port, attempt + 1))
+                self.retried += 1
+                return
+            state = FILTERED if state == UNREACHABLE else state
+            self._record(host, port, state)
+            done += 1
+            if report is not None:
+                now = time.monotonic()
+                if now - last_report >= self.progress_interval:
+                    last_report = now
+                    report(done, total)
+            if state == OPEN:
+                found.setdefault(host, []).append(port)
+
+        def next_probe():
+            nonlocal parked
+            if deadline is not None and time.monotonic() >= deadline:
+                # Out of budget: let in-flight probes finish, start nothing new.
+                self.expired = True
+                return None
+            while unblocked:
+                host = unblocked.popleft()
+                queue = backlog.get(host)
+                if queue and inflight.get(host, 0) < self.per_host:
+                    parked -= 1
+                    item = queue.popleft()
+                    if not queue:
+                        del backlog[host]
+                    return item
+            while retry or parked < max_backlog:
+                if retry:
+                    item = retry.popleft()
+                else:
+                    pair = next(probes, None)
+                    if pair is None:
+                        return None
+                    item = (pair[0], pair[1], 0)
+                if inflight.get(item[0], 0) < self.per_host:
+                    return item
+                backlog.setdefault(item[0], deque()).append(item)
+                parked += 1
+            return None
+
+        try:
+            while True:
+                item = next_probe()
+                if item is None:
+                    if not tasks:
+                        break
+                    # Outstanding probes may free a host or queue retries.
+                    await asyncio.wait(set(tasks), return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                host, port, attempt = item
+                await window.acquire()
+                inflight[host] = inflight.get(host, 0) + 1
+                task = asyncio.create_task(self._probe(host, port, attempt, window))
+                tasks.add(task)
+                task.add_done_callback(finished)
+            if report is not None:
+                report(done, total)
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            if display is not None:
+                display.close()
+
+        if self._handoffs:
+            await asyncio.gather(*list(self._handoffs), return_exceptions=True)
+        return {host: sorted(ports) for host, ports in found.items()}
+
+
+class AsyncPortScanner(ScanScheduler):
+    def __init__(self, target: str, ports: List[int], concurrency: int = 500, timeout: float = 1.0,
+                 retries: int = 1, adaptive: bool = True, backend: str = "stream", show_progress: bool = True,
+                 on_progress: Optional[ProgressHandler] = None, on_result: Optional[ResultHandler] = None,
+                 metrics=None):
+        super().__init__([target], ports, concurrency, timeout, retries=retries, adaptive=adaptive,
+                         backend=backend, show_progress=show_progress, on_progress=on_progress,
+                         on_result=on_result, metrics=metrics)
+        self.target = target
+        self.results: Dict[int, str] = {}
+
+    def _record(self, host: str, port: int, state: str):
+        super()._record(host, port, state)
+        self.results[port] = state
 
     async def run(self):
-        open_ports = []
-        sem = asyncio.Semaphore(self.concurrency)
-        tasks = []
-
-        # Use the synchronous context manager for Progress (works inside async functions)
-        progress = Progress(SpinnerColumn(), TextColumn("Scanning {task.fields[target]}"), BarColumn(), TimeElapsedColumn())
-        task_id = progress.add_task("scan", total=len(self.ports), target=self.target)
-
-        with progress:
-            for p in self.ports:
-                coro = self._try_connect(p, sem)
-                task = asyncio.create_task(coro)
-                tasks.append(task)
-
-            for fut in asyncio.as_completed(tasks):
-                port, ok = await fut
-                progress.update(task_id, advance=1)
-                if ok:
-                    open_ports.append(port)
-
-        return sorted(open_ports)
+        self.results = {}
+        found = await super().run()
+        return found.get(self.target, [])
@@ -0,0 +1,180 @@
+# sharding.py
+"""Split one scan across worker processes on the same box.
+
+Each worker runs its own event loop (uvloop when installed) over every
+n-th probe of the plan (``ScanScheduler.shard``), with ``1/n`` of the
+concurrency. Open ports, inline banners and fingerprints, and batched
+progress counts stream back to the parent over one pipe per worker.
+The parent reads the pipes from its own event loop and feeds the usual
+sink, so the rest of the pipeline cannot tell the scan was sharded.
+"""
+import asyncio
+import multiprocessing
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from banner import BannerGrabber
+from delta import DeltaScheduler
+from fingerprint import Fingerprint
+from scanner_async import OPEN, ScanScheduler
+from targets import space_size
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Progress is reported in batches so the pipe carries a few messages a
+# second per worker rather than one per probe.
+_PROGRESS_EVERY = 0.25
+
+
+def _worker(shard: Tuple[int, int], config: dict, conn):
+    done = 0
+    last = time.monotonic()
+
+    def flush():
+        nonlocal done, last
+        if done:
+            conn.send(("progress", done))
+            done = 0
+        last = time.monotonic()
+
+    def on_result(host, port, state):
+        nonlocal done
+        done += 1
+        if state == OPEN:
+            conn.send(("open", host, port))
+        if time.monotonic() - last >= _PROGRESS_EVERY:
+            flush()
+
+    async def scan():
+        grabber = BannerGrabber(config["targets"][0], config["timeout"])
+        on_open = None
+        if config["inline_grab"]:
+            async def on_open(host, port, reader, writer):
+                banner = await grabber.grab_stream(reader, writer, port, host)
+                fp = grabber.fingerprints.get((host, port))
+                conn.send(("banner", host, port, banner, fp._asdict() if fp is not None else None))
+
+        options = dict(config["options"], on_open=on_open, on_result=on_result, shard=shard,
+                       show_progress=False)
+        if config.get("known_open") is not None:
+            scanner = DeltaScheduler(config["targets"], config["ports"], known_open=config["known_open"],
+                                     port_counts=config["port_counts"], **options)
+        else:
+            scanner = ScanScheduler(config["targets"], config["ports"], **options)
+        await scanner.run()
+        return scanner
+
+    try:
+        scanner = uvloop.run(scan()) if uvloop is not None else asyncio.run(scan())
+        flush()
+        conn.send(("done", scanner.stats, scanner.expired))
+    except Exception as e:
+        flush()
+        conn.send(("error", str(e)))
+    finally:
+        conn.close()
+
+
+async def run_sharded(processes: int, targets, ports, concurrency: int, timeout: float,
+                      inline_grab: bool = True, on_result: Optional[Callable[[str, int, str], None]] = None,
+                      grabber: Optional[BannerGrabber] = None, label: str = "",
+                      known_open: Optional[List[Tuple[str, int]]] = None,
+                      port_counts: Optional[Dict[int, int]] = None,
+                      on_progress: Optional[Callable[[int, int], None]] = None, show_progress: bool = True,
+                      **options):
+    """Scan with ``processes`` workers; return (found, banners, stats, expired).
+
+    ``found`` is ``{host: sorted open ports}``, like ``ScanScheduler.run``.
+    ``banners`` is ``{host: {port: banner}}`` when grabbing inline, and
+    worker fingerprints are copied into ``grabber.fingerprints``.
+    ``on_progress(done, total)`` sees the batched worker counts; without
+    it, ``show_progress`` draws a rich bar from them.
+    """
+    processes = max(1, processes)
+    per_host = options.pop("per_host", None)
+    config = {
+        "targets": targets, "ports": ports, "timeout": timeout, "inline_grab": inline_grab,
+        "known_open": known_open, "port_counts": port_counts,
+        "options": dict(options, concurrency=max(1, concurrency // processes), timeout=timeout,
+                        per_host=max(1, per_host // processes) if per_host else None),
+    }
+    ctx = multiprocessing.get_context()
+    loop = asyncio.get_running_loop()
+    found: Dict[str, List[int]] = {}
+    banners: Dict[str, Dict[int, str]] = {}
+    stats: Dict[str, int] = {}
+    expired = False
+    errors = []
+    finished = loop.create_future()
+    remaining = processes
+    total = space_size(targets) * space_size(ports)
+
+    done = 0
+    display = None
+    if on_progress is None and show_progress:
+        from events import ConsoleView, Progress, ScanStarted
+        display = ConsoleView()
+        display(ScanStarted(f"{label} ({processes} processes)", total))
+        on_progress = lambda d, t: display(Progress(d, t))
+
+    def reader(conn):
+        nonlocal remaining, expired, done
+        while True:
+            try:
+                if not conn.poll():
+                    return
+                msg = conn.recv()
+            except (EOFError, OSError):
+                msg = ("error", "worker exited unexpectedly")
+            kind = msg[0]
+            if kind == "progress":
+                done += msg[1]
+                if on_progress is not None:
+                    on_progress(done, total)
+            elif kind == "open":
+                _, host, port = msg
+                found.setdefault(host, []).append(port)
+                if on_result is not None:
+                    on_result(host, port, OPEN)
+            elif kind == "banner":
+                _, host, port, banner, fp = msg
+                banners.setdefault(host, {})[port] = banner
+                if fp is not None and grabber is not None:
+                    grabber.fingerprints[(host, port)] = Fingerprint(**fp)
+            elif kind in ("done", "error"):
+                if kind == "done":
+                    for state, count in msg[1].items():
+                        stats[state] = stats.get(state, 0) + count
+                    expired = expired or msg[2]
+                else:
+                    errors.append(msg[1])
+                loop.remove_reader(conn.fileno())
+                conn.close()
+                remaining -= 1
+                if not remaining and not finished.done():
+                    finished.set_result(None)
+                return
+
+    workers = []
+    try:
+        for k in range(processes):
+            parent, child = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_worker, args=((k, processes), config, child), daemon=True)
+            proc.start()
+            child.close()
+            loop.add_reader(parent.fileno(), reader, parent)
+            workers.append(proc)
+        await finished
+    finally:
+        for proc in workers:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        if display is not None:
+            display.close()
+    if errors and not found:
+        raise RuntimeError("; ".join(errors))
+    return {host: sorted(ports) for host, ports in found.items()}, banners, stats, expired
@@ -0,0 +1,368 @@
+# targets.py
+"""Lazy target and port spaces built on integer ranges.
+
+Nothing here materialises one object per address or port: a /8 or an IPv6
+prefix is a handful of ``(start, end)`` pairs, indexing is a bisect, and
+(host, port) probes are generated on demand, optionally in a keyed
+pseudo-random order from a Feistel permutation.
+"""
+import bisect
+import hashlib
+import ipaddress
+import os
+import random
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+# IPv4 and IPv6 share one integer line: v4 addresses map to themselves and
+# v6 addresses are shifted past the end of the v4 space.
+_V6_BASE = 1 << 32
+
+
+def space_size(seq) -> int:
+    """Length of a sequence that may be too large for ``len()`` (e.g. an IPv6 /64)."""
+    size = getattr(seq, "size", None)
+    return size if size is not None else len(seq)
+
+
+def spec_digest(seq) -> str:
+    """Short fingerprint of a target or port sequence, e.g. to tell two scans apart."""
+    text = seq.spec() if hasattr(seq, "spec") else ",".join(map(str, seq))
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+class IntRanges:
+    """Immutable sorted union of half-open ``[start, end)`` integer ranges."""
+
+    def __init__(self, ranges: Iterable[Tuple[int, int]] = ()):
+        merged = []
+        for start, end in sorted(r for r in ranges if r[1] > r[0]):
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        self._starts = [r[0] for r in merged]
+        self._ends = [r[1] for r in merged]
+        self._offsets = []
+        total = 0
+        for start, end in merged:
+            self._offsets.append(total)
+            total += end - start
+        self.size = total
+
+    def ranges(self) -> List[Tuple[int, int]]:
+        return list(zip(self._starts, self._ends))
+
+    def subtract(self, other: "IntRanges") -> "IntRanges":
+        out = []
+        cuts = other.ranges()
+        j = 0
+        for start, end in self.ranges():
+            while j < len(cuts) and cuts[j][1] <= start:
+                j += 1
+            k = j
+            while k < len(cuts) and cuts[k][0] < end:
+                if cuts[k][0] > start:
+                    out.append((start, cuts[k][0]))
+                start = max(start, cuts[k][1])
+                k += 1
+            if start < end:
+                out.append((start, end))
+        return self.__class__(out)
+
+    def slice(self, start: int, stop: int) -> "IntRanges":
+        """The values at indices ``[start, stop)``, as a new range set."""
+        out = []
+        for offset, lo, hi in zip(self._offsets, self._starts, self._ends):
+            first, last = max(start - offset, 0), min(stop - offset, hi - lo)
+            if first < last:
+                out.append((lo + first, lo + last))
+        return self.__class__(out)
+
+    def _value(self, index: int) -> int:
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("range index out of range")
+        r = bisect.bisect_right(self._offsets, index) - 1
+        return self._starts[r] + index - self._offsets[r]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __contains__(self, value: int) -> bool:
+        r = bisect.bisect_right(self._starts, value) - 1
+        return r >= 0 and value < self._ends[r]
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end)
+
+
+class PortSpace(IntRanges):
+    """Sorted, de-duplicated port set that behaves like a read-only list of ints."""
+
+    @classmethod
+    def parse(cls, spec: str, exclude: str = "") -> "PortSpace":
+        """Parse ``"22,80,8000-8100"``; raises ValueError on malformed input."""
+        space = cls(cls._ranges(spec))
+        if exclude:
+            space = space.subtract(cls(cls._ranges(exclude)))
+        return space
+
+    @staticmethod
+    def _ranges(spec: str) -> List[Tuple[int, int]]:
+        out = []
+        for part in (spec or "").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if "-" in part:
+                a, b = part.split("-", 1)
+                a, b = int(a), int(b)
+            else:
+                a = b = int(part)
+            if not 0 <= a <= b <= 65535:
+                raise ValueError(f"bad port range: {part}")
+            out.append((a, b + 1))
+        return out
+
+    def __getitem__(self, index: int) -> int:
+        return self._value(index)
+
+    def spec(self) -> str:
+        """Port list syntax that ``parse`` reads back into the same set."""
+        return ",".join(str(s) if e - s == 1 else f"{s}-{e - 1}" for s, e in self.ranges())
+
+    def __repr__(self) -> str:
+        return f"PortSpace({self.spec()!r})"
+
+
+def _to_int(addr) -> int:
+    return int(addr) if addr.version == 4 else _V6_BASE + int(addr)
+
+
+def _to_str(value: int) -> str:
+    if value < _V6_BASE:
+        return str(ipaddress.IPv4Address(value))
+    return str(ipaddress.IPv6Address(value - _V6_BASE))
+
+
+def ip_sort_key(ip: str):
+    """Sort key putting IPv4 before IPv6 in numeric order, hostnames last."""
+    try:
+        addr = ipaddress.ip_address(ip)
+        return (addr.version, int(addr), "")
+    except ValueError:
+        return (99, 0, ip)
+
+
+class TargetSpace:
+    """Addresses as integer ranges plus any hostnames, indexable like a list of str.
+
+    Built from comma-separated single IPs, CIDRs, last-octet ranges
+    (``10.0.0.5-20``), full ``a-b`` address ranges, URLs, hostnames and
+    ``@file`` host lists.  Addresses come first in numeric order, hostnames
+    after them in input order.
+    """
+
+    def __init__(self, addresses: IntRanges = None, hostnames: Sequence[str] = ()):
+        self.addresses = addresses if addresses is not None else IntRanges()
+        self.hostnames = list(dict.fromkeys(hostnames))
+
+    @classmethod
+    def parse(cls, spec: str, exclude: str = "") -> "TargetSpace":
+        ranges, names = [], []
+        cls._collect(spec, ranges, names)
+        space = cls(IntRanges(ranges), names)
+        if exclude:
+            space = space.subtract(cls.parse(exclude))
+        return space
+
+    @classmethod
+    def _collect(cls, spec: str, ranges: list, names: list):
+        for item in (spec or "").split(","):
+            item = item.strip()
+            if not item:
+                continue
+            if item.startswith("@") or os.path.isfile(item):
+                path = item[1:] if item.startswith("@") else item
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            cls._collect(line.split("#", 1)[0], ranges, names)
+                except OSError:
+                    pass
+                continue
+            if item.startswith("http://") or item.startswith("https://"):
+                host = urlparse(item).hostname
+                if host:
+                    cls._collect(host, ranges, names)
+                continue
+            rng = cls._item_range(item)
+            if rng is not None:
+                ranges.append(rng)
+            else:
+                names.append(item.split("/")[0])
+
+    @staticmethod
+    def _item_range(item: str) -> Optional[Tuple[int, int]]:
+        try:
+            addr = ipaddress.ip_address(item)
+            return _to_int(addr), _to_int(addr) + 1
+        except ValueError:
+            pass
+        if "/" in item:
+            try:
+                net = ipaddress.ip_network(item, strict=False)
+            except ValueError:
+                return None
+            first, last = _to_int(net.network_address), _to_int(net.broadcast_address)
+            # Match ip_network.hosts(): skip the network (and, for IPv4,
+            # broadcast) address except on point-to-point sized prefixes.
+            if net.num_addresses > 2:
+                first += 1
+                if net.version == 4:
+                    last -= 1
+            return first, last + 1
+        if "-" in item:
+            a, b = item.split("-", 1)
+            try:
+                start = ipaddress.ip_address(a.strip())
+                if "." in b or ":" in b:
+                    end = ipaddress.ip_address(b.strip())
+                else:
+                    base = a.rsplit(".", 1)[0]
+                    end = ipaddress.ip_address(f"{base}.{int(b)}")
+            except ValueError:
+                return None
+            if start.version != end.version or end < start:
+                return None
+            return _to_int(start), _to_int(end) + 1
+        return None
+
+    def subtract(self, other: "TargetSpace") -> "TargetSpace":
+        drop = set(other.hostnames)
+        return TargetSpace(self.addresses.subtract(other.addresses),
+                           [h for h in self.hostnames if h not in drop])
+
+    def slice(self, start: int, stop: int) -> "TargetSpace":
+        """Targets at indices ``[start, stop)`` in iteration order."""
+        n = self.addresses.size
+        return TargetSpace(self.addresses.slice(start, stop),
+                           self.hostnames[max(start - n, 0):max(stop - n, 0)])
+
+    def spec(self) -> str:
+        """Target syntax that ``parse`` reads back into the same space."""
+        parts = [_to_str(s) if e - s == 1 else f"{_to_str(s)}-{_to_str(e - 1)}"
+                 for s, e in self.addresses.ranges()]
+        return ",".join(parts + self.hostnames)
+
+    @property
+    def size(self) -> int:
+        return self.addresses.size + len(self.hostnames)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __getitem__(self, index: int) -> str:
+        n = self.addresses.size
+        if index < 0:
+            index += self.size
+        if index < n:
+            return _to_str(self.addresses._value(index))
+        return self.hostnames[index - n]
+
+    def __iter__(self) -> Iterator[str]:
+        for value in self.addresses:
+            yield _to_str(value)
+        yield from self.hostnames
+
+    def __contains__(self, host: str) -> bool:
+        try:
+            return _to_int(ipaddress.ip_address(host)) in self.addresses
+        except ValueError:
+            return host in self.hostnames
+
+
+class FeistelPermutation:
+    """Keyed bijection on ``range(n)`` computed one index at a time.
+
+    A balanced Feistel network permutes the smallest even-bit-width power
+    of two covering ``n``; values that land outside ``range(n)`` are
+    re-encrypted until they fall inside (cycle walking), which preserves
+    the bijection.  The domain is at most 4n, so that loop is short.
+    """
+
+    def __init__(self, n: int, seed: Optional[int] = None, rounds: int = 4):
+        self.n = n
+        bits = max(2, (max(n, 1) - 1).bit_length())
+        self.half = (bits + 1) // 2
+        self.mask = (1 << self.half) - 1
+        rng = random.Random(seed)
+        self.keys = [rng.getrandbits(32) for _ in range(rounds)]
+
+    def _round(self, value: int, key: int) -> int:
+        value = ((value ^ key) * 0x9E3779B1) & 0xFFFFFFFFFFFF
+        value ^= value >> 17
+        return (value * 0x85EBCA6B >> 5) & self.mask
+
+    def _encrypt(self, x: int) -> int:
+        left, right = x >> self.half, x & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self.half) | right
+
+    def __getitem__(self, index: int) -> int:
+        if not 0 <= index < self.n:
+            raise IndexError("permutation index out of range")
+        x = self._encrypt(index)
+        while x >= self.n:
+            x = self._encrypt(x)
+        return x
+
+    def __iter__(self) -> Iterator[int]:
+        for i in range(self.n):
+            yield self[i]
+
+
+class ProbeSpace:
+    """Every (host, port) pair of a target and port space, addressed by index.
+
+    Index ``i`` maps to ``ports[i // H]`` on ``targets[i % H]``, so the
+    natural order sweeps one port across all hosts before the next.  With a
+    ``seed`` the indices are visited through a FeistelPermutation instead,
+    spreading probes over subnets without storing any shuffle state.
+    """
+
+    def __init__(self, targets: Sequence[str], ports: Sequence[int], seed: Optional[int] = None,
+                 randomize: bool = False):
+        self.targets = targets
+        self.ports = ports
+        self._hosts = space_size(targets)
+        self.size = self._hosts * space_size(ports)
+        self.order = FeistelPermutation(self.size, seed) if (randomize or seed is not None) else None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def pair(self, index: int) -> Tuple[str, int]:
+        return self.targets[index % self._hosts], self.ports[index // self._hosts]
+
+    def indexed(self, start: int = 0, step: int = 1) -> Iterator[Tuple[int, str, int]]:
+        """Yield ``(index, host, port)`` in scan order from position ``start``, every ``step``-th."""
+        for pos in range(start, self.size, step):
+            index = self.order[pos] if self.order is not None else pos
+            host, port = self.pair(index)
+            yield index, host, port
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        for _, host, port in self.indexed():
+            yield host, port
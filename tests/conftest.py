@@ -0,0 +1,16 @@
+import os
+import socket
+import sys
+
+import pytest
+
+# The scanner is a set of top-level modules run from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def closed_port():
+    """A loopback TCP port with nothing listening on it."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
@@ -0,0 +1,157 @@
+import asyncio
+import re
+import socket
+import threading
+
+import pytest
+from aiohttp import web
+
+import ai_helper
+from ai_helper import AIHelper
+
+
+def cves(*ids):
+    return [{"id": cid, "summary": f"summary of {cid}"} for cid in ids]
+
+
+class CompletionServer:
+    """A local stand-in for the chat completions endpoint, run on its own thread."""
+
+    def __init__(self, status=200, delay=0.0, usage=100):
+        self.status = status
+        self.delay = delay
+        self.usage = usage
+        self.prompts = []
+
+    async def handle(self, request):
+        body = await request.json()
+        prompt = body["messages"][0]["content"]
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.Response(status=self.status)
+        sets = re.findall(r"^### Set (\d+)\n([^\n:]+):", prompt, re.M)
+        content = "\n".join(f"### Set {n}\nexplained {cid}" for n, cid in sets)
+        return web.json_response({"choices": [{"message": {"content": content}}],
+                                  "usage": {"total_tokens": self.usage}})
+
+    def __enter__(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.base = f"http://127.0.0.1:{sock.getsockname()[1]}/v1"
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def start():
+            app = web.Application()
+            app.router.add_post("/v1/chat/completions", self.handle)
+            self.runner = web.AppRunner(app)
+            await self.runner.setup()
+            await web.SockSite(self.runner, sock).start()
+            started.set()
+
+        self.thread = threading.Thread(target=lambda: (self.loop.create_task(start()), self.loop.run_forever()),
+                                       daemon=True)
+        self.thread.start()
+        started.wait(5)
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+@pytest.fixture
+def online(monkeypatch):
+    monkeypatch.setattr(ai_helper, "USE_OPENAI", True)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+
+def helper(server, **kwargs):
+    kwargs.setdefault("cache", None)
+    kwargs.setdefault("rate", 0)
+    return AIHelper(api_base=server.base, **kwargs)
+
+
+def test_without_a_key_explanations_are_local(monkeypatch):
+    monkeypatch.setattr(ai_helper, "USE_OPENAI", False)
+    out = AIHelper(cache=None).explain_cves({22: cves("CVE-1"), 80: []})
+    assert out[22] == "- CVE-1: summary of CVE-1"
+    assert "No quick CVE hits" in out[80]
+
+
+def test_distinct_sets_are_batched_and_repeats_explained_once(online):
+    results = {f"h{i}:22": cves(f"CVE-{i}") for i in range(6)}
+    results["h9:22"] = cves("CVE-0")            # same set as h0
+    with CompletionServer() as server:
+        ai = helper(server, batch_size=4)
+        out = ai.explain_cves(results)
+    assert ai.completions == 2
+    assert len(server.prompts) == 2
+    for i in range(6):
+        assert out[f"h{i}:22"] == f"explained CVE-{i}"
+    assert out["h9:22"] == "explained CVE-0"
+
+
+def test_disk_cache_serves_later_scans(online, tmp_path):
+    path = str(tmp_path / "ai.db")
+    with CompletionServer() as server:
+        first = helper(server, cache=path)
+        first.explain_cves({22: cves("CVE-7")})
+        second = helper(server, cache=path)
+        out = second.explain_cves({2222: cves("CVE-7")})
+    assert (first.completions, second.completions) == (1, 0)
+    assert out[2222] == "explained CVE-7"
+
+
+def test_billed_usage_replaces_the_estimate(online):
+    with CompletionServer(usage=123) as server:
+        ai = helper(server)
+        ai.explain_cves({22: cves("CVE-1")})
+    assert ai.tokens_used == 123
+
+
+def test_failed_batches_refund_their_reservation(online):
+    with CompletionServer(status=500) as server:
+        ai = helper(server, batch_size=1)
+        out = ai.explain_cves({p: cves(f"CVE-{p}") for p in range(5)})
+    assert ai.tokens_used == 0
+    assert all(text.startswith("(AI lookup failed)") for text in out.values())
+
+
+def test_budget_survives_a_failed_batch(online):
+    results = {22: cves("CVE-1")}
+    with CompletionServer(status=503) as server:
+        ai = helper(server)
+        ai.token_budget = ai._estimate(ai._prompt([results[22]]), 1)
+        ai.explain_cves(results)
+    with CompletionServer() as server:
+        ai.api_base = server.base
+        out = ai.explain_cves(results)
+    assert out[22] == "explained CVE-1"
+
+
+def test_batches_past_the_deadline_fall_back_and_refund(online):
+    with CompletionServer(delay=2.0) as server:
+        ai = helper(server, deadline=0.3)
+        out = ai.explain_cves({22: cves("CVE-1")})
+    assert out[22].endswith("- CVE-1: summary of CVE-1")
+    assert ai.tokens_used == 0
+    assert ai.completions == 0
+
+
+def test_cancelled_batches_refund_their_reservation(online):
+    with CompletionServer(delay=2.0) as server:
+        ai = helper(server, deadline=10)
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(asyncio.wait_for(ai.explain_cves_async({22: cves("CVE-1")}), 0.3))
+    assert ai.tokens_used == 0
+
+
+def test_over_budget_sets_get_local_summaries(online):
+    with CompletionServer() as server:
+        ai = helper(server, token_budget=10)
+        out = ai.explain_cves({22: cves("CVE-1")})
+    assert ai.completions == 0
+    assert out[22] == "- CVE-1: summary of CVE-1"
@@ -0,0 +1,69 @@
+import asyncio
+import socket
+
+from banner import BannerGrabber
+from scanner_async import ScanScheduler
+
+GREETING = b"SSH-2.0-OpenSSH_8.2p1\r\n"
+HTTP_REPLY = b"HTTP/1.1 200 OK\r\nServer: nginx/1.18.0\r\nContent-Length: 0\r\n\r\n"
+
+
+async def start_servers(connections):
+    """One server that greets, one that only answers once it is sent something."""
+    async def greeter(reader, writer):
+        connections.append("greeter")
+        writer.write(GREETING)
+        await writer.drain()
+        writer.close()
+
+    async def responder(reader, writer):
+        connections.append("responder")
+        try:
+            if await reader.read(4096):
+                writer.write(HTTP_REPLY)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    servers = [await asyncio.start_server(handler, "127.0.0.1", 0) for handler in (greeter, responder)]
+    return servers, [s.sockets[0].getsockname()[1] for s in servers]
+
+
+def test_banners_are_read_over_the_scan_connection():
+    async def go():
+        connections = []
+        servers, ports = await start_servers(connections)
+        grabber = BannerGrabber("127.0.0.1", timeout=1.0, greeting=0.1)
+        banners = {}
+
+        async def on_open(host, port, reader, writer):
+            banners[port] = await grabber.grab_stream(reader, writer, port, host)
+
+        found = await ScanScheduler(["127.0.0.1"], sorted(ports), 10, 1.0, on_open=on_open,
+                                    show_progress=False).run()
+        for s in servers:
+            s.close()
+        return ports, found, banners, grabber, connections
+    (greet, respond), found, banners, grabber, connections = asyncio.run(go())
+    assert found == {"127.0.0.1": sorted([greet, respond])}
+    assert banners == {greet: "SSH-2.0-OpenSSH_8.2p1", respond: "HTTP/1.1 200 OK"}
+    # One connection per port: the scan's connect is the one the banner came over.
+    assert sorted(connections) == ["greeter", "responder"]
+    assert grabber.fingerprints[("127.0.0.1", greet)].product == "OpenSSH"
+    assert grabber.fingerprints[("127.0.0.1", respond)].product == "nginx"
+
+
+def test_grab_many_connects_itself_and_tolerates_closed_ports():
+    async def go():
+        servers, ports = await start_servers([])
+        grabber = BannerGrabber("127.0.0.1", timeout=1.0, greeting=0.1, concurrency=2)
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            closed = s.getsockname()[1]
+        result = await grabber.grab_many(ports + [closed])
+        for s in servers:
+            s.close()
+        return ports, closed, result, grabber.active
+    (greet, respond), closed, result, active = asyncio.run(go())
+    assert result == {greet: "SSH-2.0-OpenSSH_8.2p1", respond: "HTTP/1.1 200 OK", closed: ""}
+    assert active == 0
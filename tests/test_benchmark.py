@@ -0,0 +1,49 @@
+import json
+import socket
+
+import benchmark
+
+
+def free_base_port(span):
+    """A base port with ``span`` free ports after it on the loopback fixtures."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return min(port, 60000 - span)
+
+
+def test_percentile_and_median_runs():
+    assert benchmark._percentile([], 0.5) is None
+    assert benchmark._percentile([3, 1, 2, 4, 5], 0.5) == 3
+    assert benchmark._percentile([1, 2, 3], 0.99) == 3
+    runs = [{"ops": 10, "p50_ms": v, "correct": True} for v in (5.0, 1.0, 3.0)]
+    merged = benchmark._median_runs(runs)
+    assert (merged["p50_ms"], merged["runs"], merged["correct"]) == (3.0, 3, True)
+    assert benchmark._median_runs([{"error": "x"}, {"ops": 1}]) == {"error": "x"}
+
+
+def test_compare_flags_only_worse_than_threshold():
+    base = {"phases": {"scan": {"ops_per_s": 1000.0, "p50_ms": 10.0, "cpu_s": 1.0}}}
+    now = {"phases": {"scan": {"ops_per_s": 700.0, "p50_ms": 9.0, "cpu_s": 1.1}, "udp": {"skipped": True}}}
+    rows = {r["metric"]: r for r in benchmark.compare(base, now, threshold=0.15)}
+    assert set(rows) == {"ops_per_s", "p50_ms", "cpu_s"}
+    assert rows["ops_per_s"]["regression"] and rows["ops_per_s"]["change"] == -0.3
+    assert not rows["p50_ms"]["regression"] and not rows["cpu_s"]["regression"]
+
+
+def test_loopback_run_and_baseline_comparison(tmp_path):
+    out, baseline = tmp_path / "now.json", tmp_path / "base.json"
+    args = ["--phases", "scan,banner,report", "--span", "200", "--open", "20", "--slow", "2", "--filtered", "4",
+            "--findings", "100", "--base-port", str(free_base_port(200)), "--out", str(out)]
+    assert benchmark.main(args) == 0
+    report = json.loads(out.read_text())
+    assert set(report["phases"]) == {"scan", "banner", "report"}
+    for phase in report["phases"].values():
+        assert phase.get("correct") is True, phase
+    assert report["phases"]["scan"]["found"] == 22
+    # A baseline ten times faster everywhere turns every throughput into a regression.
+    fast = json.loads(out.read_text())
+    for phase in fast["phases"].values():
+        phase["ops_per_s"] *= 10
+    baseline.write_text(json.dumps(fast))
+    assert benchmark.main(args + ["--compare", str(baseline)]) == 1
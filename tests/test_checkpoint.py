@@ -0,0 +1,119 @@
+import asyncio
+import mmap
+import os
+import socket
+
+import pytest
+
+from checkpoint import Checkpoint, CheckpointMismatch, checkpoint_path, stored_params
+from scanner_async import ScanScheduler
+from targets import FeistelPermutation, PortSpace, TargetSpace
+
+PARAMS = {"label": "t", "targets": "abc", "ports": "def", "seed": 7, "randomize": True}
+
+
+def test_checkpoint_path():
+    assert checkpoint_path("out/report.json") == "out/report.ckpt"
+
+
+def test_marks_survive_a_reopen(tmp_path):
+    path = str(tmp_path / "scan.ckpt")
+    ckpt = Checkpoint(path, 1000, PARAMS)
+    for i in (0, 7, 8, 999, 7):
+        ckpt.mark(i)
+    assert ckpt.done == 4
+    ckpt.close()
+    assert stored_params(path) == dict(PARAMS, size=1000)
+    again = Checkpoint(path, 1000, PARAMS, resume=True)
+    assert again.done == 4
+    assert [i for i in range(1000) if i in again] == [0, 7, 8, 999]
+    again.close()
+
+
+def test_marks_reach_the_file_only_on_sync_after_the_stream(tmp_path):
+    path = str(tmp_path / "scan.ckpt")
+    order = []
+    ckpt = Checkpoint(path, 64, PARAMS, interval=3600, before_sync=lambda: order.append("stream"))
+    ckpt.mark(3)
+    # The mapping is private, so nothing lands in the file between checkpoints.
+    assert Checkpoint(path, 64, PARAMS, resume=True).done == 0
+    ckpt.sync()
+    assert order == ["stream"]
+    assert Checkpoint(path, 64, PARAMS, resume=True).done == 1
+    ckpt.close()
+
+
+def test_sync_writes_only_the_dirty_pages(tmp_path, monkeypatch):
+    page_bits = mmap.PAGESIZE * 8
+    size = 64 * page_bits
+    path = str(tmp_path / "scan.ckpt")
+    ckpt = Checkpoint(path, size, PARAMS, interval=3600)
+    writes = []
+    real_pwrite = os.pwrite
+
+    def pwrite(fd, data, offset):
+        writes.append(len(data))
+        return real_pwrite(fd, data, offset)
+    monkeypatch.setattr(os, "pwrite", pwrite)
+    # The first marks of a permuted scan land all over the bitmap.
+    order = FeistelPermutation(size, seed=3)
+    marked = [order[i] for i in range(5)]
+    for index in marked:
+        ckpt.mark(index)
+    pages = {(4096 + (i >> 3)) // mmap.PAGESIZE for i in marked}
+    ckpt.sync()
+    assert sum(writes) <= len(pages) * mmap.PAGESIZE < size // 8
+    writes.clear()
+    ckpt.sync()
+    assert writes == []
+    ckpt.close()
+    again = Checkpoint(path, size, PARAMS, resume=True)
+    assert again.done == len(set(marked)) and all(i in again for i in marked)
+    again.close()
+
+
+def test_resume_refuses_another_scan(tmp_path):
+    path = str(tmp_path / "scan.ckpt")
+    Checkpoint(path, 100, PARAMS).close()
+    with pytest.raises(CheckpointMismatch):
+        Checkpoint(path, 100, dict(PARAMS, ports="other"), resume=True)
+    with pytest.raises(CheckpointMismatch):
+        Checkpoint(path, 101, PARAMS, resume=True)
+    with pytest.raises(FileNotFoundError):
+        Checkpoint(str(tmp_path / "missing.ckpt"), 100, PARAMS, resume=True)
+
+
+def test_remove_deletes_the_file(tmp_path):
+    path = tmp_path / "scan.ckpt"
+    ckpt = Checkpoint(str(path), 10, PARAMS)
+    ckpt.remove()
+    assert not path.exists()
+    ckpt.mark(1)  # late verdicts after close are ignored
+
+
+def test_scheduler_skips_probes_already_done(tmp_path):
+    async def go():
+        servers = [await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0) for _ in range(2)]
+        open_ports = sorted(s.sockets[0].getsockname()[1] for s in servers)
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            closed = s.getsockname()[1]
+        ports = PortSpace.parse(",".join(map(str, open_ports + [closed])))
+        path = str(tmp_path / "scan.ckpt")
+        first = Checkpoint(path, ports.size, PARAMS)
+        first.mark(list(ports).index(open_ports[0]))  # finished before the interrupt
+        first.close()
+        seen = []
+        resumed = Checkpoint(path, ports.size, PARAMS, resume=True)
+        found = await ScanScheduler(TargetSpace.parse("127.0.0.1"), ports, concurrency=4, timeout=0.5,
+                                    checkpoint=resumed, on_result=lambda host, port, state: seen.append(port),
+                                    show_progress=False).run()
+        resumed.close()
+        for s in servers:
+            s.close()
+        return open_ports, closed, found, seen, Checkpoint(path, ports.size, PARAMS, resume=True).done
+
+    open_ports, closed, found, seen, done = asyncio.run(go())
+    assert sorted(seen) == sorted([open_ports[1], closed])
+    assert found == {"127.0.0.1": [open_ports[1]]}
+    assert done == 3
@@ -0,0 +1,141 @@
+import asyncio
+import socket
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from cluster import Coordinator, Worker, is_loopback, make_shards
+from targets import PortSpace, TargetSpace
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_make_shards_cover_the_space_exactly():
+    targets, ports = TargetSpace.parse("10.0.0.1-10"), PortSpace.parse("1-100")
+    shards = make_shards(targets, ports, hosts_per_shard=4, ports_per_shard=30)
+    assert len(shards) == 3 * 4
+    assert sum(s["size"] for s in shards) == 1000
+    pairs = {(h, p) for s in shards for h in TargetSpace.parse(s["targets"]) for p in PortSpace.parse(s["ports"])}
+    assert len(pairs) == 1000
+
+
+@pytest.mark.parametrize("host, expected", [
+    ("127.0.0.1", True), ("localhost", True), ("[::1]", True), ("::1", True),
+    ("0.0.0.0", False), ("", False), ("10.0.0.5", False), ("scanner.example", False),
+])
+def test_is_loopback(host, expected):
+    assert is_loopback(host) is expected
+
+
+def with_client(coordinator, body):
+    async def go():
+        async with TestClient(TestServer(coordinator.app)) as client:
+            return await body(client)
+    return asyncio.run(go())
+
+
+def test_requests_without_the_token_are_refused():
+    coordinator = Coordinator(make_shards(TargetSpace.parse("10.0.0.1"), PortSpace.parse("80")), token="s3cret")
+
+    async def body(client):
+        anonymous = await client.post("/lease", json={"worker": "x"})
+        forged = await client.post("/results", json={"records": [{"type": "open", "host": "1.2.3.4", "port": 1}]},
+                                   headers={"X-Scan-Token": "guess"})
+        ok = await client.post("/lease", json={"worker": "w"}, headers={"X-Scan-Token": "s3cret"})
+        return anonymous.status, forged.status, ok.status
+    assert with_client(coordinator, body) == (403, 403, 200)
+    assert coordinator.found == {}
+
+
+def test_expired_lease_is_redispatched_and_results_deduplicated():
+    coordinator = Coordinator(make_shards(TargetSpace.parse("10.0.0.1"), PortSpace.parse("80")), lease=0.05)
+    record = {"records": [{"type": "open", "host": "10.0.0.1", "port": 80}]}
+
+    async def body(client):
+        first = await (await client.post("/lease", json={"worker": "slow"})).json()
+        waiting = await (await client.post("/lease", json={"worker": "fast"})).json()
+        await asyncio.sleep(0.1)
+        second = await (await client.post("/lease", json={"worker": "fast"})).json()
+        renew = await (await client.post("/renew", json={"worker": "slow", "shard": 0})).json()
+        for worker in ("slow", "fast"):
+            await client.post("/results", json=dict(record, worker=worker, shard=0))
+        done = await (await client.post("/complete", json={"worker": "slow", "shard": 0})).json()
+        final = await (await client.post("/lease", json={"worker": "fast"})).json()
+        return first, waiting, second, renew, done, final
+    first, waiting, second, renew, done, final = with_client(coordinator, body)
+    assert first["shard"]["id"] == 0 and "wait" in waiting
+    assert second["shard"]["id"] == 0 and coordinator.redispatched == 1
+    assert renew == {"ok": False}
+    assert done == {"ok": True} and final == {"done": True}
+    assert coordinator.found == {"10.0.0.1": [80]}
+
+
+def test_workers_on_localhost_scan_every_shard():
+    async def go():
+        servers = [await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0) for _ in range(3)]
+        open_ports = sorted(s.sockets[0].getsockname()[1] for s in servers)
+        ports = PortSpace.parse(",".join(map(str, open_ports + [free_port()])))
+        shards = make_shards(TargetSpace.parse("127.0.0.1"), ports, ports_per_shard=1)
+        opened = []
+        coordinator = Coordinator(shards, lease=1.0, token="t", options={"timeout": 0.5},
+                                  on_open=lambda host, port: opened.append(port))
+        port = free_port()
+        serving = asyncio.ensure_future(coordinator.serve("127.0.0.1", port, linger=1.0))
+        await asyncio.sleep(0.2)
+        workers = [Worker(f"http://127.0.0.1:{port}", f"w{i}", concurrency=4, token="t", flush_interval=0.05)
+                   for i in range(3)]
+        await asyncio.wait_for(asyncio.gather(*(w.run() for w in workers)), 20)
+        found = await asyncio.wait_for(serving, 5)
+        for s in servers:
+            s.close()
+        return open_ports, shards, found, opened, workers, coordinator
+    open_ports, shards, found, opened, workers, coordinator = asyncio.run(go())
+    assert found == {"127.0.0.1": open_ports}
+    assert sorted(opened) == open_ports
+    assert sum(w.shards_done for w in workers) == len(shards) == 4
+    assert coordinator.progress == (4, 4)
+    assert set(coordinator.banners["127.0.0.1"]) == set(open_ports)
+
+
+def test_a_failing_scan_releases_the_shard_and_the_worker_carries_on(monkeypatch):
+    import cluster
+    from scanner_async import ScanScheduler
+
+    class BrokenScheduler(ScanScheduler):
+        async def run(self):
+            raise OSError("backend exploded")
+
+    coordinator = Coordinator(make_shards(TargetSpace.parse("127.0.0.1"), PortSpace.parse(str(free_port()))),
+                              options={"timeout": 0.5})
+
+    async def body(client):
+        url = str(client.make_url("/")).rstrip("/")
+        worker = Worker(url, "w", concurrency=4, retry_delay=0.01)
+        monkeypatch.setattr(cluster, "ScanScheduler", BrokenScheduler)
+        await asyncio.wait_for(worker.run(once=True), 10)
+        released = (list(coordinator._pending), dict(coordinator._leases))
+        monkeypatch.setattr(cluster, "ScanScheduler", ScanScheduler)
+        await asyncio.wait_for(worker.run(), 10)
+        return worker, released
+    worker, released = with_client(coordinator, body)
+    assert released == ([0], {})
+    assert worker.shards_failed == 1 and worker.shards_done == 1
+    assert coordinator.redispatched == 1 and coordinator.progress == (1, 1)
+
+
+def test_only_the_holder_can_release_a_shard():
+    coordinator = Coordinator(make_shards(TargetSpace.parse("10.0.0.1"), PortSpace.parse("80")))
+
+    async def body(client):
+        await client.post("/lease", json={"worker": "a"})
+        other = await (await client.post("/release", json={"worker": "b", "shard": 0})).json()
+        holder = await (await client.post("/release", json={"worker": "a", "shard": 0, "error": "x"})).json()
+        again = await (await client.post("/lease", json={"worker": "b"})).json()
+        return other, holder, again
+    other, holder, again = with_client(coordinator, body)
+    assert other == {"ok": False} and holder == {"ok": True}
+    assert again["shard"]["id"] == 0
@@ -0,0 +1,128 @@
+import asyncio
+import socket
+import time
+
+from aiohttp import web
+
+from cve_client import CVEClient, ResponseCache
+
+
+class StubAPI:
+    """A local stand-in for the CVE search API that counts its requests."""
+
+    def __init__(self, delay=0.05, throttle=0):
+        self.delay = delay
+        self.throttle = throttle
+        self.hits = {}
+
+    async def handle(self, request):
+        query = request.match_info["query"]
+        self.hits[query] = self.hits.get(query, 0) + 1
+        if self.throttle:
+            self.throttle -= 1
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        if query.startswith("broken"):
+            return web.Response(status=500)
+        await asyncio.sleep(self.delay)
+        return web.json_response({"results": [{"id": f"CVE-{query}-{i}"} for i in range(10)]})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/api/search/{query:.*}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        await web.SockSite(self.runner, sock).start()
+        port = sock.getsockname()[1]
+        self.base = f"http://127.0.0.1:{port}/api/search/"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_identical_concurrent_queries_share_one_request():
+    async def go():
+        async with StubAPI() as api:
+            async with CVEClient(api.base, limit=3) as client:
+                results = await asyncio.gather(*(client.search("openbsd/openssh") for _ in range(20)),
+                                               client.search("nginx/nginx"))
+            return api.hits, client.requests, results
+    hits, requests, results = run(go())
+    assert hits == {"openbsd/openssh": 1, "nginx/nginx": 1}
+    assert requests == 2
+    assert all(r == results[0] for r in results[:20])
+    assert [r["id"] for r in results[0]] == ["CVE-openbsd/openssh-0", "CVE-openbsd/openssh-1",
+                                             "CVE-openbsd/openssh-2"]
+
+
+def test_disk_cache_answers_repeat_scans(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def scan(api):
+        cache = ResponseCache(path)
+        try:
+            async with CVEClient(api.base, cache) as client:
+                return await client.search("apache/http_server"), client.requests
+        finally:
+            cache.close()
+
+    async def go():
+        async with StubAPI() as api:
+            first = await scan(api)
+            second = await scan(api)
+            return first, second, api.hits
+    (first, n1), (second, n2), hits = run(go())
+    assert first == second and len(first) == 10
+    assert (n1, n2) == (1, 0)
+    assert hits == {"apache/http_server": 1}
+
+
+def test_429_is_retried_after_retry_after():
+    async def go():
+        async with StubAPI(throttle=2) as api:
+            async with CVEClient(api.base, backoff=0.01) as client:
+                return await client.search("x/y"), api.hits
+    result, hits = run(go())
+    assert len(result) == 10
+    assert hits == {"x/y": 3}
+
+
+def test_failures_return_empty_and_are_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+
+    async def go():
+        async with StubAPI(throttle=100) as api:
+            async with CVEClient(api.base, cache, max_retries=1, backoff=0.01) as client:
+                throttled = await client.search("a/b")
+                broken = await client.search("broken/thing")
+            return throttled, broken
+    try:
+        assert run(go()) == ([], [])
+        assert cache.get("a/b") is None and cache.get("broken/thing") is None
+        assert run(CVEClient("http://unused/").search("")) == []
+    finally:
+        cache.close()
+
+
+def test_response_cache_ttl_and_lru_bound(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), ttl=60, max_entries=3)
+    try:
+        for key in "abc":
+            cache.put(key, [key])
+            time.sleep(0.01)
+        assert cache.get("a") == ["a"]      # a is now the most recently used
+        time.sleep(0.01)
+        cache.put("d", ["d"])
+        assert cache.get("b") is None       # least recently used, evicted
+        assert [cache.get(k) for k in "acd"] == [["a"], ["c"], ["d"]]
+        cache.ttl = 0
+        time.sleep(0.01)
+        assert cache.get("a") is None
+    finally:
+        cache.close()
@@ -0,0 +1,128 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from cve_index import CVEIndex, Match, _nvd_items, split_cpe, version_key
+from cve_lookup import CVELookup
+from fingerprint import Fingerprint
+
+
+def feed_11(items):
+    """A legacy NVD 1.1 feed document."""
+    return {"CVE_Items": [{
+        "cve": {"CVE_data_meta": {"ID": cid},
+                "description": {"description_data": [{"lang": "en", "value": summary}]}},
+        "publishedDate": "2021-01-01T00:00Z",
+        "lastModifiedDate": modified,
+        "impact": {"baseMetricV3": {"cvssV3": {"baseScore": score, "baseSeverity": "HIGH"}}},
+        "configurations": {"nodes": [{"operator": "OR", "children": [{"cpe_match": matches}]}]},
+    } for cid, summary, modified, score, matches in items]}
+
+
+def feed_20(items):
+    """An NVD API 2.0 response document."""
+    return {"vulnerabilities": [{"cve": {
+        "id": cid, "published": "2022-01-01T00:00:00", "lastModified": modified,
+        "descriptions": [{"lang": "en", "value": summary}],
+        "metrics": {"cvssMetricV31": [{"cvssData": {"baseScore": score, "baseSeverity": "CRITICAL"}}]},
+        "configurations": [{"nodes": [{"cpeMatch": matches}]}],
+    }} for cid, summary, modified, score, matches in items]}
+
+
+OPENSSH = [
+    ("CVE-2020-0001", "openssh before 8.3", "2021-02-01T00:00Z", 7.5,
+     [{"vulnerable": True, "cpe23Uri": "cpe:2.3:a:openbsd:openssh:*:*:*:*:*:*:*:*",
+       "versionEndExcluding": "8.3"}]),
+    ("CVE-2020-0002", "openssh 8.2p1 exactly", "2021-02-01T00:00Z", 5.0,
+     [{"vulnerable": True, "cpe23Uri": "cpe:2.3:a:openbsd:openssh:8.2:p1:*:*:*:*:*:*"}]),
+    ("CVE-2020-0003", "openssh 7.0 to 7.9", "2021-02-01T00:00Z", 9.8,
+     [{"vulnerable": True, "cpe23Uri": "cpe:2.3:a:openbsd:openssh:*:*:*:*:*:*:*:*",
+       "versionStartIncluding": "7.0", "versionEndIncluding": "7.9"}]),
+    ("CVE-2020-0004", "platform only", "2021-02-01T00:00Z", 4.0,
+     [{"vulnerable": False, "cpe23Uri": "cpe:2.3:a:openbsd:openssh:*:*:*:*:*:*:*:*"}]),
+]
+
+
+def _items(doc):
+    return list(_nvd_items(doc))
+
+
+@pytest.fixture
+def index(tmp_path):
+    feed = tmp_path / "nvdcve-1.1-2020.json.gz"
+    with gzip.open(feed, "wt", encoding="utf-8") as f:
+        json.dump(feed_11(OPENSSH), f)
+    api = tmp_path / "api.json"
+    api.write_text(json.dumps(feed_20([
+        ("CVE-2022-1000", "nginx resolver", "2022-03-01T00:00:00", 9.1,
+         [{"vulnerable": True, "criteria": "cpe:2.3:a:f5:nginx:*:*:*:*:*:*:*:*",
+           "versionStartIncluding": "0.6.18", "versionEndExcluding": "1.20.1"}]),
+    ])))
+    with CVEIndex(str(tmp_path / "cve.db")) as idx:
+        assert idx.import_feed(str(feed)) == (4, 0)
+        assert idx.import_feed(str(api)) == (1, 0)
+        yield idx
+
+
+@pytest.mark.parametrize("older, newer", [
+    ("8.2", "8.2p1"), ("8.2rc1", "8.2"), ("1.9", "1.10"), ("1.2.3", "1.2.10"), ("2.0b1", "2.0"),
+])
+def test_version_key_ordering(older, newer):
+    assert version_key(older) < version_key(newer)
+
+
+def test_split_cpe_formats():
+    assert split_cpe("cpe:2.3:a:openbsd:openssh:8.2:p1:*:*:*:*:*:*")[3:7] == ["openbsd", "openssh", "8.2", "p1"]
+    assert split_cpe("cpe:/a:nginx:nginx:1.18.0")[3:6] == ["nginx", "nginx", "1.18.0"]
+
+
+def test_match_ranges():
+    m = Match("X", "*", "1.0", None, None, "2.0")
+    assert m.applies("1.0") and m.applies("1.9.9") and not m.applies("2.0") and not m.applies("0.9")
+    assert not m.applies("")
+    assert Match("X", "*", None, None, None, None).applies("")
+    exact = Match("X", "1.2", None, None, None, None)
+    assert exact.applies("1.2") and not exact.applies("1.2.1")
+
+
+def test_lookup_by_version_range(index):
+    ids = lambda rows: [r["id"] for r in rows]
+    assert ids(index.lookup("openbsd", "openssh", "8.2p1")) == ["CVE-2020-0001", "CVE-2020-0002"]
+    assert ids(index.lookup("openbsd", "openssh", "7.4")) == ["CVE-2020-0003", "CVE-2020-0001"]
+    assert ids(index.lookup("openbsd", "openssh", "9.0")) == []
+    assert ids(index.lookup("openbsd", "openssh", "7.4", limit=1)) == ["CVE-2020-0003"]
+    # Without a version only "every version" entries would be certain; there are none.
+    assert index.lookup("openbsd", "openssh", "") == []
+
+
+def test_lookup_falls_back_to_any_vendor(index):
+    rows = index.lookup("nginx", "nginx", "1.18.0")
+    assert [r["id"] for r in rows] == ["CVE-2022-1000"]
+    assert rows[0]["cvss"] == 9.1 and rows[0]["severity"] == "CRITICAL"
+    assert index.lookup("nginx", "nginx", "1.21.0") == []
+
+
+def test_incremental_import_skips_unchanged_and_replaces_modified(index):
+    assert index.import_items(_items(feed_11(OPENSSH))) == (0, 4)
+    changed = [("CVE-2020-0002", "now 8.1 only", "2021-06-01T00:00Z", 5.0,
+                [{"vulnerable": True, "cpe23Uri": "cpe:2.3:a:openbsd:openssh:8.1:*:*:*:*:*:*:*"}])]
+    assert index.import_items(_items(feed_11(changed))) == (1, 0)
+    assert [r["id"] for r in index.lookup("openbsd", "openssh", "8.2p1")] == ["CVE-2020-0001"]
+    assert index.stats()["cves"] == 5
+
+
+def test_cve_lookup_uses_offline_index(index):
+    ssh = Fingerprint("ssh", "OpenSSH", "8.2p1", cpe="cpe:/a:openbsd:openssh:8.2p1")
+    with CVELookup(index.path, cache=None) as lookup:
+        results = asyncio.run(lookup.check_services_async({22: "SSH-2.0-OpenSSH_8.2p1", 80: ""}, {22: ssh}))
+    assert [r["id"] for r in results[22]] == ["CVE-2020-0001", "CVE-2020-0002"]
+    assert results[80] == []
+
+
+def test_cve_lookup_rejects_missing_index(tmp_path):
+    path = tmp_path / "nope.db"
+    with pytest.raises(FileNotFoundError):
+        CVELookup(str(path))
+    assert not path.exists()
@@ -0,0 +1,69 @@
+import asyncio
+import socket
+
+from delta import TOP_PORTS, DeltaScheduler, rank_ports, reuse_enrichment
+from history import banner_hash
+from scanner_async import CLOSED, OPEN
+
+
+def plan(scheduler):
+    probes, total = scheduler._plan()
+    return list(probes), total
+
+
+def test_rank_ports_prefers_history_then_top_rank_then_number():
+    assert rank_ports([9999, 22, 80, 8000, 1], {}) == [80, 22, 8000, 1, 9999]
+    assert rank_ports([9999, 22, 80], {9999: 3, 22: 1}) == [9999, 22, 80]
+    assert TOP_PORTS[0] == 80
+
+
+def test_known_open_first_then_the_sweep_without_them():
+    targets, ports = ["10.0.0.1", "10.0.0.2"], [22, 80, 5000]
+    scheduler = DeltaScheduler(targets, ports, known_open=[("10.0.0.2", 5000), ("10.0.0.9", 22), ("10.0.0.1", 1)],
+                               port_counts={22: 2}, show_progress=False)
+    assert scheduler.known_open == [("10.0.0.2", 5000)]
+    probes, total = plan(scheduler)
+    assert probes == [("10.0.0.2", 5000),
+                      ("10.0.0.1", 22), ("10.0.0.2", 22), ("10.0.0.1", 80), ("10.0.0.2", 80), ("10.0.0.1", 5000)]
+    assert total == len(probes)
+
+
+def test_shards_split_the_delta_plan():
+    targets, ports = ["10.0.0.1", "10.0.0.2", "10.0.0.3"], list(range(20, 30))
+    known = [("10.0.0.3", 25), ("10.0.0.1", 29)]
+    whole, _ = plan(DeltaScheduler(targets, ports, known_open=known, show_progress=False))
+    parts = [plan(DeltaScheduler(targets, ports, known_open=known, shard=(k, 3), show_progress=False))
+             for k in range(3)]
+    assert sorted(p for probes, _ in parts for p in probes) == sorted(whole)
+    assert [total for _, total in parts] == [len(probes) for probes, _ in parts]
+
+
+def test_delta_scan_finds_the_known_port_first():
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        closed = s.getsockname()[1]
+    order = []
+
+    async def go():
+        scheduler = DeltaScheduler(["127.0.0.1"], sorted([port, closed]), known_open=[("127.0.0.1", port)],
+                                   concurrency=1, timeout=0.5, show_progress=False,
+                                   on_result=lambda host, p, state: order.append((p, state)))
+        return await scheduler.run()
+    try:
+        found = asyncio.run(go())
+    finally:
+        server.close()
+    assert found == {"127.0.0.1": [port]}
+    assert order == [(port, OPEN), (closed, CLOSED)]
+
+
+def test_reuse_enrichment_only_for_an_unchanged_banner():
+    banner = "SSH-2.0-OpenSSH_8.2p1"
+    prev = {"banner_hash": banner_hash(banner), "cves": [{"id": "CVE-2020-0001"}], "explanation": "old"}
+    previous = {("10.0.0.1", 22): prev}
+    assert reuse_enrichment(previous, "10.0.0.1", 22, banner) is prev
+    assert reuse_enrichment(previous, "10.0.0.1", 22, "SSH-2.0-OpenSSH_9.0") is None
+    assert reuse_enrichment(previous, "10.0.0.1", 22, "") is None
+    assert reuse_enrichment(previous, "10.0.0.2", 22, banner) is None
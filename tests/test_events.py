@@ -0,0 +1,123 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from cve_index import CVEIndex
+from events import (Banner, EventBus, JSONLines, LazyConsole, PhaseDone, PortOpen, Progress, ScanDone,
+                    ScanStarted, to_dict)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_bus_fans_out_to_subscribers():
+    bus, seen, other = EventBus(), [], []
+    bus.subscribe(seen.append)
+    sub = bus.subscribe(other.append)
+    bus.emit(PortOpen("10.0.0.1", 22))
+    bus.unsubscribe(sub)
+    bus.emit(ScanDone("r.json", 1))
+    assert [e.kind for e in seen] == ["port_open", "scan_done"]
+    assert other == [PortOpen("10.0.0.1", 22)]
+    assert to_dict(seen[0]) == {"type": "port_open", "host": "10.0.0.1", "port": 22}
+
+
+def test_jsonl_subscriber_can_drop_progress():
+    out = io.StringIO()
+    sink = JSONLines(out, progress=False)
+    for event in (ScanStarted("t", 10), Progress(5, 10), Banner("h", 22, "SSH-2.0")):
+        sink(event)
+    assert [json.loads(line)["type"] for line in out.getvalue().splitlines()] == ["scan_started", "banner"]
+
+
+def test_run_yields_events_and_reraises_the_scan_error():
+    bus = EventBus()
+
+    async def scan(fail):
+        bus.emit(ScanStarted("t", 1))
+        await asyncio.sleep(0)
+        if fail:
+            raise RuntimeError("boom")
+        bus.emit(ScanDone("r.json", 0))
+
+    async def collect(fail):
+        return [event.kind async for event in bus.run(scan(fail))]
+
+    assert asyncio.run(collect(False)) == ["scan_started", "scan_done"]
+    with pytest.raises(RuntimeError):
+        asyncio.run(collect(True))
+    assert bus._subscribers == []
+
+
+def test_quiet_lazy_console_drops_output():
+    console = LazyConsole()
+    console.quiet = True
+    console.print("nothing")
+    assert console._console is None
+
+
+@pytest.fixture
+def banner_port():
+    """A local server that greets like OpenSSH, served from a thread while a test scans it."""
+    import socket
+    import threading
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    stop = threading.Event()
+
+    def serve():
+        server.settimeout(0.1)
+        while not stop.is_set():
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                continue
+            with conn:
+                conn.sendall(b"SSH-2.0-OpenSSH_8.2p1\r\n")
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield server.getsockname()[1]
+    stop.set()
+    thread.join()
+    server.close()
+
+
+@pytest.fixture
+def empty_index(tmp_path):
+    path = str(tmp_path / "cve.db")
+    CVEIndex(path).close()
+    return path
+
+
+def test_scan_events_streams_a_whole_scan(banner_port, empty_index, tmp_path, monkeypatch):
+    import main
+    monkeypatch.setattr(main.console, "quiet", True)
+    save = str(tmp_path / "report.json")
+
+    async def go():
+        return [event async for event in main.scan_events("127.0.0.1", [banner_port], 10, 0.5, save,
+                                                           cve_db=empty_index, history=None)]
+    events = asyncio.run(go())
+    kinds = [e.kind for e in events]
+    assert kinds[0] == "scan_started" and kinds[-1] == "scan_done"
+    assert PortOpen("127.0.0.1", banner_port) in events
+    assert Banner("127.0.0.1", banner_port, "SSH-2.0-OpenSSH_8.2p1") in events
+    assert {e.phase for e in events if isinstance(e, PhaseDone)} >= {"scan", "cve", "report"}
+    assert events[-1] == ScanDone(save, 1)
+    assert os.path.exists(save)
+
+
+def test_jsonl_cli_writes_only_json_lines(banner_port, empty_index, tmp_path):
+    proc = subprocess.run([sys.executable, "main.py", "scan", "--target", "127.0.0.1", "--ports", str(banner_port),
+                           "--timeout", "0.5", "--jsonl", "--no-history", "--no-checkpoint",
+                           "--cve-db", empty_index, "--save", str(tmp_path / "report.json")],
+                          cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    records = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert records[0]["type"] == "scan_started" and records[-1]["type"] == "scan_done"
+    assert {"type": "port_open", "host": "127.0.0.1", "port": banner_port} in records
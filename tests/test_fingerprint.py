@@ -0,0 +1,101 @@
+import pytest
+
+from fingerprint import ProbeDB, _AhoCorasick, _leading_literal, default_db
+
+BANNERS = [
+    b"SSH-2.0-OpenSSH_8.2p1 Ubuntu-4ubuntu0.5\r\n",
+    b"SSH-2.0-dropbear_2020.81\r\n",
+    b"SSH-1.99-SomethingElse\r\n",
+    b"220 (vsFTPd 3.0.3)\r\n",
+    b"220 ProFTPD 1.3.5 Server (Debian)\r\n",
+    b"220 mail.example.test ESMTP Postfix (Ubuntu)\r\n",
+    b"220 mx.example.test ESMTP Exim 4.94 Tue, 1 Jan 2030\r\n",
+    b"+OK Dovecot ready.\r\n",
+    b"HTTP/1.1 200 OK\r\nDate: x\r\nServer: nginx/1.18.0\r\n\r\n",
+    b"HTTP/1.0 404 Not Found\r\nServer: Apache/2.4.41 (Ubuntu)\r\n\r\n",
+    b"HTTP/1.1 200 OK\r\nserver: Werkzeug/2.0.1 Python/3.8.10\r\n\r\n",
+    b"RFB 003.008\n",
+    b"nothing recognisable here",
+    b"",
+]
+
+
+@pytest.mark.parametrize("pattern, literal", [
+    (rb"^SSH-([\d.]+)-OpenSSH_", b"ssh-"),
+    (rb"^220[ -]ProFTPD", b"220"),
+    (rb"^HTTP/1\.[01] ", b"http/1."),
+    (rb"^\+OK Dovecot", b"+ok dovecot"),
+    (rb"^ab?c", b"a"),
+    (rb"^ab*c", b"a"),
+    (rb"^ab+c", b"ab"),
+    (rb"^.\0\0\0", b""),
+    (rb"^(?:foo|bar)", b""),
+    (rb"foo|bar", b""),
+    (rb"^\x16\x03", b"\x16\x03"),
+    (rb"^\d+ ok", b""),
+])
+def test_leading_literal(pattern, literal):
+    assert _leading_literal(pattern) == literal
+
+
+def test_aho_corasick_reports_every_literal_found():
+    matcher = _AhoCorasick({b"he": [1], b"she": [2], b"his": [3], b"hers": [4]})
+    assert matcher.search(b"ushers") == {1, 2, 4}
+    assert matcher.search(b"this") == {3}
+    assert matcher.search(b"xyz") == set()
+
+
+def brute_force(db, data, probe=None):
+    """What match() must return: every rule tried in priority order, no prefilter."""
+    ordered = sorted(range(len(db.rules)), key=lambda i: (db.rules[i].probe != probe if probe else False,
+                                                         db.rules[i].soft, db.rules[i].order))
+    for idx in ordered:
+        fp = db.rules[idx].apply(data)
+        if fp is not None:
+            return fp
+    return None
+
+
+@pytest.mark.parametrize("banner", BANNERS)
+def test_prefilter_agrees_with_trying_every_rule(banner):
+    db = default_db()
+    for probe in (None, "NULL", "GetRequest"):
+        expected = brute_force(db, banner, probe) if banner else None
+        assert db.match(banner, probe) == expected
+
+
+def test_match_extracts_product_version_and_cpe():
+    fp = default_db().match("SSH-2.0-OpenSSH_8.2p1 Ubuntu-4ubuntu0.5\r\n")
+    assert (fp.service, fp.product, fp.version) == ("ssh", "OpenSSH", "8.2p1")
+    assert fp.cpe == "cpe:/a:openbsd:openssh:8.2p1"
+    assert fp.vendor == "openbsd" and fp.cpe_product == "openssh"
+    assert not fp.soft
+
+
+def test_hard_match_beats_softmatch_and_softmatch_is_fallback():
+    db = default_db()
+    assert db.match(b"SSH-2.0-dropbear_2020.81").product == "Dropbear sshd"
+    soft = db.match(b"SSH-2.0-UnknownServer")
+    assert soft.service == "ssh" and soft.soft
+
+
+def test_case_insensitive_rule_found_through_lowercased_prefilter():
+    db = ProbeDB.parse([
+        "Probe TCP NULL q||",
+        "match demo m|^HELLO ([\\d.]+)|i p/Demo/ v/$1/",
+    ])
+    assert db.match(b"hello 1.2").version == "1.2"
+    assert db.match(b"HeLLo 3.4").version == "3.4"
+    assert db.match(b"goodbye") is None
+
+
+def test_port_hints():
+    db = default_db()
+    assert db.greets(22) and not db.client_first(22)
+    assert db.client_first(80) and not db.greets(80)
+    assert db.active_probe(8080).name == "GetRequest"
+
+
+def test_parse_errors_name_the_line():
+    with pytest.raises(ValueError, match="line 2"):
+        ProbeDB.parse(["Probe TCP NULL q||", "match x m|unclosed(|"])
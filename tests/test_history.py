@@ -0,0 +1,97 @@
+import pytest
+
+from history import HistoryStore, banner_hash
+
+
+def scan(target, findings):
+    """Records of one scan: ``findings`` maps (host, port) to (banner, service, version, cves)."""
+    yield {"type": "meta", "target": target, "timestamp": "2030-01-01T00:00:00Z"}
+    for host, port in findings:
+        yield {"type": "open", "key": f"{host}:{port}", "host": host, "port": port}
+    for (host, port), (banner, service, version, cves) in findings.items():
+        yield {"type": "service", "key": f"{host}:{port}", "host": host, "port": port, "banner": banner,
+               "fingerprint": {"service": service, "product": service.upper(), "version": version},
+               "cves": cves, "explanation": f"about {host}:{port}"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    with HistoryStore(str(tmp_path / "history.db"), batch=3) as s:
+        yield s
+
+
+FIRST = {
+    ("10.0.0.1", 22): ("SSH-2.0-OpenSSH_8.2p1", "ssh", "8.2p1", [{"id": "CVE-A", "cvss": 7.5}]),
+    ("10.0.0.1", 80): ("HTTP/1.1 200 OK", "http", "1.18.0", []),
+    ("10.0.0.2", 21): ("220 ProFTPD 1.3.5", "ftp", "1.3.5", []),
+}
+SECOND = {
+    ("10.0.0.1", 22): ("SSH-2.0-OpenSSH_9.6p1", "ssh", "9.6p1", []),
+    ("10.0.0.1", 80): ("HTTP/1.1 200 OK", "http", "1.18.0", []),
+    ("10.0.0.3", 443): ("", "https", "", []),
+}
+
+
+def test_record_counts_findings_across_batches(store):
+    scan_id = store.record(scan("10.0.0.0/24", FIRST))
+    assert store.scans() == [{"id": scan_id, "target": "10.0.0.0/24", "started": "2030-01-01T00:00:00Z",
+                              "findings": 3}]
+
+
+def test_diff_reports_opened_closed_and_changed(store):
+    old = store.record(scan("10.0.0.0/24", FIRST))
+    new = store.record(scan("10.0.0.0/24", SECOND))
+    assert store.latest_pair("10.0.0.0/24") == (old, new)
+    changes = store.diff(old, new)
+    assert changes["opened"] == [{"host": "10.0.0.3", "port": 443}]
+    assert changes["closed"] == [{"host": "10.0.0.2", "port": 21}]
+    assert changes["changed"] == [{"host": "10.0.0.1", "port": 22, "before": "ssh SSH 8.2p1",
+                                   "after": "ssh SSH 9.6p1"}]
+
+
+def test_diff_against_nothing_is_all_opened(store):
+    first = store.record(scan("t", FIRST))
+    assert store.latest_pair("t") == (None, first)
+    changes = store.diff(None, first)
+    assert len(changes["opened"]) == 3 and not changes["closed"] and not changes["changed"]
+
+
+def test_open_without_service_record_still_counts(store):
+    records = [{"type": "meta", "target": "h"}, {"type": "open", "key": 8080, "host": None, "port": None}]
+    scan_id = store.record(records)
+    assert store.diff(None, scan_id)["opened"] == [{"host": "h", "port": 8080}]
+
+
+def test_hosts_with_port_latest_and_ever(store):
+    store.record(scan("a", FIRST))
+    store.record(scan("a", SECOND))
+    store.record(scan("b", {("10.9.0.1", 21): ("220 x", "ftp", "", [])}))
+    assert [r["host"] for r in store.hosts_with_port(21)] == ["10.9.0.1"]
+    assert [r["host"] for r in store.hosts_with_port(21, latest=False)] == ["10.0.0.2", "10.9.0.1"]
+
+
+def test_previous_keeps_enrichment_for_reuse(store):
+    store.record(scan("a", FIRST))
+    prev = store.previous("a")
+    assert prev[("10.0.0.1", 22)] == {"banner_hash": banner_hash("SSH-2.0-OpenSSH_8.2p1"),
+                                      "cves": [{"id": "CVE-A", "cvss": 7.5}],
+                                      "explanation": "about 10.0.0.1:22"}
+    assert store.previous("unknown") == {}
+
+
+def test_port_counts(store):
+    store.record(scan("a", FIRST))
+    store.record(scan("b", SECOND))
+    assert store.port_counts() == {21: 1, 22: 2, 80: 2, 443: 1}
+    assert store.port_counts("b") == {22: 1, 80: 1, 443: 1}
+
+
+def test_stream_import(store, tmp_path):
+    from reporter import ResultSink
+    path = str(tmp_path / "scan.ndjson")
+    with ResultSink(path) as sink:
+        for rec in scan("s", FIRST):
+            sink.write(rec)
+    scan_id = store.record_stream(path)
+    assert store.scans("s")[0]["id"] == scan_id
+    assert store._db.execute("SELECT COUNT(*) FROM cve_hits WHERE scan_id = ?", (scan_id,)).fetchone()[0] == 1
@@ -0,0 +1,68 @@
+import asyncio
+import socket
+import struct
+import time
+
+import pytest
+
+import network_scanner
+from liveness import LivenessEngine, TcpPinger, _checksum, _Pacer, icmp_available
+
+
+def test_checksum_verifies_to_zero():
+    header = struct.pack("!BBHHH", 8, 0, 0, 0, 1) + b"invisiscan"
+    packet = struct.pack("!BBHHH", 8, 0, _checksum(header), 0, 1) + b"invisiscan"
+    assert _checksum(packet) == 0
+    assert _checksum(b"\x01") == _checksum(b"\x01\x00")
+
+
+def test_pacer_spaces_out_sends():
+    async def go(rate, n):
+        pacer = _Pacer(rate)
+        start = time.monotonic()
+        for _ in range(n):
+            await pacer.wait()
+        return time.monotonic() - start
+    assert asyncio.run(go(100, 11)) >= 0.09
+    assert asyncio.run(go(0, 1000)) < 0.05
+
+
+def test_a_refused_or_accepted_connect_proves_the_host_up(closed_port):
+    server = socket.create_server(("127.0.0.1", 0))
+    try:
+        for port in (server.getsockname()[1], closed_port):
+            assert asyncio.run(TcpPinger([port], timeout_ms=500).ping("127.0.0.1"))
+    finally:
+        server.close()
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        LivenessEngine("arp")
+
+
+def test_tcp_sweep_reports_each_live_host_as_it_answers(closed_port):
+    seen = []
+
+    async def on_alive(ip):
+        seen.append(ip)
+
+    engine = LivenessEngine("tcp", timeout_ms=500, rate=0, concurrency=4, tcp_ports=[closed_port])
+    alive = asyncio.run(engine.sweep(iter(["127.0.0.3", "127.0.0.1", "127.0.0.2"]), on_alive))
+    assert alive == ["127.0.0.1", "127.0.0.2", "127.0.0.3"]
+    assert sorted(seen) == alive
+
+
+@pytest.mark.skipif(not icmp_available(), reason="unprivileged ICMP ping sockets are not permitted")
+def test_icmp_sweep_of_loopback():
+    engine = LivenessEngine("auto", timeout_ms=500, rate=0)
+    assert engine.method == "icmp"
+    assert engine.sweep_sync(["127.0.0.1"]) == ["127.0.0.1"]
+
+
+def test_discover_network_in_process(monkeypatch, closed_port):
+    monkeypatch.setattr(network_scanner, "_neighbors", network_scanner.NeighborCache(source=dict))
+    hosts = network_scanner.discover_network("127.0.0.1/30", timeout_ms=500, method="tcp",
+                                             tcp_ports=[closed_port], rate=0)
+    assert [h["ip"] for h in hosts] == ["127.0.0.1", "127.0.0.2"]
+    assert all(h["mac"] == "" and h["vendor"] == "" for h in hosts)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import socket
+
+from metrics import Histogram, Metrics, metrics_paths
+from scanner_async import ScanScheduler
+from targets import PortSpace, TargetSpace
+from webapp import app as webapp
+
+
+def test_histogram_buckets_and_quantiles():
+    hist = Histogram((0.01, 0.1, 1.0))
+    for value in (0.005, 0.01, 0.05, 0.05, 0.5, 3.0):
+        hist.observe(value)
+    assert hist.counts == [2, 2, 1, 1]
+    assert (hist.quantile(0.3), hist.quantile(0.5), hist.quantile(0.8)) == (0.01, 0.1, 1.0)
+    assert hist.quantile(1.0) == float("inf")
+    assert Histogram().quantile(0.5) is None
+
+
+def test_snapshot_samples_gauges_and_times_phases():
+    m = Metrics()
+    queue = [1, 2, 3]
+    m.gauge("queued", lambda: len(queue))
+    m.counter("handled", lambda: 10, kind="x")
+    m.inc("handled", 2, kind="x")
+    with m.phase("scan"):
+        pass
+    m.begin("report")
+    queue.pop()
+    snap = m.snapshot()
+    assert snap["gauges"] == [{"name": "queued", "labels": {}, "value": 2.0}]
+    assert snap["counters"] == [{"name": "handled", "labels": {"kind": "x"}, "value": 12.0}]
+    assert set(snap["phases"]) == {"scan", "report"} and snap["running"] == ["report"]
+
+
+def test_prometheus_exposition():
+    m = Metrics()
+    m.inc("probes", state="open")
+    m.observe("connect_seconds", 0.003, state="open")
+    m.observe("connect_seconds", 20.0, state="open")
+    text = m.prometheus()
+    assert '# TYPE invisiscan_probes counter\ninvisiscan_probes{state="open"} 1' in text
+    assert 'invisiscan_connect_seconds_bucket{state="open",le="0.005"} 1' in text
+    assert 'invisiscan_connect_seconds_bucket{state="open",le="+Inf"} 2' in text
+    assert 'invisiscan_connect_seconds_count{state="open"} 2' in text
+    assert text.count("# TYPE invisiscan_connect_seconds histogram") == 1
+
+
+def test_scheduler_reports_outcomes_and_publishes(tmp_path):
+    async def go():
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        opened = server.sockets[0].getsockname()[1]
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            closed = s.getsockname()[1]
+        m = Metrics()
+        m.start(str(tmp_path / "report.json"), interval=0.05)
+        with m.phase("scan"):
+            await ScanScheduler(TargetSpace.parse("127.0.0.1"), PortSpace.parse(f"{opened},{closed}"),
+                                concurrency=4, timeout=0.5, metrics=m, show_progress=False).run()
+        m.stop()
+        server.close()
+        return m
+    m = asyncio.run(go())
+    json_path, prom_path = metrics_paths(str(tmp_path / "report.json"))
+    assert json_path == str(tmp_path / "scan_metrics.json")
+    snap = json.loads(open(json_path).read())
+    assert "scan" in snap["phases"] and not snap["running"]
+    latencies = {h["labels"].get("outcome"): h["count"] for h in snap["histograms"]}
+    assert latencies.get("open") == 1 and latencies.get("closed") == 1
+    assert open(prom_path).read() == m.prometheus()
+
+
+def test_dashboard_serves_the_prometheus_file(tmp_path, monkeypatch):
+    prom = tmp_path / "scan_metrics.prom"
+    monkeypatch.setattr(webapp, "METRICS_FILE", str(prom))
+    client = webapp.app.test_client()
+    missing = client.get("/metrics").get_data(as_text=True)
+    assert missing.startswith("# no scan metrics") and "invisiscan_metrics_age_seconds -1" in missing
+    m = Metrics()
+    m.inc("probes", state="open")
+    prom.write_text(m.prometheus())
+    resp = client.get("/metrics")
+    assert resp.mimetype == "text/plain"
+    assert 'invisiscan_probes{state="open"} 1' in resp.get_data(as_text=True)
@@ -0,0 +1,92 @@
+import socket
+import struct
+import sys
+import time
+
+import pytest
+
+from neighbors import (_NDA_DST, _NDA_LLADDR, _NDMSG, _NUD_FAILED, _RTATTR, NeighborCache, OuiIndex,
+                       _parse_neigh, mac_vendor, read_netlink_neighbors, read_proc_arp)
+
+PROC_ARP = """IP address       HW type     Flags       HW address            Mask     Device
+192.168.1.1      0x1         0x2         00:50:56:C0:00:08     *        eth0
+192.168.1.7      0x1         0x0         00:00:00:00:00:00     *        eth0
+192.168.1.9      0x1         0x2         00:00:00:00:00:00     *        eth0
+"""
+
+
+def test_proc_arp_keeps_only_complete_entries(tmp_path):
+    path = tmp_path / "arp"
+    path.write_text(PROC_ARP)
+    assert read_proc_arp(str(path)) == {"192.168.1.1": "00:50:56:c0:00:08"}
+
+
+def attr(kind, value):
+    length = _RTATTR.size + len(value)
+    return _RTATTR.pack(length, kind) + value + b"\0" * (-length % 4)
+
+
+def neigh(family, address, mac, state=0x02):
+    return (_NDMSG.pack(family, 0, 0, 0, state, 0, 0)
+            + attr(_NDA_DST, socket.inet_pton(family, address)) + attr(_NDA_LLADDR, bytes.fromhex(mac)))
+
+
+@pytest.mark.parametrize("family, address", [(socket.AF_INET, "10.0.0.5"), (socket.AF_INET6, "fe80::1")])
+def test_netlink_neighbor_message_is_parsed(family, address):
+    mapping = {}
+    msg = neigh(family, address, "525400123456")
+    _parse_neigh(msg, 0, len(msg), mapping)
+    assert mapping == {address: "52:54:00:12:34:56"}
+
+
+def test_failed_neighbors_are_skipped():
+    mapping = {}
+    msg = neigh(socket.AF_INET, "10.0.0.5", "525400123456", state=_NUD_FAILED)
+    _parse_neigh(msg, 0, len(msg), mapping)
+    assert mapping == {}
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="rtnetlink is Linux only")
+def test_netlink_dump_returns_a_table():
+    try:
+        table = read_netlink_neighbors()
+    except OSError as e:
+        pytest.skip(f"rtnetlink unavailable: {e}")
+    assert all(len(mac) == 17 for mac in table.values())
+
+
+def test_cache_honours_ttl_and_keeps_aged_out_entries():
+    tables = iter([{"10.0.0.1": "aa"}, {"10.0.0.2": "bb"}])
+    cache = NeighborCache(ttl=60, source=lambda: next(tables))
+    assert cache.snapshot() == {"10.0.0.1": "aa"}
+    assert cache.get("10.0.0.2") == ""
+    assert cache.refresh(force=True) == {"10.0.0.1": "aa", "10.0.0.2": "bb"}
+    # A failing source leaves what was already learned.
+    assert cache.refresh(force=True) == {"10.0.0.1": "aa", "10.0.0.2": "bb"}
+
+
+def test_watch_refreshes_in_the_background():
+    calls = []
+    cache = NeighborCache(ttl=60, source=lambda: calls.append(1) or {f"10.0.0.{len(calls)}": "aa"})
+    with cache.watch(interval=0.01):
+        time.sleep(0.1)
+    assert len(calls) >= 3
+    assert len(cache.snapshot()) == len(calls)
+
+
+def test_oui_index_reads_both_layouts_and_prefers_the_longest_prefix():
+    index = OuiIndex()
+    for line in ("00-50-56   (hex)\t\tVMware, Inc.", "70:B3:D5\tIEEERegi\tIEEE Registration Authority",
+                 "70:B3:D5:12:30:00/36\tAcme\tAcme Sensors", "# comment", "garbage"):
+        index._add_line(line)
+    assert len(index) == 3
+    assert index.lookup("00:50:56:aa:bb:cc") == "VMware, Inc."
+    assert index.lookup("70-B3-D5-12-30-01") == "Acme Sensors"
+    assert index.lookup("70b3.d599.0000") == "IEEE Registration Authority"
+    assert index.lookup("02:00:00:00:00:01") == "(locally administered)"
+    assert index.lookup("not-a-mac") == ""
+
+
+def test_bundled_oui_file():
+    assert mac_vendor("52:54:00:12:34:56") == "QEMU/KVM virtual NIC"
+    assert mac_vendor("08:00:27:00:00:01") == "PCS Systemtechnik GmbH (VirtualBox)"
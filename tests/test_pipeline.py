@@ -0,0 +1,172 @@
+import asyncio
+import functools
+import gzip
+import json
+import socket
+import threading
+
+import pytest
+
+import ai_helper
+from cve_index import CVEIndex
+from events import EventBus, PortStates
+from pipeline import AssessPipeline
+from scanner_async import OPEN
+from test_ai_helper import CompletionServer
+from test_cve_client import StubAPI
+from test_cve_index import OPENSSH, feed_11
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(ai_helper, "USE_OPENAI", False)
+
+
+@pytest.fixture
+def index(tmp_path):
+    feed = tmp_path / "nvdcve.json.gz"
+    with gzip.open(feed, "wt", encoding="utf-8") as f:
+        json.dump(feed_11(OPENSSH), f)
+    path = str(tmp_path / "cve.db")
+    with CVEIndex(path) as idx:
+        idx.import_feed(str(feed))
+    return path
+
+
+@pytest.fixture
+def services():
+    """Two local listeners: one greets like OpenSSH 8.2p1, the other like ProFTPD."""
+    greetings = [b"SSH-2.0-OpenSSH_8.2p1\r\n", b"220 ProFTPD 1.3.5 Server\r\n"]
+    servers = [socket.create_server(("127.0.0.1", 0)) for _ in greetings]
+    stop = threading.Event()
+
+    def serve(server, greeting):
+        server.settimeout(0.1)
+        while not stop.is_set():
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                continue
+            with conn:
+                try:
+                    conn.sendall(greeting)
+                except OSError:
+                    # Liveness knocks reset the connection straight away.
+                    pass
+    threads = [threading.Thread(target=serve, args=pair, daemon=True) for pair in zip(servers, greetings)]
+    for t in threads:
+        t.start()
+    yield [s.getsockname()[1] for s in servers]
+    stop.set()
+    for t in threads:
+        t.join()
+    for s in servers:
+        s.close()
+
+
+@pytest.mark.parametrize("discover", [None, "tcp"])
+def test_every_stage_sees_every_open_port(services, index, discover, closed_port):
+    ssh, ftp = services
+    ports = sorted([ssh, ftp, closed_port])
+    seen = {"host": [], "open": [], "banner": {}, "service": {}}
+
+    async def go():
+        pipeline = AssessPipeline(
+            ["127.0.0.1"], ports, discover=discover, ping_ports=[ssh], timeout=0.5, cve_db=index,
+            grab_concurrency=2, enrich_workers=1, queue_size=1,
+            on_host=seen["host"].append, on_open=lambda h, p: seen["open"].append(p),
+            on_banner=lambda h, p, banner, fp: seen["banner"].__setitem__(p, banner),
+            on_service=lambda h, p, banner, fp, cves, expl: seen["service"].__setitem__(p, (fp, cves, expl)))
+        return pipeline, await asyncio.wait_for(pipeline.run(), 30)
+    pipeline, found = asyncio.run(go())
+    assert found == {"127.0.0.1": sorted([ssh, ftp])}
+    assert seen["host"] == pipeline.hosts_up == ["127.0.0.1"]
+    assert sorted(seen["open"]) == sorted([ssh, ftp])
+    assert seen["banner"] == {ssh: "SSH-2.0-OpenSSH_8.2p1", ftp: "220 ProFTPD 1.3.5 Server"}
+    fp, cves, explanation = seen["service"][ssh]
+    assert fp.product == "OpenSSH"
+    assert {c["id"] for c in cves} >= {"CVE-2020-0001", "CVE-2020-0002"} and explanation
+    assert seen["service"][ftp][1] == []
+    assert pipeline.stats[OPEN] == 2 and sum(pipeline.stats.values()) == 3
+
+
+def test_assess_writes_the_report(services, index, tmp_path, monkeypatch):
+    import main
+    monkeypatch.setattr(main.console, "quiet", True)
+    save = str(tmp_path / "report.json")
+    bus, seen = EventBus(), []
+    bus.subscribe(seen.append)
+    asyncio.run(main.run_assess(["127.0.0.1"], services, save, "127.0.0.1", cve_db=index, history=None,
+                                events=bus, discover=None, timeout=0.5))
+    report = json.loads(open(save).read())
+    keys = [f"127.0.0.1:{p}" for p in services]
+    assert sorted(report["open_ports"]) == sorted(keys)
+    assert report["banners"][keys[0]] == "SSH-2.0-OpenSSH_8.2p1"
+    assert report["cves"][keys[0]] and report["cves"][keys[1]] == []
+    assert report["port_states"] == {OPEN: 2}
+    assert PortStates({OPEN: 2}) in seen
+    assert [e.kind for e in seen][-1] == "scan_done"
+
+
+class CountingAPI(StubAPI):
+    """The stub CVE API, also counting the client connections it was asked over."""
+
+    def __init__(self):
+        super().__init__(delay=0)
+        self.connections = set()
+
+    async def handle(self, request):
+        self.connections.add(request.transport.get_extra_info("peername"))
+        return await super().handle(request)
+
+
+class CountingCompletions(CompletionServer):
+    def __init__(self):
+        super().__init__()
+        self.connections = set()
+
+    async def handle(self, request):
+        self.connections.add(request.transport.get_extra_info("peername"))
+        return await super().handle(request)
+
+
+def test_enrich_batches_share_one_cve_client_and_completion_session(services, tmp_path, monkeypatch):
+    import cve_lookup
+    monkeypatch.setattr(cve_lookup, "CVE_DB", str(tmp_path / "missing.db"))
+    monkeypatch.setattr(ai_helper, "USE_OPENAI", True)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    explained = {}
+
+    async def go(completions):
+        async with CountingAPI() as api:
+            monkeypatch.setattr(cve_lookup.CVELookup, "API_BASE", api.base)
+            monkeypatch.setattr(cve_lookup, "CVELookup", functools.partial(
+                cve_lookup.CVELookup, cache=str(tmp_path / "cve_cache.db")))
+            monkeypatch.setattr(ai_helper, "AIHelper", functools.partial(
+                ai_helper.AIHelper, cache=str(tmp_path / "ai_cache.db"), rate=0, api_base=completions.base))
+            pipeline = AssessPipeline(["127.0.0.1"], services, discover=None, timeout=0.5, enrich_workers=1,
+                                      enrich_batch=1,
+                                      on_service=lambda h, p, b, fp, cves, expl: explained.__setitem__(p, expl),
+                                      on_error=lambda stage, e: pytest.fail(f"{stage}: {e!r}"))
+            await asyncio.wait_for(pipeline.run(), 30)
+            return api
+    with CountingCompletions() as completions:
+        api = asyncio.run(go(completions))
+    assert sum(api.hits.values()) == 2 and len(api.connections) == 1
+    assert len(completions.prompts) == 2 and len(completions.connections) == 1
+    assert all(text.startswith("explained CVE-") for text in explained.values())
+
+
+def test_failed_enrich_batches_are_reported(services, index, monkeypatch):
+    import cve_lookup
+
+    async def broken(self, banners, fingerprints=None, client=None):
+        raise RuntimeError("index gone")
+    monkeypatch.setattr(cve_lookup.CVELookup, "check_services_async", broken)
+    errors, seen = [], {}
+    pipeline = AssessPipeline(["127.0.0.1"], services, discover=None, timeout=0.5, cve_db=index,
+                              on_service=lambda h, p, b, fp, cves, expl: seen.__setitem__(p, cves),
+                              on_error=lambda stage, e: errors.append((stage, str(e))))
+    asyncio.run(asyncio.wait_for(pipeline.run(), 30))
+    assert seen == dict.fromkeys(services, [])
+    assert errors and set(errors) == {("CVE lookup", "index gone")}
@@ -0,0 +1,59 @@
+import json
+import os
+
+from reporter import ResultSink, read_stream, render, stream_path
+
+
+def write_scan(path):
+    with ResultSink(path) as sink:
+        sink.meta("10.0.0.0/30")
+        sink.open_port("10.0.0.1:22", "10.0.0.1", 22)
+        sink.open_port("10.0.0.2:80", "10.0.0.2", 80)
+        sink.service("10.0.0.1:22", "SSH-2.0-OpenSSH_8.2p1", {"service": "ssh", "product": "OpenSSH"},
+                     [{"id": "CVE-1"}], "explained", host="10.0.0.1", port=22)
+        sink.service("10.0.0.2:80", "", None, [], "", host="10.0.0.2", port=80)
+        sink.metrics({"phases": {"scan": 1.5}})
+
+
+def test_stream_path():
+    assert stream_path("out/report.json") == os.path.join("out", "report.ndjson")
+
+
+def test_json_report_is_rendered_from_the_stream(tmp_path):
+    report = tmp_path / "report.json"
+    stream = stream_path(str(report))
+    write_scan(stream)
+    render(stream, str(report))
+    doc = json.loads(report.read_text())
+    assert doc["target"] == "10.0.0.0/30"
+    assert doc["open_ports"] == ["10.0.0.1:22", "10.0.0.2:80"]
+    assert doc["banners"] == {"10.0.0.1:22": "SSH-2.0-OpenSSH_8.2p1", "10.0.0.2:80": ""}
+    assert doc["fingerprints"] == {"10.0.0.1:22": {"service": "ssh", "product": "OpenSSH"}}
+    assert doc["cves"]["10.0.0.1:22"] == [{"id": "CVE-1"}]
+    assert doc["metrics"] == {"phases": {"scan": 1.5}}
+    # The dashboard reads the same file through report_visual.json.
+    assert json.loads((tmp_path / "report_visual.json").read_text()) == doc
+
+
+def test_markdown_and_html_reports(tmp_path):
+    stream = str(tmp_path / "scan.ndjson")
+    write_scan(stream)
+    render(stream, str(tmp_path / "scan.md"))
+    render(stream, str(tmp_path / "scan.html"))
+    md = (tmp_path / "scan.md").read_text()
+    assert "- 10.0.0.1:22" in md and "Service: ssh OpenSSH" in md and "scan: 1.50s" in md
+    assert "<li>10.0.0.2:80</li>" in (tmp_path / "scan.html").read_text()
+    pointer = json.loads((tmp_path / "report_visual.json").read_text())
+    assert pointer == {"pointer": os.path.abspath(stream)}
+
+
+def test_append_after_a_torn_line_keeps_earlier_records(tmp_path):
+    stream = str(tmp_path / "scan.ndjson")
+    write_scan(stream)
+    with open(stream, "a", encoding="utf-8") as f:
+        f.write('{"type":"open","key":"10.0.0')          # crash mid-write
+    with ResultSink(stream, append=True) as sink:
+        sink.open_port("10.0.0.3:443", "10.0.0.3", 443)
+    records = list(read_stream(stream))
+    assert [r["type"] for r in records] == ["meta", "open", "open", "service", "service", "metrics", "open"]
+    assert records[-1]["key"] == "10.0.0.3:443"
@@ -0,0 +1,141 @@
+import asyncio
+import socket
+
+import pytest
+
+from resolver import Resolver, expand_addresses, host_index, hostnames, literal, without_hosts
+from scanner_async import CLOSED, OPEN
+from targets import TargetSpace
+
+
+class FakeResolver(Resolver):
+    """Resolver over a fixed table, counting lookups and taking a moment over each."""
+
+    def __init__(self, table, **kwargs):
+        super().__init__(**kwargs)
+        self.table = table
+
+    async def _lookup(self, host):
+        self.lookups += 1
+        await asyncio.sleep(0.01)
+        if host not in self.table:
+            raise socket.gaierror(socket.EAI_NONAME, host)
+        return [(socket.AF_INET6 if ":" in a else socket.AF_INET, a) for a in self.table[host]]
+
+
+TABLE = {"web.test": ["10.0.0.5", "fd00::5"], "db.test": ["10.0.0.6"]}
+
+
+def test_literals_need_no_lookup():
+    assert literal("10.0.0.1") == (socket.AF_INET, "10.0.0.1")
+    assert literal("::1") == (socket.AF_INET6, "::1")
+    assert literal("web.test") is None
+    assert hostnames(["10.0.0.1", "web.test", "web.test"]) == ["web.test"]
+
+
+def test_concurrent_lookups_of_a_name_are_coalesced_and_cached():
+    async def go():
+        resolver = FakeResolver(TABLE)
+        first = await asyncio.gather(*(resolver.address("web.test") for _ in range(50)))
+        again = await resolver.resolve("web.test")
+        return resolver.lookups, set(first), again
+    lookups, first, again = asyncio.run(go())
+    assert lookups == 1
+    assert first == {(socket.AF_INET, "10.0.0.5")}
+    assert [a for _, a in again] == ["10.0.0.5", "fd00::5"]
+
+
+def test_failures_are_cached_for_the_negative_ttl():
+    async def go():
+        resolver = FakeResolver(TABLE, negative_ttl=60)
+        for _ in range(3):
+            with pytest.raises(OSError):
+                await resolver.resolve("missing.test")
+        expired = FakeResolver(TABLE, negative_ttl=0)
+        for _ in range(2):
+            with pytest.raises(OSError):
+                await expired.resolve("missing.test")
+        return resolver.lookups, expired.lookups
+    assert asyncio.run(go()) == (1, 2)
+
+
+def test_without_hosts_and_host_index():
+    space = TargetSpace.parse("10.0.0.0/8,web.test,missing.test")
+    assert host_index(space, "missing.test") == space.size - 1
+    assert without_hosts(space, ["missing.test"]).hostnames == ["web.test"]
+    assert without_hosts(space, []) is space
+    assert without_hosts(["10.0.0.1", "missing.test"], ["missing.test"]) == ["10.0.0.1"]
+    assert host_index(["10.0.0.1", "missing.test"], "missing.test") == 1
+
+
+def test_resolve_many_maps_failures_to_empty():
+    resolved = asyncio.run(FakeResolver(TABLE).resolve_many(["web.test", "db.test", "missing.test", "db.test"]))
+    assert {h: [a for _, a in addrs] for h, addrs in resolved.items()} == {
+        "web.test": ["10.0.0.5", "fd00::5"], "db.test": ["10.0.0.6"], "missing.test": []}
+
+
+def test_expand_addresses_replaces_names_with_every_address():
+    targets, names = asyncio.run(expand_addresses(["10.0.0.1", "web.test", "db.test"], FakeResolver(TABLE)))
+    assert targets == ["10.0.0.1", "10.0.0.5", "fd00::5", "10.0.0.6"]
+    assert names == {"10.0.0.5": ["web.test"], "fd00::5": ["web.test"], "10.0.0.6": ["db.test"]}
+
+
+def test_expand_addresses_on_a_target_space():
+    space = TargetSpace.parse("10.0.0.1-2,web.test")
+    targets, _ = asyncio.run(expand_addresses(space, FakeResolver(TABLE)))
+    assert sorted(targets) == sorted(["10.0.0.1", "10.0.0.2", "10.0.0.5", "fd00::5"])
+
+
+def test_localhost_resolves():
+    addresses = asyncio.run(Resolver().resolve("localhost"))
+    assert addresses and all(literal(a) is not None for _, a in addresses)
+
+
+
+def scan_mixed(closed_port, targets=("local.test", "missing.test"), scheduler=None, **kwargs):
+    """Scan an open and a closed loopback port of one good and one unresolvable name."""
+    from scanner_async import ScanScheduler
+    progress = []
+
+    async def go():
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        scanner = (scheduler or ScanScheduler)(
+            targets, sorted([port, closed_port]), concurrency=8, timeout=1.0,
+            resolver=FakeResolver({"local.test": ["127.0.0.1"]}),
+            on_progress=lambda done, total: progress.append((done, total)), **kwargs)
+        async with server:
+            found = await scanner.run()
+        return port, found, scanner
+    port, found, scanner = asyncio.run(go())
+    return port, found, scanner, progress
+
+
+def test_unresolved_names_are_left_out_of_the_plan(closed_port):
+    port, found, scanner, progress = scan_mixed(closed_port, targets=["local.test", "missing.test"])
+    assert found == {"local.test": [port]}
+    assert scanner.stats == {OPEN: 1, CLOSED: 1}
+    assert scanner.retried == 0
+    assert scanner.unresolved == ["missing.test"]
+    assert progress[-1] == (2, 2)
+
+
+def test_unresolved_names_keep_their_checkpoint_slots(closed_port, tmp_path):
+    from checkpoint import Checkpoint
+    targets = TargetSpace.parse("local.test,missing.test")
+    ckpt = Checkpoint(str(tmp_path / "scan.ckpt"), 4, {"targets": targets.spec()})
+    port, found, scanner, progress = scan_mixed(closed_port, targets=targets, checkpoint=ckpt)
+    assert scanner.stats == {OPEN: 1, CLOSED: 1} and scanner.retried == 0
+    assert progress[-1] == (2, 2)
+    # Only local.test (index 0 of each port) is done; missing.test is probed again on resume.
+    assert [i for i in range(4) if i in ckpt] == [0, 2]
+    ckpt.close()
+
+
+def test_delta_scans_skip_unresolved_names_too(closed_port):
+    from delta import DeltaScheduler
+    port, found, scanner, progress = scan_mixed(closed_port, scheduler=DeltaScheduler,
+                                                known_open=[("missing.test", closed_port)])
+    assert found == {"local.test": [port]}
+    assert scanner.stats == {OPEN: 1, CLOSED: 1} and scanner.retried == 0
+    assert progress[-1] == (2, 2)
@@ -0,0 +1,176 @@
+import asyncio
+
+from scanner_async import CLOSED, ERROR, FILTERED, OPEN, AdaptiveWindow, AsyncPortScanner, ScanScheduler
+
+
+def settle(window, outcomes, retried=False):
+    """Acquire one slot per outcome and release it with that outcome."""
+    async def go():
+        for outcome in outcomes:
+            await window.acquire()
+            window.release(outcome, retried=retried)
+    asyncio.run(go())
+
+
+def test_window_slow_start_grows_by_one_per_reply():
+    window = AdaptiveWindow(100, initial=4)
+    settle(window, [OPEN, CLOSED, OPEN])
+    assert window.limit == 7
+    assert window.decreases == 0
+
+
+def test_window_congestion_avoidance_above_ssthresh():
+    window = AdaptiveWindow(100, initial=10)
+    window.ssthresh = 10.0
+    settle(window, [CLOSED] * 10)
+    # About +1 per window's worth of replies once past ssthresh.
+    assert window.limit == 10
+    assert 10.9 < window.cwnd < 11.0
+
+
+def test_window_never_exceeds_maximum():
+    window = AdaptiveWindow(8, initial=4)
+    settle(window, [OPEN] * 50)
+    assert window.limit == 8
+
+
+def test_local_error_halves_window_once_per_sample():
+    window = AdaptiveWindow(100, initial=40, sample=64)
+    settle(window, [ERROR, ERROR, ERROR])
+    assert window.limit == 20
+    assert window.decreases == 1
+
+
+def test_reply_only_on_retry_counts_as_loss():
+    window = AdaptiveWindow(100, initial=40)
+    settle(window, [OPEN], retried=True)
+    assert window.limit == 20
+
+
+def test_window_respects_minimum():
+    window = AdaptiveWindow(100, initial=2, minimum=2, sample=1)
+    settle(window, [ERROR] * 5)
+    assert window.limit == 2
+
+
+def test_steady_timeouts_do_not_collapse_window():
+    # A host that drops most ports: the timeout rate is the baseline, not loss.
+    window = AdaptiveWindow(1000, initial=32, sample=10)
+    for _ in range(5):
+        settle(window, [FILTERED] * 8 + [CLOSED] * 2)
+    assert window.decreases == 0
+    assert window.limit > 32
+
+
+def test_timeout_spike_above_baseline_decreases():
+    window = AdaptiveWindow(1000, initial=64, sample=10)
+    settle(window, [CLOSED] * 10)
+    before = window.cwnd
+    settle(window, [FILTERED] * 9 + [CLOSED])
+    assert window.decreases == 1
+    assert window.cwnd < before
+
+
+def test_acquire_waits_for_release():
+    async def go():
+        window = AdaptiveWindow(1, initial=1)
+        await window.acquire()
+        waiter = asyncio.ensure_future(window.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        window.release(OPEN)
+        await asyncio.wait_for(waiter, 1)
+        return window.inflight
+    assert asyncio.run(go()) == 1
+
+
+def scan_local(backend, closed, **kwargs):
+    async def go():
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        scanner = ScanScheduler(["127.0.0.1"], [port, closed], 10, 1.0, backend=backend,
+                                show_progress=False, **kwargs)
+        async with server:
+            found = await scanner.run()
+        return port, found, scanner.stats
+    return asyncio.run(go())
+
+
+def test_scan_finds_open_and_closed_ports(closed_port):
+    for backend in ("stream", "raw"):
+        port, found, stats = scan_local(backend, closed_port)
+        assert found == {"127.0.0.1": [port]}
+        assert stats == {OPEN: 1, CLOSED: 1}
+
+
+def test_async_port_scanner_records_every_verdict(closed_port):
+    async def go():
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        scanner = AsyncPortScanner("127.0.0.1", [port, closed_port], concurrency=4, timeout=1.0,
+                                   show_progress=False)
+        async with server:
+            found = await scanner.run()
+        return found, scanner.results, port
+    found, results, port = asyncio.run(go())
+    assert found == [port]
+    assert results == {port: OPEN, closed_port: CLOSED}
+
+
+def test_open_handoffs_are_bounded():
+    async def go():
+        servers = [await asyncio.start_server(lambda r, w: None, "127.0.0.1", 0) for _ in range(6)]
+        ports = [s.sockets[0].getsockname()[1] for s in servers]
+        active = peak = 0
+        seen = []
+
+        async def on_open(host, port, reader, writer):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            seen.append(port)
+            active -= 1
+            writer.close()
+
+        scanner = ScanScheduler(["127.0.0.1"], ports, 10, 1.0, on_open=on_open, handoff_limit=2,
+                                show_progress=False)
+        found = await scanner.run()
+        for s in servers:
+            s.close()
+        return ports, found, seen, peak
+    ports, found, seen, peak = asyncio.run(go())
+    assert found == {"127.0.0.1": sorted(ports)}
+    assert sorted(seen) == sorted(ports)
+    assert peak == 2
+
+
+class SlowScheduler(ScanScheduler):
+    """Probes sleep instead of connecting, recording how many hit each host at once."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active = {}
+        self.peak = {}
+
+    async def _try_connect(self, host, port):
+        self.active[host] = self.active.get(host, 0) + 1
+        self.peak[host] = max(self.peak.get(host, 0), self.active[host])
+        await asyncio.sleep(0.005)
+        self.active[host] -= 1
+        return CLOSED
+
+
+def test_per_host_cap_holds_across_a_target_space():
+    from targets import TargetSpace
+    targets = TargetSpace.parse("10.0.0.1-3")
+    scanner = SlowScheduler(targets, list(range(1, 21)), concurrency=12, adaptive=False, per_host=2,
+                            show_progress=False)
+    assert asyncio.run(scanner.run()) == {}
+    assert scanner.stats == {CLOSED: 60}
+    assert scanner.peak == dict.fromkeys(["10.0.0.1", "10.0.0.2", "10.0.0.3"], 2)
+
+
+def test_many_hosts_default_to_a_quarter_of_the_window_each():
+    assert ScanScheduler(["10.0.0.1"], [80], concurrency=100).per_host == 100
+    assert ScanScheduler(["10.0.0.1", "10.0.0.2"], [80], concurrency=100).per_host == 25
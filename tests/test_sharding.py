@@ -0,0 +1,79 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from banner import BannerGrabber
+from scanner_async import CLOSED, OPEN
+from sharding import run_sharded
+
+
+@pytest.fixture
+def ssh_ports():
+    """Two local servers that greet like OpenSSH 8.2p1."""
+    servers = [socket.create_server(("127.0.0.1", 0)) for _ in range(2)]
+    stop = threading.Event()
+
+    def serve(server):
+        server.settimeout(0.1)
+        while not stop.is_set():
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                continue
+            with conn:
+                try:
+                    conn.sendall(b"SSH-2.0-OpenSSH_8.2p1\r\n")
+                except OSError:
+                    pass
+    threads = [threading.Thread(target=serve, args=(s,), daemon=True) for s in servers]
+    for t in threads:
+        t.start()
+    yield sorted(s.getsockname()[1] for s in servers)
+    stop.set()
+    for t in threads:
+        t.join()
+    for s in servers:
+        s.close()
+
+
+def closed_ports(n):
+    socks = [socket.socket() for _ in range(n)]
+    try:
+        for s in socks:
+            s.bind(("127.0.0.1", 0))
+        return [s.getsockname()[1] for s in socks]
+    finally:
+        for s in socks:
+            s.close()
+
+
+@pytest.mark.parametrize("processes", [1, 3])
+def test_workers_split_the_scan_and_stream_back_results(ssh_ports, processes):
+    ports = sorted(ssh_ports + closed_ports(6))
+    grabber = BannerGrabber("127.0.0.1", 0.5)
+    opened, progress = [], []
+
+    async def go():
+        return await run_sharded(processes, ["127.0.0.1"], ports, 20, 0.5, grabber=grabber,
+                                 on_result=lambda host, port, state: opened.append((port, state)),
+                                 on_progress=lambda done, total: progress.append((done, total)))
+    found, banners, stats, expired = asyncio.run(asyncio.wait_for(go(), 60))
+    assert found == {"127.0.0.1": ssh_ports}
+    assert sorted(opened) == [(p, OPEN) for p in ssh_ports]
+    assert banners == {"127.0.0.1": dict.fromkeys(ssh_ports, "SSH-2.0-OpenSSH_8.2p1")}
+    assert grabber.fingerprints[("127.0.0.1", ssh_ports[0])].product == "OpenSSH"
+    assert stats == {OPEN: 2, CLOSED: 6} and not expired
+    assert progress[-1] == (len(ports), len(ports))
+
+
+def test_delta_plan_is_sharded_too(ssh_ports):
+    ports = sorted(ssh_ports + closed_ports(4))
+
+    async def go():
+        return await run_sharded(2, ["127.0.0.1"], ports, 10, 0.5, inline_grab=False, show_progress=False,
+                                 known_open=[("127.0.0.1", ssh_ports[1])], port_counts={})
+    found, banners, stats, _ = asyncio.run(asyncio.wait_for(go(), 60))
+    assert found == {"127.0.0.1": ssh_ports} and banners == {}
+    assert sum(stats.values()) == len(ports)
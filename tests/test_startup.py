@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("rich", "aiohttp", "flask")
+
+
+def loaded(code):
+    """Heavy modules present in a fresh interpreter after running ``code``."""
+    check = f"import sys; {code}; print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", check], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    return proc.stdout.strip()
+
+
+@pytest.mark.parametrize("code", [
+    "import main",
+    "import scanner_async, banner, resolver, targets, events, checkpoint, metrics",
+])
+def test_cli_core_loads_no_heavy_dependency(code):
+    assert loaded(code) == ""
+
+
+def test_help_prints_without_rich():
+    proc = subprocess.run([sys.executable, "-X", "importtime", "main.py", "--help"], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0 and "scan" in proc.stdout
+    imported = {line.rsplit("|", 1)[-1].strip() for line in proc.stderr.splitlines()}
+    assert not imported & set(HEAVY)
+
+
+def test_async_port_scanner_runs_without_rich():
+    code = ("import asyncio; from scanner_async import AsyncPortScanner; "
+            "seen = []; "
+            "s = AsyncPortScanner('127.0.0.1', [1], timeout=0.5, show_progress=False, "
+            "on_progress=lambda d, t: seen.append((d, t))); "
+            "asyncio.run(s.run()); assert seen[-1] == (1, 1), seen")
+    assert loaded(code) == ""
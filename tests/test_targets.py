@@ -0,0 +1,112 @@
+import pytest
+
+from targets import FeistelPermutation, IntRanges, PortSpace, ProbeSpace, TargetSpace, spec_digest
+
+
+def test_int_ranges_merge_overlapping_and_adjacent():
+    r = IntRanges([(10, 20), (0, 5), (5, 8), (15, 25), (30, 30)])
+    assert r.ranges() == [(0, 8), (10, 25)]
+    assert len(r) == 23
+    assert 7 in r and 8 not in r and 24 in r and 25 not in r
+
+
+@pytest.mark.parametrize("base, cut, expected", [
+    ([(0, 100)], [(10, 20), (50, 60)], [(0, 10), (20, 50), (60, 100)]),
+    ([(0, 10), (20, 30)], [(5, 25)], [(0, 5), (25, 30)]),
+    ([(0, 10)], [(0, 10)], []),
+    ([(0, 10)], [(-5, 3), (8, 40)], [(3, 8)]),
+    ([(10, 20)], [(0, 5), (30, 40)], [(10, 20)]),
+    ([(0, 10), (20, 30), (40, 50)], [(9, 41)], [(0, 9), (41, 50)]),
+])
+def test_int_ranges_subtract(base, cut, expected):
+    result = IntRanges(base).subtract(IntRanges(cut))
+    assert result.ranges() == expected
+    assert list(result) == [v for v in IntRanges(base) if v not in IntRanges(cut)]
+
+
+def test_int_ranges_slice_matches_list_slice():
+    r = IntRanges([(0, 3), (10, 14), (20, 21)])
+    values = list(r)
+    for start in range(len(values) + 1):
+        for stop in range(start, len(values) + 2):
+            assert list(r.slice(start, stop)) == values[start:stop]
+
+
+def test_port_space_parse_and_exclude():
+    ports = PortSpace.parse("80,22,8000-8005", "8002-8003")
+    assert list(ports) == [22, 80, 8000, 8001, 8004, 8005]
+    assert ports[0] == 22 and ports[-1] == 8005
+    assert PortSpace.parse(ports.spec()).ranges() == ports.ranges()
+    with pytest.raises(ValueError):
+        PortSpace.parse("70000")
+
+
+def test_target_space_parse_forms():
+    space = TargetSpace.parse("10.0.0.0/30,192.168.1.5-7,example.test,http://10.9.9.9:8080/x")
+    assert list(space) == ["10.0.0.1", "10.0.0.2", "10.9.9.9",
+                           "192.168.1.5", "192.168.1.6", "192.168.1.7", "example.test"]
+    assert space[-1] == "example.test"
+    assert "192.168.1.6" in space and "192.168.1.8" not in space
+
+
+def test_target_space_exclude_and_spec_round_trip():
+    space = TargetSpace.parse("10.0.0.0/24", "10.0.0.10-200")
+    assert len(space) == 254 - 191
+    assert TargetSpace.parse(space.spec()).addresses.ranges() == space.addresses.ranges()
+
+
+def test_target_space_huge_ipv6_prefix_is_lazy():
+    space = TargetSpace.parse("2001:db8::/64")
+    assert space.size == 2 ** 64 - 1
+    assert space[0] == "2001:db8::1"
+    assert space[space.size - 1] == "2001:db8::ffff:ffff:ffff:ffff"
+    # Truthiness must not go through len(), which overflows past sys.maxsize.
+    assert space and not TargetSpace.parse("")
+
+
+def test_target_space_slice_covers_addresses_then_hostnames():
+    space = TargetSpace.parse("10.0.0.1-4,a.test,b.test")
+    items = list(space)
+    for start in range(len(items) + 1):
+        for stop in range(start, len(items) + 1):
+            assert list(space.slice(start, stop)) == items[start:stop]
+    # Slices partition the space exactly, as the sharding code relies on.
+    parts = [space.slice(i, i + 4) for i in range(0, len(items), 4)]
+    assert [t for part in parts for t in part] == items
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 7, 64, 100, 1000, 4097])
+def test_feistel_is_a_bijection(n):
+    perm = FeistelPermutation(n, seed=1234)
+    assert sorted(perm) == list(range(n))
+
+
+def test_feistel_is_keyed_and_reproducible():
+    a = list(FeistelPermutation(500, seed=1))
+    assert a == list(FeistelPermutation(500, seed=1))
+    assert a != list(FeistelPermutation(500, seed=2))
+    assert a != list(range(500))
+    with pytest.raises(IndexError):
+        FeistelPermutation(10, seed=1)[10]
+
+
+def test_probe_space_orders_and_shards():
+    targets, ports = TargetSpace.parse("10.0.0.1-3"), PortSpace.parse("22,80")
+    natural = list(ProbeSpace(targets, ports))
+    assert natural[:3] == [("10.0.0.1", 22), ("10.0.0.2", 22), ("10.0.0.3", 22)]
+    shuffled = ProbeSpace(targets, ports, seed=7)
+    assert sorted(shuffled) == sorted(natural)
+    shards = [list(shuffled.indexed(k, 3)) for k in range(3)]
+    indices = sorted(i for shard in shards for i, _, _ in shard)
+    assert indices == list(range(6))
+
+
+def test_spec_digest_tells_specs_apart():
+    assert spec_digest(PortSpace.parse("1-10")) == spec_digest(PortSpace.parse("1-5,6-10"))
+    assert spec_digest(PortSpace.parse("1-10")) != spec_digest(PortSpace.parse("1-11"))
+
+
+def test_ip_range_from_cidr_is_a_list_of_the_target_space():
+    from network_scanner import ip_range_from_cidr
+    assert ip_range_from_cidr("10.0.0.5-7") == ["10.0.0.5", "10.0.0.6", "10.0.0.7"]
+    assert ip_range_from_cidr("10.0.0.0/30") == ["10.0.0.1", "10.0.0.2"]
@@ -0,0 +1,207 @@
+import asyncio
+import errno
+import json
+import socket
+import sys
+
+import pytest
+
+from cve_index import CVEIndex
+from events import EventBus, PortOpenFiltered, PortStates
+from fingerprint import default_db
+from liveness import _Pacer
+from scanner_async import CLOSED, FILTERED, OPEN
+from udp_scanner import _UNSENT, OPEN_FILTERED, UDPScanner, _Probe, reply_text
+
+linux = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="ICMP errors are only read on Linux")
+
+SIP_REPLY = b"SIP/2.0 200 OK\r\nServer: Asterisk PBX 16.2.1\r\nContent-Length: 0\r\n\r\n"
+
+
+class Responders:
+    """Local UDP sockets: ``answering`` reply to every datagram, ``silent`` never do."""
+
+    def __init__(self, answering=1, silent=1):
+        self.answering = [self._bind() for _ in range(answering)]
+        self.silent = [self._bind() for _ in range(silent)]
+        self.received = []
+
+    @staticmethod
+    def _bind():
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.setblocking(False)
+        return sock
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        for sock in self.answering:
+            loop.add_reader(sock.fileno(), self._answer, sock)
+
+    def _answer(self, sock):
+        data, addr = sock.recvfrom(4096)
+        self.received.append(data)
+        sock.sendto(SIP_REPLY, addr)
+
+    def close(self):
+        loop = asyncio.get_running_loop()
+        for sock in self.answering:
+            loop.remove_reader(sock.fileno())
+        for sock in self.answering + self.silent:
+            sock.close()
+
+    @staticmethod
+    def ports(socks):
+        return [s.getsockname()[1] for s in socks]
+
+
+def closed_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_udp_probes_come_from_the_probe_database():
+    db = default_db()
+    assert db.udp_probe(53).name == "DNSVersionBindReq"
+    assert db.udp_probe(161).payload.startswith(b"\x30")
+    assert db.udp_probe(40000).payload == b""
+    assert reply_text(b"\x00\x06ok\x01 there\n") == "ok. there"
+
+
+@linux
+def test_reply_closed_and_silent_ports_get_their_verdicts():
+    async def go():
+        responders = Responders(answering=2, silent=2)
+        responders.start()
+        open_ports = Responders.ports(responders.answering)
+        silent = Responders.ports(responders.silent)
+        closed = closed_udp_port()
+        results = {}
+        scanner = UDPScanner(["127.0.0.1"], sorted(open_ports + silent + [closed]), timeout=0.1, retries=1,
+                             rate=0, show_progress=False,
+                             on_result=lambda host, port, state: results.__setitem__(port, state))
+        found = await scanner.run()
+        responders.close()
+        return scanner, found, results, open_ports, silent, closed
+    scanner, found, results, open_ports, silent, closed = asyncio.run(go())
+    assert found == {"127.0.0.1": sorted(open_ports)}
+    assert {p: results[p] for p in open_ports} == dict.fromkeys(open_ports, OPEN)
+    assert results[closed] == CLOSED
+    assert scanner.open_filtered == {"127.0.0.1": sorted(silent)}
+    assert scanner.stats == {OPEN: 2, CLOSED: 1, OPEN_FILTERED: 2}
+    # Silent ports are sent the first try and one retransmission.
+    assert scanner.retransmitted == 2 and scanner.sent == 7
+    fp = scanner.fingerprints[("127.0.0.1", open_ports[0])]
+    assert (fp.product, fp.version) == ("Asterisk PBX", "16.2.1")
+
+
+@linux
+def test_a_burst_of_closed_ports_all_get_a_verdict():
+    async def go():
+        scanner = UDPScanner(["127.0.0.1"], ports, timeout=0.2, retries=0, rate=0, show_progress=False)
+        await scanner.run()
+        return scanner
+    ports = sorted({closed_udp_port() for _ in range(200)})
+    scanner = asyncio.run(go())
+    # Earlier probes' ICMP errors fail later sends; every probe still goes out once.
+    assert sum(scanner.stats.values()) == len(ports)
+    assert scanner.sent == len(ports)
+    assert scanner.stats.get(CLOSED, 0) > 0
+
+
+@linux
+def test_unresolved_names_are_not_probed():
+    from test_resolver import FakeResolver
+
+    async def go():
+        responders = Responders(answering=1, silent=0)
+        responders.start()
+        port = Responders.ports(responders.answering)[0]
+        scanner = UDPScanner(["local.test", "missing.test"], [port], timeout=0.1, retries=1, rate=0,
+                             show_progress=False, resolver=FakeResolver({"local.test": ["127.0.0.1"]}))
+        found = await scanner.run()
+        responders.close()
+        return scanner, found, port
+    scanner, found, port = asyncio.run(go())
+    assert found == {"local.test": [port]}
+    assert scanner.unresolved == ["missing.test"]
+    assert scanner.stats == {OPEN: 1} and scanner.sent == 1
+
+
+class RefusingSocket:
+    """Stands in for the probe socket: the first ``fails`` sends report a queued ICMP error."""
+
+    def __init__(self, fails, error=errno.ECONNREFUSED):
+        self.fails = fails
+        self.error = error
+        self.sent = []
+
+    def sendto(self, payload, target):
+        if self.fails:
+            self.fails -= 1
+            raise OSError(self.error, "queued error")
+        self.sent.append(target)
+
+
+def send_through(sock):
+    async def go():
+        scanner = UDPScanner(["127.0.0.1"], [9], show_progress=False)
+        scanner.icmp = False
+        scanner._socks[socket.AF_INET] = sock
+        scanner._pacer = _Pacer(0)
+        probe = _Probe(("127.0.0.1", 9), "127.0.0.1", scanner.probes.udp_probe(9), socket.AF_INET)
+        return await scanner._send(probe), scanner
+    return asyncio.run(go())
+
+
+def test_send_retries_after_stale_errors():
+    sock = RefusingSocket(fails=2)
+    state, scanner = send_through(sock)
+    assert state is None and sock.sent == [("127.0.0.1", 9)] and scanner.sent == 1
+
+
+def test_send_never_reports_unsent_as_sent():
+    sock = RefusingSocket(fails=10)
+    state, scanner = send_through(sock)
+    assert state == _UNSENT and not sock.sent and scanner.sent == 0
+
+
+def test_persistent_unreachable_is_filtered():
+    state, _ = send_through(RefusingSocket(fails=10, error=errno.EHOSTUNREACH))
+    assert state == FILTERED
+
+
+@linux
+def test_udp_scan_reports_open_filtered_ports_and_states(tmp_path):
+    import main
+    index = str(tmp_path / "cve.db")
+    CVEIndex(index).close()
+    save = str(tmp_path / "report.json")
+
+    async def go():
+        responders = Responders(answering=1, silent=1)
+        responders.start()
+        answering, silent = Responders.ports(responders.answering), Responders.ports(responders.silent)
+        bus, seen = EventBus(), []
+        bus.subscribe(seen.append)
+        old, main.console.quiet = main.console.quiet, True
+        try:
+            await main.run_scan(["127.0.0.1"], answering + silent, 10, 0.1,
+                                save, retries=0, cve_db=index, history=None, events=bus, udp=True, udp_rate=0)
+        finally:
+            main.console.quiet = old
+            responders.close()
+        return answering, silent[0], seen
+    answering, silent, seen = asyncio.run(go())
+    assert PortOpenFiltered("127.0.0.1", silent) in seen
+    assert PortStates({OPEN: 1, OPEN_FILTERED: 1}) in seen
+    report = json.loads(open(save).read())
+    assert report["open_ports"] == answering
+    assert report["open_filtered"] == [silent]
+    assert report["port_states"] == {OPEN: 1, OPEN_FILTERED: 1}
+    md = str(tmp_path / "report.md")
+    from reporter import render, stream_path
+    render(stream_path(save), md)
+    text = open(md).read()
+    assert f"## Open|filtered ports (no reply)\n- {silent}\n" in text and "Port states: open: 1" in text
@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+from reporter import ResultSink, render
+from webapp import app as webapp
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    stream = str(tmp_path / "report.ndjson")
+    with ResultSink(stream) as sink:
+        sink.meta("10.0.0.0/24")
+        for i in range(1, 121):
+            sink.open_port(f"10.0.0.{i}:22", f"10.0.0.{i}", 22)
+            sink.service(f"10.0.0.{i}:22", "SSH-2.0-OpenSSH_8.2p1", {"service": "ssh", "product": "OpenSSH"},
+                         [{"id": "CVE-1"}] if i % 2 else [], "", host=f"10.0.0.{i}", port=22)
+    render(stream, str(tmp_path / "report.json"))
+    monkeypatch.setattr(webapp, "VISUAL_REPORT", str(tmp_path / "report_visual.json"))
+    monkeypatch.setattr(webapp, "DEFAULT_STREAM", stream)
+    monkeypatch.setattr(webapp, "_cache", webapp.ReportCache())
+    client = webapp.app.test_client()
+    client.stream = stream
+    return client
+
+
+def test_findings_are_paged_and_filtered(client):
+    page = client.get("/api/findings?page=3&per_page=50").get_json()
+    assert page["total"] == 120 and len(page["items"]) == 20
+    assert page["items"][0]["key"] == "10.0.0.101:22"
+    one = client.get("/api/findings?host=10.0.0.7").get_json()
+    assert [row["key"] for row in one["items"]] == ["10.0.0.7:22"]
+    assert client.get("/api/findings?host=10.0.0.1*").get_json()["total"] == 32
+
+
+def test_summary_and_conditional_requests(client):
+    first = client.get("/api/summary")
+    summary = first.get_json()
+    assert (summary["open_ports"], summary["hosts"], summary["with_cves"]) == (120, 120, 60)
+    again = client.get("/api/summary", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_stream_ends_once_the_scan_is_final(client):
+    live = client.get("/api/stream", buffered=False)
+    chunks = iter(live.response)
+    # retry, then meta plus 120 open and 120 service records; then it keeps polling.
+    body = "".join(next(chunks).decode() for _ in range(242))
+    live.close()
+    assert body.count("event: open") == 120 and "event: done" not in body
+    # A scan closes its stream with a metrics record; clients are then told it is done.
+    with ResultSink(client.stream, append=True) as sink:
+        sink.metrics({"phases": {"scan": 1.0}})
+    events = [line for line in client.get("/api/stream").get_data(as_text=True).splitlines()
+              if line.startswith("event:")]
+    assert events[-2:] == ["event: metrics", "event: done"]
+    size = os.path.getsize(client.stream)
+    resumed = client.get("/api/stream", headers={"Last-Event-ID": str(size)}).get_data(as_text=True)
+    assert resumed == "retry: 3000\n\nevent: done\ndata: {}\n\n"
+    assert json.loads(open(client.stream).readlines()[-1])["type"] == "metrics"
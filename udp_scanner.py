@@ -0,0 +1,374 @@
+# udp_scanner.py
+"""UDP port scanning over one non-blocking socket per address family.
+
+Each port is sent the datagram of its protocol's probe from
+service-probes.txt (DNS, NTP, SNMP, NetBIOS, SSDP, SIP, memcached) or an
+empty one. Probes in flight are keyed by (address, port), so a reply or
+ICMP error is matched back with one dict lookup however many hosts are
+being scanned at once. Unanswered probes are retransmitted from a heap
+of deadlines, each attempt waiting twice as long as the one before, and
+one pacer spaces every send, first tries and retransmissions alike, to
+stay under the targets' ICMP rate limits.
+
+    open           a UDP reply came back
+    closed         ICMP port unreachable
+    filtered       any other ICMP destination unreachable
+    open|filtered  no answer to any attempt
+
+ICMP errors are read from the socket error queue (IP_RECVERR), which only
+Linux has; elsewhere closed ports are reported as open|filtered.
+"""
+import asyncio
+import errno
+import heapq
+import ipaddress
+import itertools
+import socket
+import struct
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fingerprint import Fingerprint, Probe, ProbeDB, default_db
+from liveness import _Pacer
+from resolver import Resolver, hostnames, without_hosts
+from scanner_async import CLOSED, ERROR, FILTERED, OPEN, ProgressHandler, ResultHandler
+from targets import ProbeSpace, space_size
+
+OPEN_FILTERED = "open|filtered"
+
+IP_RECVERR = getattr(socket, "IP_RECVERR", 11)
+IPV6_RECVERR = getattr(socket, "IPV6_RECVERR", 25)
+# struct sock_extended_err: errno, origin, type, code, pad, info, data
+_EXTENDED_ERR = struct.Struct("=IBBBBII")
+# origin -> (ICMP "destination unreachable" type, "port unreachable" code)
+_UNREACHABLE = {2: (3, 3), 3: (1, 4)}
+_ERROR_CMSGS = {(socket.IPPROTO_IP, IP_RECVERR), (socket.IPPROTO_IPV6, IPV6_RECVERR)}
+# A pending ICMP error is reported by the next send on the socket too.
+_STALE_ERRORS = (errno.ECONNREFUSED, errno.EHOSTUNREACH, errno.ENETUNREACH)
+# Sends tried per attempt while earlier probes' errors keep failing them.
+_SEND_TRIES = 4
+# What _send returns when nothing went out; the probe is queued again
+# after _UNSENT_DELAY without using up one of its attempts.
+_UNSENT = "unsent"
+_UNSENT_DELAY = 0.01
+
+Key = Tuple[str, int]
+
+
+def reply_text(data: bytes, limit: int = 256) -> str:
+    """A reply as report text: printable characters kept, the rest shown as dots."""
+    text = data[:limit].decode("latin-1")
+    return "".join(c if c.isprintable() else "." for c in text).strip(".").strip()
+
+
+class _Probe:
+    __slots__ = ("key", "port", "hosts", "probe", "family", "attempt", "done", "unsent")
+
+    def __init__(self, key: Key, host: str, probe: Probe, family: int):
+        self.key = key
+        self.port = key[1]
+        # Every target name that resolved to this address shares the verdict.
+        self.hosts = [host]
+        self.probe = probe
+        self.family = family
+        self.attempt = 0
+        self.done = False
+        # Set while the current attempt is waiting to be sent again.
+        self.unsent = False
+
+
+class UDPScanner:
+    def __init__(self, targets: Sequence[str], ports: Sequence[int], timeout: float = 1.0, retries: int = 2,
+                 rate: float = 500.0, inflight: int = 4096, probes: Optional[ProbeDB] = None,
+                 resolver: Optional[Resolver] = None, on_result: Optional[ResultHandler] = None,
+                 randomize: bool = False, seed: Optional[int] = None, show_progress: bool = True,
+                 on_progress: Optional[ProgressHandler] = None, progress_interval: float = 0.1):
+        self.targets = targets
+        self.ports = ports
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        # Packets per second over all targets, retransmissions included.
+        self.rate = rate
+        self.inflight = max(1, inflight)
+        self.probes = probes or default_db()
+        self.resolver = resolver or Resolver()
+        self.on_result = on_result
+        self.randomize = randomize
+        self.seed = seed
+        self.show_progress = show_progress
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.stats: Dict[str, int] = {}
+        self.unresolved: List[str] = []
+        self.open_filtered: Dict[str, List[int]] = {}
+        self.replies: Dict[Key, bytes] = {}
+        self.fingerprints: Dict[Key, Fingerprint] = {}
+        self.sent = 0
+        self.retransmitted = 0
+        # False where ICMP errors cannot be read (not Linux, or refused).
+        self.icmp = sys.platform.startswith("linux")
+        self._pending: Dict[Key, _Probe] = {}
+        self._socks: Dict[int, socket.socket] = {}
+        self._waiter: Optional[asyncio.Future] = None
+        self._found: Dict[str, List[int]] = {}
+        self._report = None
+
+    @property
+    def label(self) -> str:
+        hosts = space_size(self.targets)
+        return self.targets[0] if hosts == 1 else f"{hosts} hosts"
+
+    def _socket(self, family: int) -> socket.socket:
+        sock = self._socks.get(family)
+        if sock is None:
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            try:
+                # Thousands of probes in flight can answer in one burst.
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+            except OSError:
+                pass
+            if self.icmp:
+                level, option = ((socket.IPPROTO_IP, IP_RECVERR) if family == socket.AF_INET
+                                 else (socket.IPPROTO_IPV6, IPV6_RECVERR))
+                try:
+                    sock.setsockopt(level, option, 1)
+                except OSError:
+                    self.icmp = False
+            asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable, sock)
+            self._socks[family] = sock
+        return sock
+
+    def _on_readable(self, sock: socket.socket):
+        while True:
+            try:
+                data, addr = sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # A queued ICMP error; its details are in the error queue.
+                continue
+            self._reply(addr, data)
+        if self.icmp:
+            self._read_errors(sock)
+
+    def _read_errors(self, sock: socket.socket):
+        while True:
+            try:
+                _, ancdata, _, addr = sock.recvmsg(512, 512, socket.MSG_ERRQUEUE)
+            except OSError:
+                return
+            for level, kind, data in ancdata:
+                if (level, kind) not in _ERROR_CMSGS or len(data) < _EXTENDED_ERR.size:
+                    continue
+                _, origin, icmp_type, code, _, _, _ = _EXTENDED_ERR.unpack_from(data)
+                unreachable = _UNREACHABLE.get(origin)
+                if unreachable is not None and icmp_type == unreachable[0]:
+                    # addr is where the datagram that caused the error went.
+                    self._settle(self._pending.get(_key(addr)), CLOSED if code == unreachable[1] else FILTERED)
+
+    def _reply(self, addr, data: bytes):
+        probe = self._pending.get(_key(addr))
+        if probe is None:
+            return
+        fp = self.probes.udp.match(data, probe.probe.name) if self.probes.udp is not None else None
+        for host in probe.hosts:
+            self.replies[(host, probe.port)] = data
+            if fp is not None:
+                self.fingerprints[(host, probe.port)] = fp
+        self._settle(probe, OPEN)
+
+    def _settle(self, probe: Optional[_Probe], state: str):
+        if probe is None or probe.done:
+            return
+        probe.done = True
+        del self._pending[probe.key]
+        for host in probe.hosts:
+            self._record(host, probe.port, state)
+        self._wake()
+
+    def _record(self, host: str, port: int, state: str):
+        self.stats[state] = self.stats.get(state, 0) + 1
+        if state == OPEN:
+            self._found.setdefault(host, []).append(port)
+        elif state == OPEN_FILTERED:
+            self.open_filtered.setdefault(host, []).append(port)
+        if self.on_result is not None:
+            self.on_result(host, port, state)
+        if self._report is not None:
+            self._report()
+
+    def _wake(self):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def _sleep_until(self, when: float):
+        """Sleep until loop time ``when`` or until a verdict frees an in-flight slot."""
+        loop = asyncio.get_running_loop()
+        self._waiter = loop.create_future()
+        handle = loop.call_at(when, self._wake)
+        try:
+            await self._waiter
+        finally:
+            handle.cancel()
+            self._waiter = None
+
+    async def _send(self, probe: _Probe) -> Optional[str]:
+        """Send one attempt of ``probe``.
+
+        None once the datagram is out, a verdict when the send itself
+        settles the probe, or ``_UNSENT`` when queued ICMP errors kept
+        failing the send and it has to be tried again later.
+        """
+        await self._pacer.wait()
+        sock = self._socket(probe.family)
+        target = (probe.key[0], probe.port)
+        for attempt in range(_SEND_TRIES):
+            if probe.done:
+                # Settled by an error read below, from one of its earlier attempts.
+                return _UNSENT
+            try:
+                try:
+                    sock.sendto(probe.probe.payload, target)
+                except (BlockingIOError, InterruptedError):
+                    await asyncio.get_running_loop().sock_sendto(sock, probe.probe.payload, target)
+                self.sent += 1
+                return None
+            except OSError as e:
+                if e.errno not in _STALE_ERRORS:
+                    return ERROR
+                if attempt and e.errno != errno.ECONNREFUSED:
+                    # Unreachable on the retry as well: the route to this
+                    # target itself is down.
+                    return FILTERED
+            # The failure was most likely an earlier probe's ICMP error, and
+            # the datagram did not go out. Reading the error queue settles
+            # the probes the errors belong to and clears them for the retry.
+            if self.icmp:
+                self._read_errors(sock)
+        return _UNSENT
+
+    async def run(self) -> Dict[str, List[int]]:
+        """Probe every (host, port) pair; return open ports for hosts that have any."""
+        loop = asyncio.get_running_loop()
+        self.stats = {}
+        self.open_filtered = {}
+        self.replies = {}
+        self.fingerprints = {}
+        self._found = {}
+        self._pending = {}
+        self._pacer = _Pacer(self.rate)
+        self.unresolved = []
+        names = hostnames(self.targets)
+        if names:
+            resolved = await self.resolver.resolve_many(names)
+            self.unresolved = [h for h, addresses in resolved.items() if not addresses]
+        space = ProbeSpace(without_hosts(self.targets, self.unresolved), self.ports, seed=self.seed,
+                           randomize=self.randomize)
+        plan = iter(space)
+        total = len(space)
+        # (deadline, tiebreak, probe, attempt); entries of settled probes or
+        # of attempts already retransmitted are skipped when popped.
+        deadlines: List[Tuple[float, int, _Probe, int]] = []
+        order = itertools.count()
+
+        done = 0
+        last_report = 0.0
+        report = self.on_progress
+        display = None
+        if report is None and self.show_progress:
+            from events import ConsoleView, Progress, ScanStarted
+            display = ConsoleView()
+            display(ScanStarted(f"{self.label} (udp)", total))
+            report = lambda d, t: display(Progress(d, t))
+
+        def counted():
+            nonlocal done, last_report
+            done += 1
+            if report is not None and loop.time() - last_report >= self.progress_interval:
+                last_report = loop.time()
+                report(done, total)
+
+        self._report = counted
+
+        async def launch(probe: _Probe):
+            state = await self._send(probe)
+            if probe.done:
+                return
+            if state == _UNSENT:
+                probe.unsent = True
+                heapq.heappush(deadlines, (loop.time() + _UNSENT_DELAY, next(order), probe, probe.attempt))
+            elif state is not None:
+                self._settle(probe, state)
+            else:
+                wait = self.timeout * (2 ** probe.attempt)
+                heapq.heappush(deadlines, (loop.time() + wait, next(order), probe, probe.attempt))
+
+        exhausted = False
+        try:
+            while True:
+                # Retransmissions and give-ups first: they free slots.
+                while deadlines and deadlines[0][0] <= loop.time():
+                    _, _, probe, attempt = heapq.heappop(deadlines)
+                    if probe.done or attempt != probe.attempt:
+                        continue
+                    if probe.unsent:
+                        probe.unsent = False
+                        await launch(probe)
+                    elif probe.attempt < self.retries:
+                        probe.attempt += 1
+                        self.retransmitted += 1
+                        await launch(probe)
+                    else:
+                        self._settle(probe, OPEN_FILTERED)
+                while not exhausted and len(self._pending) < self.inflight:
+                    if deadlines and deadlines[0][0] <= loop.time():
+                        break
+                    pair = next(plan, None)
+                    if pair is None:
+                        exhausted = True
+                        break
+                    host, port = pair
+                    try:
+                        family, address = await self.resolver.address(host)
+                    except OSError:
+                        self._record(host, port, ERROR)
+                        continue
+                    key = (_canonical(address), port)
+                    shared = self._pending.get(key)
+                    if shared is not None:
+                        shared.hosts.append(host)
+                        continue
+                    probe = _Probe(key, host, self.probes.udp_probe(port), family)
+                    self._pending[key] = probe
+                    await launch(probe)
+                if exhausted and not self._pending:
+                    break
+                if deadlines and (deadlines[0][0] <= loop.time() or
+                                  (not exhausted and len(self._pending) < self.inflight)):
+                    continue
+                if deadlines:
+                    await self._sleep_until(deadlines[0][0])
+            if report is not None:
+                report(done, total)
+        finally:
+            self._report = None
+            for sock in self._socks.values():
+                loop.remove_reader(sock.fileno())
+                sock.close()
+            self._socks.clear()
+            if display is not None:
+                display.close()
+        for ports in self.open_filtered.values():
+            ports.sort()
+        return {host: sorted(ports) for host, ports in self._found.items()}
+
+
+def _key(addr) -> Key:
+    return _canonical(addr[0]), addr[1]
+
+
+def _canonical(address: str) -> str:
+    # Replies and ICMP errors name IPv6 peers in compressed form.
+    return str(ipaddress.ip_address(address)) if ":" in address else address
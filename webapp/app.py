@@ -1,10 +1,185 @@
-from flask import Flask, render_template, jsonify, send_from_directory
-import os, json
+from flask import Flask, Response, render_template, jsonify, request, send_from_directory, stream_with_context
+import os, json, gzip, hashlib, threading, time
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 
 DEFAULT_REPORT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "report.json")
 VISUAL_REPORT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "report_visual.json")
+DEFAULT_STREAM = os.path.splitext(DEFAULT_REPORT)[0] + ".ndjson"
+# Written by a running scan next to its report (see metrics.py), about once a second.
+METRICS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scan_metrics.prom")
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _fold_stream(path):
+    """Rebuild the report dict from a scan's NDJSON result stream."""
+    data = {"target": "", "timestamp": "", "open_ports": [], "banners": {}, "fingerprints": {},
+            "cves": {}, "explanations": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            kind = rec.get("type")
+            if kind == "meta":
+                data["target"], data["timestamp"] = rec.get("target", ""), rec.get("timestamp", "")
+            elif kind == "open":
+                data["open_ports"].append(rec["key"])
+            elif kind == "open_filtered":
+                data.setdefault("open_filtered", []).append(rec["key"])
+            elif kind == "states":
+                data["port_states"] = rec.get("counts", {})
+            elif kind == "service":
+                k = str(rec["key"])
+                data["banners"][k] = rec.get("banner", "")
+                if rec.get("fingerprint"):
+                    data["fingerprints"][k] = rec["fingerprint"]
+                data["cves"][k] = rec.get("cves", [])
+                data["explanations"][k] = rec.get("explanation", "")
+            elif kind == "metrics":
+                data["metrics"] = rec.get("metrics", {})
+    return data
+
+
+def resolve_report(path):
+    """Follow a report_visual.json pointer; return the file that holds the data."""
+    if os.path.getsize(path) < 4096:
+        # Pointers are tiny; anything bigger is a report in its own right.
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError:
+            return path
+        pointer = data.get("pointer") if isinstance(data, dict) else None
+        if pointer:
+            return os.path.join(os.path.dirname(path), pointer)
+    return path
+
+
+def load_report(path):
+    """Load a report, following a report_visual.json pointer to the real file."""
+    path = resolve_report(path)
+    if path.endswith(".ndjson"):
+        return _fold_stream(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _split_key(key):
+    """(host, port) from a report key: 22, "22" or "10.0.0.5:22"."""
+    text = str(key)
+    host, sep, port = text.rpartition(":")
+    try:
+        return (host if sep else ""), int(port)
+    except ValueError:
+        return text, None
+
+
+def _findings(report):
+    """One flat row per open port, in report order, for paging and filtering."""
+    banners = report.get("banners") or {}
+    fps = report.get("fingerprints") or {}
+    cves = report.get("cves") or {}
+    expl = report.get("explanations") or {}
+    keys = dict.fromkeys(str(k) for k in report.get("open_ports") or [])
+    keys.update(dict.fromkeys(banners))
+    rows = []
+    for k in keys:
+        host, port = _split_key(k)
+        fp = fps.get(k) or {}
+        rows.append({"key": k, "host": host, "port": port, "banner": banners.get(k, ""),
+                     "service": fp.get("service", ""), "product": fp.get("product", ""),
+                     "version": fp.get("version", ""), "cves": cves.get(k, []),
+                     "explanation": expl.get(k, "")})
+    return rows
+
+
+class ReportCache:
+    """Parsed report kept in memory until the file behind it changes.
+
+    The file is identified by (inode, mtime, size) after following a
+    pointer, so an atomic replace or a hard-link swap by the scanner is
+    noticed on the next request without re-reading unchanged data.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ident = None
+        self.report = None
+        self.findings = []
+        self.etag = ""
+        self.mtime = 0.0
+
+    def get(self, path):
+        real = resolve_report(path)
+        st = os.stat(real)
+        ident = (real, st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if ident != self._ident:
+                report = load_report(path)
+                self.report = report
+                self.findings = _findings(report)
+                self.etag = hashlib.sha1(repr(ident).encode()).hexdigest()
+                self.mtime = st.st_mtime
+                self._ident = ident
+            return self
+
+
+_cache = ReportCache()
+
+
+def _report_path():
+    return VISUAL_REPORT if os.path.exists(VISUAL_REPORT) else DEFAULT_REPORT
+
+
+def _conditional(payload, cache, vary=""):
+    """JSON response with ETag/Last-Modified, 304 when unchanged, gzip when accepted."""
+    etag = cache.etag + (hashlib.sha1(vary.encode()).hexdigest()[:12] if vary else "")
+    resp = Response(status=200, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.last_modified = cache.mtime
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.vary.add("Accept-Encoding")
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and request.if_modified_since
+            and int(cache.mtime) <= request.if_modified_since.timestamp()):
+        resp.status_code = 304
+        return resp
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    if "gzip" in request.headers.get("Accept-Encoding", "") and len(body) > 1024:
+        body = gzip.compress(body, compresslevel=5)
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.set_data(body)
+    return resp
+
+
+def _load_or_error():
+    report_path = _report_path()
+    if not os.path.exists(report_path):
+        return None, (jsonify({"ok": False, "error": "No report found", "path": report_path}), 404)
+    try:
+        return _cache.get(report_path), None
+    except Exception as e:
+        return None, (jsonify({"ok": False, "error": str(e)}), 500)
+
+
+def _finished(path):
+    """True when a stream ends with the ``metrics`` record a scan writes just before closing it."""
+    try:
+        with open(path, "rb") as f:
+            end = f.seek(0, os.SEEK_END)
+            start = max(0, end - 65536)
+            f.seek(start)
+            tail = f.read().rstrip(b"\n")
+    except OSError:
+        return False
+    cut = tail.rfind(b"\n")
+    if cut < 0 and start:
+        # The last record is longer than the tail read: treat the scan as still running.
+        return False
+    return tail[cut + 1:].startswith(b'{"type":"metrics"')
+
 
 @app.route("/")
 def index():
@@ -12,15 +187,137 @@ def index():
 
 @app.route("/api/report")
 def api_report():
-    report_path = VISUAL_REPORT if os.path.exists(VISUAL_REPORT) else DEFAULT_REPORT
-    if not os.path.exists(report_path):
-        return jsonify({"ok": False, "error": "No report found", "path": report_path}), 404
+    cache, error = _load_or_error()
+    if error:
+        return error
+    return _conditional({"ok": True, "report": cache.report}, cache)
+
+@app.route("/api/summary")
+def api_summary():
+    cache, error = _load_or_error()
+    if error:
+        return error
+    rows = cache.findings
+    services, ports, hosts = {}, {}, set()
+    for row in rows:
+        name = row["service"] or "unknown"
+        services[name] = services.get(name, 0) + 1
+        ports[row["port"]] = ports.get(row["port"], 0) + 1
+        hosts.add(row["host"])
+    return _conditional({"ok": True, "target": cache.report.get("target", ""),
+                         "timestamp": cache.report.get("timestamp", ""),
+                         "open_ports": len(rows), "hosts": len(hosts),
+                         "with_cves": sum(1 for row in rows if row["cves"]),
+                         "services": services, "ports": ports}, cache)
+
+@app.route("/api/findings")
+def api_findings():
+    cache, error = _load_or_error()
+    if error:
+        return error
+    host = request.args.get("host", "").strip()
+    service = request.args.get("service", "").strip().lower()
+    port = request.args.get("port", type=int)
+    page = max(1, request.args.get("page", 1, type=int))
+    per_page = min(MAX_PAGE_SIZE, max(1, request.args.get("per_page", PAGE_SIZE, type=int)))
+    def host_ok(value):
+        # "10.0.0.*" filters by prefix, anything else must match exactly.
+        return not host or (value.startswith(host[:-1]) if host.endswith("*") else value == host)
+
+    rows = [row for row in cache.findings
+            if host_ok(row["host"])
+            and (port is None or row["port"] == port)
+            and (not service or service in (row["service"] or "").lower() or service in row["product"].lower())]
+    start = (page - 1) * per_page
+    return _conditional({"ok": True, "total": len(rows), "page": page, "per_page": per_page,
+                         "items": rows[start:start + per_page]},
+                        cache, vary=request.query_string.decode())
+
+@app.route("/api/stream")
+def api_stream():
+    """Server-Sent Events tail of the live NDJSON result stream.
+
+    Each record is one ``open``/``service``/``meta`` event whose id is the
+    byte offset after it, so a reconnecting EventSource resumes where it
+    left off via Last-Event-ID.  A ``reset`` event means a new scan
+    replaced the stream.
+
+    Every connected client holds one server thread while it is subscribed,
+    so the number of live dashboards is limited to the WSGI server's
+    worker threads. Once the scan writes its closing ``metrics`` record,
+    the stream sends ``done`` and ends. A client that reconnects to a
+    finished stream gets ``done`` straight away.
+    """
+    path = DEFAULT_STREAM
+    if os.path.exists(VISUAL_REPORT):
+        real = resolve_report(VISUAL_REPORT)
+        if real.endswith(".ndjson"):
+            path = real
     try:
-        with open(report_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return jsonify({"ok": True, "report": data})
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
+        offset = int(request.headers.get("Last-Event-ID") or request.args.get("offset", 0))
+    except ValueError:
+        offset = 0
+
+    def events(offset):
+        ident = None
+        last_beat = time.monotonic()
+        yield "retry: 3000\n\n"
+        try:
+            caught_up = offset >= os.path.getsize(path)
+        except OSError:
+            caught_up = False
+        if caught_up and _finished(path):
+            yield "event: done\ndata: {}\n\n"
+            return
+        while True:
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st is not None:
+                if ident is not None and (st.st_ino != ident or st.st_size < offset):
+                    offset = 0
+                    yield "event: reset\ndata: {}\n\n"
+                ident = st.st_ino
+                if st.st_size > offset:
+                    with open(path, "rb") as f:
+                        f.seek(offset)
+                        chunk = f.read(st.st_size - offset)
+                    # Only whole lines; a record still being written waits for the next poll.
+                    end = chunk.rfind(b"\n") + 1
+                    for line in chunk[:end].splitlines():
+                        offset += len(line) + 1
+                        if not line.strip():
+                            continue
+                        try:
+                            kind = json.loads(line).get("type", "message")
+                        except ValueError:
+                            continue
+                        yield f"id: {offset}\nevent: {kind}\ndata: {line.decode('utf-8', 'replace')}\n\n"
+                        if kind == "metrics":
+                            yield "event: done\ndata: {}\n\n"
+                            return
+            if time.monotonic() - last_beat > 15:
+                last_beat = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(0.5)
+
+    resp = Response(stream_with_context(events(offset)), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint for the latest (or running) scan's instruments."""
+    try:
+        with open(METRICS_FILE, "r", encoding="utf-8") as f:
+            body = f.read()
+        age = time.time() - os.path.getmtime(METRICS_FILE)
+    except OSError:
+        body, age = "# no scan metrics published yet\n", -1
+    body += f"# TYPE invisiscan_metrics_age_seconds gauge\ninvisiscan_metrics_age_seconds {age:.3f}\n"
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
 @app.route("/uploads/<path:filename>")
 def uploads(filename):
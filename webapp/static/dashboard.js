@@ -1,26 +1,30 @@
 // webapp/static/dashboard.js
-async function fetchReport() {
-  const r = await fetch("/api/report");
-  if (!r.ok) {
-    document.getElementById("summary").innerText = "No report available. Run the scanner and save to report.json (or report_visual.json).";
-    return null;
-  }
-  const data = await r.json();
-  return data.report;
+const PAGE_SIZE = 50;
+const state = { page: 1, host: "", port: "", service: "", total: 0 };
+
+async function fetchJson(url) {
+  // The server answers unchanged resources with 304; the browser cache fills them in.
+  const r = await fetch(url, { cache: "no-cache" });
+  if (!r.ok) return null;
+  return r.json();
 }
 
-function buildSummary(report){
+function buildSummary(summary){
   const el = document.getElementById("summary");
   el.innerHTML = "";
   const t = document.getElementById("targetLabel");
-  t.innerText = report.target || "unknown";
+  t.innerText = summary.target || "unknown";
 
   const pOpen = document.createElement("p");
-  pOpen.innerHTML = `<strong>Open ports:</strong> ${report.open_ports ? report.open_ports.length : 0}`;
+  pOpen.innerHTML = `<strong>Open ports:</strong> ${summary.open_ports || 0} on ${summary.hosts || 0} host(s)`;
   el.appendChild(pOpen);
 
+  const pCves = document.createElement("p");
+  pCves.innerHTML = `<strong>With CVE hits:</strong> ${summary.with_cves || 0}`;
+  el.appendChild(pCves);
+
   const ts = document.createElement("p");
-  ts.innerHTML = `<strong>Timestamp:</strong> ${report.timestamp || "unknown"}`;
+  ts.innerHTML = `<strong>Timestamp:</strong> ${summary.timestamp || "unknown"}`;
   el.appendChild(ts);
 
   const save = document.createElement("p");
@@ -28,45 +32,47 @@ function buildSummary(report){
   el.appendChild(save);
 }
 
-function buildBanners(report){
+function buildBanners(items){
   const pre = document.getElementById("banners");
-  if(!report.banners || Object.keys(report.banners).length === 0) {
+  if(items.length === 0) {
     pre.innerText = "No banners collected.";
     return;
   }
   let out = "";
-  for(const p of Object.keys(report.banners)){
-    out += `Port ${p}: ${report.banners[p] || "(no banner)"}\n\n`;
+  for(const it of items){
+    const service = [it.service, it.product, it.version].filter(Boolean).join(" ");
+    out += `Port ${it.key}${service ? " [" + service + "]" : ""}: ${it.banner || "(no banner)"}\n\n`;
   }
   pre.innerText = out;
 }
 
-function buildRaw(report){
-  const raw = document.getElementById("rawJson");
-  raw.innerText = JSON.stringify(report, null, 2);
-}
-
-function buildCveList(report){
+function buildCveList(items){
   const el = document.getElementById("cveList");
   el.innerHTML = "";
-  const cves = report.explanations || {};
-  const ports = Object.keys(cves);
-  if(ports.length === 0){
+  const hits = items.filter(it => it.explanation);
+  if(hits.length === 0){
     el.innerHTML = "<p>No CVE hints.</p>";
     return;
   }
-  for(const p of ports){
+  for(const it of hits){
     const card = document.createElement("p");
-    card.innerHTML = `<strong>Port ${p}:</strong> <br/> ${cves[p].replace(/\n/g,"<br/>")}`;
+    card.innerHTML = `<strong>Port ${it.key}:</strong> <br/> ${it.explanation.replace(/\n/g,"<br/>")}`;
     el.appendChild(card);
   }
 }
 
-function buildPortsChart(report){
+function buildPager(){
+  const pages = Math.max(1, Math.ceil(state.total / PAGE_SIZE));
+  document.getElementById("pageInfo").innerText = `Page ${state.page} / ${pages} (${state.total} findings)`;
+  document.getElementById("prevPage").disabled = state.page <= 1;
+  document.getElementById("nextPage").disabled = state.page >= pages;
+}
+
+function buildPortsChart(summary){
   const ctx = document.getElementById("portsChart").getContext("2d");
-  const ports = report.open_ports || [];
-  const labels = ports.map(p => String(p));
-  const dataCounts = ports.map(_=>1);
+  const counts = summary.ports || {};
+  const labels = Object.keys(counts).sort((a, b) => Number(a) - Number(b));
+  const dataCounts = labels.map(p => counts[p]);
   if(window._portsChart) window._portsChart.destroy();
   window._portsChart = new Chart(ctx, {
     type: 'bar',
@@ -90,16 +96,87 @@ function buildPortsChart(report){
   });
 }
 
-async function init(){
-  const report = await fetchReport();
-  if(!report) return;
-  buildSummary(report);
-  buildBanners(report);
-  buildRaw(report);
-  buildCveList(report);
-  buildPortsChart(report);
+async function loadFindings(){
+  const q = new URLSearchParams({ page: state.page, per_page: PAGE_SIZE });
+  if(state.host) q.set("host", state.host);
+  if(state.port) q.set("port", state.port);
+  if(state.service) q.set("service", state.service);
+  const data = await fetchJson(`/api/findings?${q}`);
+  if(!data) return;
+  state.total = data.total;
+  buildBanners(data.items);
+  buildCveList(data.items);
+  buildPager();
+}
+
+async function loadSummary(){
+  const summary = await fetchJson("/api/summary");
+  if(!summary){
+    document.getElementById("summary").innerText = "No report available. Run the scanner and save to report.json (or report_visual.json).";
+    return false;
+  }
+  buildSummary(summary);
+  buildPortsChart(summary);
   const updated = document.getElementById("updatedAt");
-  updated.innerText = `Report target: ${report.target || "unknown"}`;
+  updated.innerText = `Report target: ${summary.target || "unknown"}`;
+  return true;
+}
+
+async function loadRaw(){
+  // The full report can be large; only fetch it when asked for.
+  const data = await fetchJson("/api/report");
+  document.getElementById("rawJson").innerText = data ? JSON.stringify(data.report, null, 2) : "No report.";
+}
+
+let refreshTimer = null;
+function scheduleRefresh(){
+  // Coalesce bursts of live events into one refresh.
+  if(refreshTimer) return;
+  refreshTimer = setTimeout(async () => {
+    refreshTimer = null;
+    await loadSummary();
+    await loadFindings();
+  }, 2000);
+}
+
+function watchStream(){
+  if(!window.EventSource) return false;
+  const live = document.getElementById("liveStatus");
+  const es = new EventSource("/api/stream");
+  es.onopen = () => { live.innerText = "live"; };
+  es.onerror = () => { live.innerText = "reconnecting"; };
+  for(const kind of ["meta", "open", "service", "reset"]){
+    es.addEventListener(kind, scheduleRefresh);
+  }
+  // The scan is over: stop holding a server thread and poll for the next one.
+  es.addEventListener("done", () => {
+    es.close();
+    live.innerText = "finished";
+    scheduleRefresh();
+    setInterval(scheduleRefresh, 30000);
+  });
+  return true;
+}
+
+function bindControls(){
+  document.getElementById("filterForm").addEventListener("submit", ev => {
+    ev.preventDefault();
+    state.host = document.getElementById("filterHost").value.trim();
+    state.port = document.getElementById("filterPort").value.trim();
+    state.service = document.getElementById("filterService").value.trim();
+    state.page = 1;
+    loadFindings();
+  });
+  document.getElementById("prevPage").addEventListener("click", () => { state.page--; loadFindings(); });
+  document.getElementById("nextPage").addEventListener("click", () => { state.page++; loadFindings(); });
+  document.getElementById("loadRaw").addEventListener("click", loadRaw);
+}
+
+async function init(){
+  bindControls();
+  if(await loadSummary()) await loadFindings();
+  // With live events the page only refreshes on new findings; without them, poll slowly.
+  if(!watchStream()) setInterval(scheduleRefresh, 30000);
 }
 
 window.addEventListener("load", init);